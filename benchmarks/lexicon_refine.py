@@ -0,0 +1,136 @@
+"""Compare local lexicon correction with the LLM refine step on stored transcripts.
+
+For every stored English, non-conversational result, the raw Whisper text is
+corrected with the medical lexicon and compared with the text the LLM refine
+step produced for it (stored in ``arabic_text``). Reported:
+
+- latency of the lexicon pass, next to the stored LLM ``refine_time``
+- vocabulary recall: of the lexicon terms in the LLM output, the share found
+  in the raw text and in the lexicon-corrected text
+- word similarity of the raw and corrected texts to the LLM output
+
+Usage:
+    python -m benchmarks.lexicon_refine --db app_data.db --output lexicon.json
+"""
+import json
+import time
+import sqlite3
+import argparse
+import statistics
+from difflib import SequenceMatcher
+from typing import List, Optional
+
+from src.core.cold_storage import ColdStorageService
+from src.model.lexicon import LexiconService, MedicalLexicon
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def load_transcripts(db_path: str, limit: Optional[int]) -> List[dict]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(audio_results)")}
+    refine_time = "refine_time" if "refine_time" in columns else "NULL AS refine_time"
+    rows = [dict(row) for row in conn.execute(
+        f"SELECT id, raw_text, arabic_text, {refine_time} FROM audio_results "
+        f"WHERE language = 'en' AND NOT is_conversation ORDER BY id DESC LIMIT ?",
+        (limit or -1,)
+    )]
+    cold_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (ColdStorageService.TABLE,),
+    ).fetchone()
+    if cold_table:
+        ColdStorageService.hydrate(conn, rows, ("raw_text", "arabic_text"))
+    conn.close()
+    return [row for row in rows if row["raw_text"] and row["arabic_text"]]
+
+
+def words(text: str) -> List[str]:
+    return [word.lower() for word in MedicalLexicon.TOKEN_PATTERN.findall(text)]
+
+
+def run(db_path: str, limit: Optional[int] = None, repeat: int = 5) -> dict:
+    lexicon = LexiconService.get_lexicon()
+    rows = load_transcripts(db_path, limit)
+
+    latencies, llm_latencies = [], []
+    raw_similarity, lexicon_similarity = [], []
+    reference_terms = raw_hits = lexicon_hits = 0
+    corrections = agreed = 0
+    for row in rows:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            corrected, changes = lexicon.correct(row["raw_text"])
+            latencies.append(time.perf_counter() - start)
+        if row["refine_time"]:
+            llm_latencies.append(row["refine_time"])
+
+        reference = words(row["arabic_text"])
+        raw, fixed = words(row["raw_text"]), words(corrected)
+        raw_similarity.append(
+            SequenceMatcher(None, raw, reference, autojunk=False).ratio()
+        )
+        lexicon_similarity.append(
+            SequenceMatcher(None, fixed, reference, autojunk=False).ratio()
+        )
+
+        terms = {word for word in reference if word in lexicon.terms}
+        reference_terms += len(terms)
+        raw_hits += len(terms & set(raw))
+        lexicon_hits += len(terms & set(fixed))
+        corrections += len(changes)
+        agreed += sum(1 for change in changes if change["to"].lower() in terms)
+
+    def summary(values: List[float]) -> dict:
+        return {
+            "p50_ms": round(percentile(values, 0.5) * 1000, 3) if values else None,
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3) if values else None,
+        }
+
+    return {
+        "transcripts": len(rows),
+        "lexicon_latency": summary(latencies),
+        "llm_refine_latency": summary(llm_latencies),
+        "vocabulary_recall": {
+            "reference_terms": reference_terms,
+            "raw": round(raw_hits / reference_terms, 4) if reference_terms else None,
+            "lexicon": (
+                round(lexicon_hits / reference_terms, 4) if reference_terms else None
+            ),
+        },
+        "similarity_to_llm": {
+            "raw": round(statistics.mean(raw_similarity), 4) if rows else None,
+            "lexicon": round(statistics.mean(lexicon_similarity), 4) if rows else None,
+        },
+        "corrections": corrections,
+        "corrections_matching_llm": agreed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark lexicon correction against the LLM refine step"
+    )
+    parser.add_argument("--db", default="app_data.db", help="SQLite database path")
+    parser.add_argument("--limit", type=int, help="Only use the newest N transcripts")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Timed lexicon runs per transcript"
+    )
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run(args.db, args.limit, args.repeat)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,548 @@
+"""Load generator that replays upload requests against a running server.
+
+Requests are sent either at a fixed concurrency (closed loop: each worker
+sends its next request when the previous one returns) or at a fixed arrival
+rate (open loop: Poisson arrivals, whether or not the server keeps up). The
+report gives throughput, error rate and p50/p95/p99 latency per endpoint,
+per request profile (language/model/mode), and per pipeline stage, taken
+from the ``stage_timings`` of each upload response.
+
+Requests come from a scenario file with one JSON object per line:
+
+    {"audio": "samples/visit.wav", "language": "en", "model": "deepseek", "weight": 3}
+    {"audio": "samples/consult.wav", "language": "ar", "conversation": true}
+    {"method": "GET", "endpoint": "/results", "params": {"limit": 50}, "weight": 1}
+
+Upload entries may also set ``doctor``, ``clinical_sheet`` and
+``refine_mode``. Without a scenario file, uploads are synthetic. Their
+language, model and conversation mix comes from the command line or from
+the results stored in a database (``--mix-from-db``). Their audio comes
+from ``--audio`` files or from speech-like audio generated with
+benchmarks.pipeline.
+
+Usage:
+    python -m benchmarks.loadgen --url http://localhost:8000 --concurrency 8 \
+        --requests 200
+    python -m benchmarks.loadgen --scenario clinic.jsonl --rate 2 --duration 300 \
+        --output load.json
+    python -m benchmarks.loadgen --mix-from-db app_data.db --rate 0.5 --duration 600
+"""
+
+import os
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+UPLOAD = "/upload"
+
+
+# Scenarios
+
+def load_scenario(path: str) -> List[dict]:
+    entries = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            if (
+                entry.get("endpoint", UPLOAD) == UPLOAD
+                and entry.get("method", "POST") == "POST"
+            ):
+                if "audio" not in entry:
+                    raise ValueError(
+                        f"{path}:{number}: upload entries need an 'audio' path"
+                    )
+                entry["audio"] = os.path.join(
+                    os.path.dirname(os.path.abspath(path)), entry["audio"]
+                )
+            entries.append(entry)
+    if not entries:
+        raise ValueError(f"{path} has no requests")
+    return entries
+
+
+def mix_from_db(db_path: str) -> List[dict]:
+    """Weight upload profiles by how often they occur in stored results."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(audio_results)")}
+    form_name = "form_name" if "form_name" in columns else "NULL"
+    rows = conn.execute(
+        f"SELECT language, model, is_conversation, {form_name}, COUNT(*) "
+        "FROM audio_results GROUP BY 1, 2, 3, 4"
+    ).fetchall()
+    conn.close()
+    return [
+        {
+            "language": language or "en",
+            "model": model or "deepseek",
+            "conversation": bool(conversation),
+            "clinical_sheet": form,
+            "weight": count,
+        }
+        for language, model, conversation, form, count in rows
+    ]
+
+
+def synthetic_mix(
+    languages: List[str], models: List[str], conversation_ratio: float
+) -> List[dict]:
+    entries = []
+    for language in languages:
+        for model in models:
+            for conversation, share in (
+                (False, 1 - conversation_ratio),
+                (True, conversation_ratio),
+            ):
+                if share > 0:
+                    entries.append({"language": language, "model": model,
+                                    "conversation": conversation, "weight": share})
+    return entries
+
+
+def attach_audio(
+    entries: List[dict], audio_files: List[str], directory: str, duration: float
+) -> None:
+    """Give each entry without audio one of ``audio_files``, or generated speech."""
+    if not audio_files:
+        from benchmarks.pipeline import write_audio
+
+        audio_files = [write_audio(directory, duration, 44100)]
+    index = 0
+    for entry in entries:
+        if is_upload(entry) and "audio" not in entry:
+            entry["audio"] = audio_files[index % len(audio_files)]
+            index += 1
+
+
+def is_upload(entry: dict) -> bool:
+    return (
+        entry.get("method", "POST") == "POST"
+        and entry.get("endpoint", UPLOAD) == UPLOAD
+    )
+
+
+def profile_name(entry: dict) -> str:
+    if not is_upload(entry):
+        return f"{entry.get('method', 'GET')} {entry['endpoint']}"
+    mode = "conversation" if entry.get("conversation") else "dictation"
+    name = f"{entry.get('language', 'en')}/{entry.get('model', 'deepseek')}/{mode}"
+    if entry.get("clinical_sheet"):
+        name += f"/{entry['clinical_sheet']}"
+    if entry.get("refine_mode"):
+        name += f"/{entry['refine_mode']}"
+    return name
+
+
+# Requests
+
+class LoadClient:
+    """Sends scenario entries to the server, one ``requests`` session per thread."""
+
+    def __init__(
+        self, base_url: str, timeout: float, admin_token: Optional[str] = None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.headers = {"X-Admin-Token": admin_token} if admin_token else {}
+        self._local = threading.local()
+        self._audio: Dict[str, bytes] = {}
+
+    def audio(self, path: str) -> bytes:
+        # Read each file once so the client's disk is not part of the measurement
+        if path not in self._audio:
+            with open(path, "rb") as f:
+                self._audio[path] = f.read()
+        return self._audio[path]
+
+    def session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+            self._local.session.headers.update(self.headers)
+        return self._local.session
+
+    def send(self, entry: dict) -> dict:
+        """Send one request and return its record.
+
+        The record holds the status, latency, stage timings and error.
+        """
+        method = entry.get("method", "POST")
+        endpoint = entry.get("endpoint", UPLOAD)
+        record = {"endpoint": f"{method} {endpoint}", "profile": profile_name(entry),
+                  "status": None, "stages": {}, "error": None}
+        start = time.perf_counter()
+        try:
+            if is_upload(entry):
+                data = {
+                    "language": entry.get("language", "en"),
+                    "model": entry.get("model", "deepseek"),
+                }
+                if entry.get("conversation"):
+                    data["isConversation"] = "on"
+                for field, key in (
+                    ("doctorName", "doctor"),
+                    ("clinicalSheet", "clinical_sheet"),
+                    ("refineMode", "refine_mode"),
+                ):
+                    if entry.get(key):
+                        data[field] = entry[key]
+                files = {
+                    "audio": (
+                        os.path.basename(entry["audio"]),
+                        self.audio(entry["audio"]),
+                        "audio/wav",
+                    )
+                }
+                response = self.session().post(
+                    self.base_url + endpoint,
+                    data=data,
+                    files=files,
+                    timeout=self.timeout,
+                )
+            else:
+                response = self.session().request(
+                    method,
+                    self.base_url + endpoint,
+                    params=entry.get("params"),
+                    json=entry.get("json"),
+                    timeout=self.timeout,
+                )
+            record["status"] = response.status_code
+            body = (
+                response.json()
+                if "json" in response.headers.get("content-type", "")
+                else {}
+            )
+            if isinstance(body, dict):
+                record["stages"] = body.get("stage_timings") or {}
+                if response.status_code != 200 or "error" in body:
+                    record["error"] = str(body.get("error") or response.reason)
+            elif response.status_code != 200:
+                record["error"] = response.reason
+        except requests.RequestException as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["latency"] = time.perf_counter() - start
+        return record
+
+
+# Load patterns
+
+class LoadRun:
+    """Collects records and decides when the run is over."""
+
+    def __init__(self, entries: List[dict], seed: int, requests_limit: Optional[int],
+                 duration: Optional[float], warmup: float):
+        self.entries = entries
+        self.weights = [entry.get("weight", 1) for entry in entries]
+        self.rng = random.Random(seed)
+        self.requests_limit = requests_limit
+        self.duration = duration
+        self.warmup = warmup
+        self.records: List[dict] = []
+        self.sent = 0
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    def next_entry(self) -> Optional[dict]:
+        """The next entry to send, or None once the request or time budget is spent."""
+        with self.lock:
+            if self.requests_limit is not None and self.sent >= self.requests_limit:
+                return None
+            if (
+                self.duration is not None
+                and time.perf_counter() - self.started >= self.duration
+            ):
+                return None
+            self.sent += 1
+            return self.rng.choices(self.entries, self.weights)[0]
+
+    def add(self, record: dict, issued: float) -> None:
+        record["issued"] = issued - self.started
+        with self.lock:
+            self.records.append(record)
+
+    def measured(self) -> List[dict]:
+        return [record for record in self.records if record["issued"] >= self.warmup]
+
+
+def run_closed_loop(client: LoadClient, run: LoadRun, concurrency: int) -> None:
+    def worker():
+        while True:
+            entry = run.next_entry()
+            if entry is None:
+                return
+            issued = time.perf_counter()
+            run.add(client.send(entry), issued)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(
+    client: LoadClient, run: LoadRun, rate: float, max_in_flight: int
+) -> None:
+    """Poisson arrivals at ``rate`` per second.
+
+    Latency is measured from the scheduled arrival, so time spent waiting for
+    a free client thread counts too and a slow server cannot hide its
+    backlog by slowing the generator down.
+    """
+    def issue(entry, scheduled):
+        record = client.send(entry)
+        record["latency"] = time.perf_counter() - scheduled
+        run.add(record, scheduled)
+
+    scheduled = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        while True:
+            scheduled += run.rng.expovariate(rate)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            entry = run.next_entry()
+            if entry is None:
+                break
+            executor.submit(issue, entry, scheduled)
+
+
+# Report
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def latency_summary(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 1),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+    }
+
+
+def group_summary(records: List[dict], elapsed: float) -> dict:
+    rejected = sum(1 for record in records if record["status"] == 429)
+    errors = sum(1 for record in records if record["error"] and record["status"] != 429)
+    succeeded = [record["latency"] for record in records if not record["error"]]
+    return {
+        "requests": len(records),
+        "throughput_rps": round(len(succeeded) / elapsed, 3) if elapsed else None,
+        "error_rate": round(errors / len(records), 4) if records else None,
+        "rejected_rate": round(rejected / len(records), 4) if records else None,
+        "latency": latency_summary(succeeded),
+    }
+
+
+def build_report(run: LoadRun, settings: dict) -> dict:
+    records = run.measured()
+    finished = max(
+        (record["issued"] + record["latency"] for record in records), default=run.warmup
+    )
+    elapsed = max(finished - run.warmup, 1e-9)
+
+    endpoints: Dict[str, List[dict]] = {}
+    profiles: Dict[str, List[dict]] = {}
+    stages: Dict[str, List[float]] = {}
+    for record in records:
+        endpoints.setdefault(record["endpoint"], []).append(record)
+        profiles.setdefault(record["profile"], []).append(record)
+        if not record["error"]:
+            for stage, seconds in record["stages"].items():
+                if seconds is not None:
+                    stages.setdefault(stage, []).append(seconds)
+
+    return {
+        "settings": settings,
+        "duration_s": round(elapsed, 2),
+        "overall": group_summary(records, elapsed),
+        "status": dict(
+            Counter(str(record["status"] or "no_response") for record in records)
+        ),
+        "endpoints": {
+            name: group_summary(group, elapsed)
+            for name, group in sorted(endpoints.items())
+        },
+        "profiles": {
+            name: group_summary(group, elapsed)
+            for name, group in sorted(profiles.items())
+        },
+        "stages": {
+            stage: latency_summary(values) for stage, values in sorted(stages.items())
+        },
+        "top_errors": dict(
+            Counter(
+                record["error"] for record in records if record["error"]
+            ).most_common(10)
+        ),
+    }
+
+
+def print_report(report: dict) -> None:
+    def row(name, summary):
+        latency = summary["latency"]
+        line = (
+            f"{name:<{width}}  {summary['requests']:>6}"
+            f"  {summary['throughput_rps'] or 0:>8.3f}"
+            f"  {summary['error_rate'] or 0:>6.1%}"
+            f"  {summary['rejected_rate'] or 0:>6.1%}"
+        )
+        if latency["count"]:
+            line += "".join(
+                f"  {latency[key]:>9.1f}" for key in ("p50_ms", "p95_ms", "p99_ms")
+            )
+        print(line)
+
+    groups = {"overall": report["overall"], **report["endpoints"], **report["profiles"]}
+    width = max(len(name) for name in list(groups) + list(report["stages"]) + ["stage"])
+    print(f"{'':<{width}}  {'reqs':>6}  {'ok/s':>8}  {'errors':>6}  {'429':>6}"
+          f"  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}")
+    row("overall", report["overall"])
+    for title, section in (
+        ("endpoints", report["endpoints"]),
+        ("profiles", report["profiles"]),
+    ):
+        print(f"-- {title}")
+        for name, summary in section.items():
+            row(name, summary)
+    if report["stages"]:
+        print("-- stages (server side, successful uploads)")
+        for stage, latency in report["stages"].items():
+            print(
+                f"{stage:<{width}}  {latency['count']:>6}  {'':>8}  {'':>6}  {'':>6}"
+                + "".join(
+                    f"  {latency[key]:>9.1f}" for key in ("p50_ms", "p95_ms", "p99_ms")
+                )
+            )
+    for error, count in report["top_errors"].items():
+        print(f"error x{count}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay upload requests against a running server"
+    )
+    parser.add_argument(
+        "--url", default="http://localhost:8000", help="Server base URL"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--scenario", help="JSONL file of requests to replay (see module docstring)"
+    )
+    source.add_argument(
+        "--mix-from-db",
+        metavar="DB",
+        help="Take the upload mix from results stored in DB",
+    )
+    parser.add_argument(
+        "--languages", default="en,ar", help="Synthetic mix: comma-separated languages"
+    )
+    parser.add_argument(
+        "--models", default="deepseek", help="Synthetic mix: comma-separated models"
+    )
+    parser.add_argument("--conversation-ratio", type=float, default=0.3,
+                        help="Synthetic mix: share of conversational uploads")
+    parser.add_argument(
+        "--audio", nargs="+", default=[], help="Audio files for uploads without one"
+    )
+    parser.add_argument(
+        "--audio-duration", type=float, default=30, help="Seconds of generated speech"
+    )
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument(
+        "--concurrency", type=int, help="Closed loop with this many concurrent clients"
+    )
+    load.add_argument(
+        "--rate", type=float, help="Open loop with this many arrivals per second"
+    )
+    parser.add_argument(
+        "--max-in-flight", type=int, default=64, help="Open loop: client thread limit"
+    )
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument(
+        "--duration", type=float, help="Stop issuing requests after this many seconds"
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=0,
+        help="Leave requests issued in the first N seconds out",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=600, help="Per-request timeout in seconds"
+    )
+    parser.add_argument(
+        "--admin-token", default=os.getenv("ADMIN_TOKEN"), help="Sent as X-Admin-Token"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed for request selection and arrivals"
+    )
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+    if args.requests is None and args.duration is None:
+        args.requests = 50
+
+    if args.scenario:
+        entries = load_scenario(args.scenario)
+    elif args.mix_from_db:
+        entries = mix_from_db(args.mix_from_db)
+        if not entries:
+            parser.error(f"no stored results in {args.mix_from_db}")
+    else:
+        entries = synthetic_mix(
+            args.languages.split(","), args.models.split(","), args.conversation_ratio
+        )
+    directory = tempfile.mkdtemp(prefix="loadgen_")
+    attach_audio(entries, args.audio, directory, args.audio_duration)
+
+    settings = {
+        "url": args.url,
+        "mode": (
+            f"rate {args.rate}/s"
+            if args.rate
+            else f"concurrency {args.concurrency or 1}"
+        ),
+        "requests": args.requests,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "mix": {profile_name(entry): entry.get("weight", 1) for entry in entries},
+    }
+    client = LoadClient(args.url, args.timeout, args.admin_token)
+    run = LoadRun(entries, args.seed, args.requests, args.duration, args.warmup)
+    try:
+        if args.rate:
+            run_open_loop(client, run, args.rate, args.max_in_flight)
+        else:
+            run_closed_loop(client, run, args.concurrency or 1)
+    except KeyboardInterrupt:
+        print("Interrupted; reporting the requests that finished")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = build_report(run, settings)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
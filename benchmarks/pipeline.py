@@ -0,0 +1,596 @@
+"""Offline end-to-end benchmark of the processing pipeline.
+
+Synthetic speech-like audio is generated for several durations and sample
+rates. The suite times:
+
+- every step of AudioPreprocessingService.preprocess_audio
+- DataPipeline._split_audio chunking
+- completion parsing, lexicon correction and ICD-10 annotation
+- DatabaseService inserts and queries on a scratch database
+- the whole DataPipeline.process_batch, with the ASR and LLM backends
+  replaced by canned responses (optionally with a fixed latency)
+
+Nothing leaves the machine and no API key is needed. Results go to a JSON
+file. Given a baseline from an earlier run, every benchmark is compared with
+it and slowdowns beyond the threshold are reported as regressions.
+
+Usage:
+    python -m benchmarks.pipeline --output bench.json
+    python -m benchmarks.pipeline --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline --baseline benchmarks/baseline.json \
+        --fail-on-regression
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from contextlib import ExitStack, redirect_stdout
+from typing import Callable, Dict, List, Optional
+from unittest import mock
+
+import numpy as np
+
+SAMPLE_TRANSCRIPT = (
+    "The patient is a 54 year old man complaining of chest pain on exertion for "
+    "two weeks, radiating to the left arm. He has hypertension and type 2 diabetes "
+    "on metformin and amlodipine. ECG shows no acute changes. Plan: troponin, "
+    "lipid profile, start aspirin and atorvastatin, and follow up in one week."
+)
+SAMPLE_COMPLETION = """# SECTION 1: PATIENT DATA (JSON FORMAT)
+```json
+{
+"chief_complaint": "Exertional chest pain for two weeks radiating to the left arm",
+"icd10_codes": ["I20.9 - Angina pectoris, unspecified",
+                "I10 - Essential (primary) hypertension",
+                "E11.9 - Type 2 diabetes mellitus without complications"],
+"history_of_illness": "Chest pain on exertion for two weeks",
+"current_medication": "Metformin, amlodipine",
+"imaging_results": NULL,
+"plan": "Troponin, lipid profile, aspirin, atorvastatin",
+"assessment": "Suspected stable angina",
+"follow_up": "One week",
+}
+```
+
+# SECTION 2: ANALYSIS NOTES
+Exertional pain radiating to the arm suggests angina {I20.9}; comorbid I10 and E11.9."""
+
+
+# Synthetic audio
+
+
+def synthetic_speech(
+    duration: float, sr: int, seed: int = 0, noise: float = 0.003
+) -> np.ndarray:
+    """Speech-like audio: voiced syllables with moving formants, pauses and room noise.
+
+    Two alternating voices (different pitch and formants) speak 2-6 second
+    phrases separated by short pauses, over a white noise floor of amplitude
+    ``noise`` (the default is a quiet room; 0.05 is a noisy ward).
+    """
+    from scipy import signal
+
+    rng = np.random.default_rng(seed)
+    vowels = [
+        (730, 1090, 2440),
+        (270, 2290, 3010),
+        (530, 1840, 2480),
+        (570, 840, 2410),
+        (300, 870, 2240),
+    ]
+    out = np.zeros(int(duration * sr), dtype=np.float64)
+    position, speaker = int(0.3 * sr), 0
+    while position < len(out):
+        phrase = int(rng.uniform(2, 6) * sr)
+        f0, shift = (120, 1.0) if speaker == 0 else (210, 1.15)
+        syllable = int(0.22 * sr)
+        for start in range(position, min(position + phrase, len(out)), syllable):
+            n = min(syllable, len(out) - start)
+            t = np.arange(n) / sr
+            pitch = f0 * (
+                1
+                + 0.08 * np.sin(2 * np.pi * rng.uniform(0.5, 2) * t + rng.uniform(0, 6))
+            )
+            phase = 2 * np.pi * np.cumsum(pitch) / sr
+            source = sum(np.sin(k * phase) / k for k in range(1, 16))
+            voiced = np.zeros(n)
+            for formant in vowels[rng.integers(len(vowels))]:
+                center = min(formant * shift, 0.45 * sr)
+                b, a = signal.iirpeak(center, 8, sr)
+                voiced += signal.lfilter(b, a, source)
+            envelope = np.sin(np.pi * np.arange(n) / syllable) ** 2
+            out[start:start + n] += (
+                0.2 * voiced * envelope / (np.max(np.abs(voiced)) + 1e-9)
+            )
+        position += phrase + int(rng.uniform(0.3, 0.9) * sr)
+        speaker = 1 - speaker
+    out += noise * rng.standard_normal(len(out))
+    return out.astype(np.float32)
+
+
+def write_audio(directory: str, duration: float, sr: int, noise: float = 0.003) -> str:
+    import soundfile as sf
+
+    path = os.path.join(directory, f"speech_{sr}hz_{int(duration)}s_{noise:g}.wav")
+    sf.write(path, synthetic_speech(duration, sr, noise=noise), sr)
+    return path
+
+
+# Measurement
+
+def summarize(samples: List[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "median_s": round(statistics.median(samples), 6),
+        "min_s": round(samples[0], 6),
+        "p95_s": round(
+            samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))], 6
+        ),
+        "runs": len(samples),
+    }
+
+
+def measure(func: Callable, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def guarded(results: Dict[str, dict], name: str, func: Callable[[], None]) -> None:
+    """Run one benchmark group, recording its error instead of stopping the suite."""
+    try:
+        func()
+    except Exception as e:
+        results[name] = {"error": f"{type(e).__name__}: {e}"}
+        logging.warning(f"{name} failed: {e}")
+
+
+# Benchmark groups
+
+def bench_preprocessing(results, audio_path, label, repeat):
+    from src.model.audio_preprocessing import AudioPreprocessingService
+
+    steps: Dict[str, List[float]] = {}
+    totals = []
+    output = os.path.splitext(audio_path)[0] + "_out.wav"
+    for _ in range(repeat):
+        timings = {}
+        start = time.perf_counter()
+        AudioPreprocessingService.preprocess_audio(audio_path, output, timings=timings)
+        totals.append(time.perf_counter() - start)
+        for step, seconds in timings.items():
+            steps.setdefault(step, []).append(seconds)
+    results[f"preprocess/{label}/total"] = summarize(totals)
+    for step, samples in steps.items():
+        results[f"preprocess/{label}/{step}"] = summarize(samples)
+
+
+def bench_chunking(results, audio_path, label, repeat):
+    from src.model.pipeline import DataPipeline
+
+    def split():
+        for chunk in DataPipeline._split_audio(audio_path, 25):
+            os.remove(chunk)
+
+    results[f"chunking/{label}"] = measure(split, repeat)
+
+
+def bench_text(results, repeat):
+    from src.model.utils.text_parser import parse_refined_text_voice2
+    from src.model.lexicon import LexiconService
+    from src.model.icd10 import ICD10Service
+
+    LexiconService.get_lexicon()
+    ICD10Service.get_index()
+    clean = SAMPLE_COMPLETION.replace("NULL", "null").replace(
+        '"One week",\n', '"One week"\n'
+    )
+    results["parse/clean"] = measure(
+        lambda: parse_refined_text_voice2(clean), repeat * 100
+    )
+    results["parse/repaired"] = measure(
+        lambda: parse_refined_text_voice2(SAMPLE_COMPLETION), repeat * 100
+    )
+    results["lexicon/correct"] = measure(
+        lambda: LexiconService.get_lexicon().correct(
+            SAMPLE_TRANSCRIPT.replace("metformin", "met formin")
+        ),
+        repeat * 100,
+    )
+    data = parse_refined_text_voice2(SAMPLE_COMPLETION)[0]
+    results["icd10/annotate"] = measure(
+        lambda: ICD10Service.annotate(dict(data)), repeat * 100
+    )
+
+
+def bench_database(results, directory, rows, repeat):
+    from src.core.config import Config
+    from src.core.database import DatabaseService
+    from src.core.db_connection import ConnectionManager
+
+    json_data = json.dumps(
+        {
+            "chief_complaint": "Chest pain",
+            "icd10_codes": [
+                "I20.9 - Angina pectoris, unspecified",
+                "I10 - Hypertension",
+            ],
+            "assessment": "Stable angina",
+            "plan": "Aspirin",
+            "follow_up": "One week",
+        }
+    )
+
+    def save(index):
+        return DatabaseService.save_audio_result(
+            filename=f"bench_{index}.wav",
+            language="en",
+            model="llama",
+            is_conversation=False,
+            raw_text=SAMPLE_TRANSCRIPT,
+            arabic_text=SAMPLE_TRANSCRIPT,
+            translation_text="there is no translation",
+            json_data=json_data,
+            reasoning="benchmark",
+            preprocessing_time=0.5,
+            voice_processing_time=1.0,
+            llm_processing_time=2.0,
+            doctor_name=f"Dr {index % 7}",
+            feedback="",
+            validation_time=0.2,
+            refine_time=0.8,
+            translation_time=0.0,
+            extraction_time=1.0,
+        )
+
+    previous_path = DatabaseService.DB_PATH
+    DatabaseService.DB_PATH = os.path.join(directory, "bench.db")
+    try:
+        DatabaseService.initialize_db()
+
+        def insert_batch():
+            for index in range(rows):
+                save(index)
+            DatabaseService.flush_writes()
+
+        # A short flush interval so the final flush
+        # measures the writes, not the batching timer
+        with mock.patch.object(Config, "WRITE_BEHIND", True), \
+                mock.patch.object(Config, "WRITE_BEHIND_FLUSH_INTERVAL", 0.01):
+            insert = measure(insert_batch, 1)
+            DatabaseService.shutdown()
+        insert["rows_per_s"] = round(rows / insert["median_s"], 1)
+        results[f"db/insert_{rows}_rows_write_behind"] = insert
+        with mock.patch.object(Config, "WRITE_BEHIND", False):
+            results["db/insert_single_sync"] = measure(lambda: save(0), repeat * 10)
+        results["db/page"] = measure(
+            lambda: DatabaseService.get_audio_results_page(limit=50), repeat * 10
+        )
+        results["db/page_filtered"] = measure(
+            lambda: DatabaseService.get_audio_results_page(
+                limit=50, doctor_name="Dr 3"
+            ),
+            repeat * 10,
+        )
+        results["db/search"] = measure(
+            lambda: DatabaseService.search_results("chest pain", limit=20), repeat * 10
+        )
+        results["db/analytics"] = measure(
+            lambda: DatabaseService.get_analytics(
+                group_by=("doctor_name",), granularity="day"
+            ),
+            repeat * 10,
+        )
+        results["db/icd10_prefix"] = measure(
+            lambda: DatabaseService.find_by_icd10("I20"), repeat * 10
+        )
+    finally:
+        DatabaseService.shutdown()
+        ConnectionManager.close_all()
+        DatabaseService.DB_PATH = previous_path
+
+
+def stubbed_backends(asr_latency: float, llm_latency: float) -> ExitStack:
+    """Replace the Fireworks transcription and completion calls with canned answers."""
+    from src.model.llm_service import LLMService
+    from src.model.speech_service import SpeechService
+
+    def transcribe(audio_file_path, api_key, language="en", preprocess=True):
+        time.sleep(asr_latency)
+        return SAMPLE_TRANSCRIPT
+
+    def complete(
+        api_key,
+        model_account,
+        prompt,
+        pydantic_model=None,
+        temperature=0.3,
+        json_schema=None,
+    ):
+        time.sleep(llm_latency)
+        if "medical content validator" in prompt:
+            return "MEDICAL|95"
+        if "SECTION 1: PATIENT DATA" in prompt:
+            return SAMPLE_COMPLETION
+        if json_schema is not None:
+            return json.dumps(
+                {
+                    key: "DOCTOR" if index == 0 else "PATIENT"
+                    for index, key in enumerate(json_schema.get("properties", {}))
+                }
+            )
+        return SAMPLE_TRANSCRIPT
+
+    stack = ExitStack()
+    stack.enter_context(
+        mock.patch.object(SpeechService, "transcribe_audio", staticmethod(transcribe))
+    )
+    stack.enter_context(
+        mock.patch.object(LLMService, "_call_llm_api_unlimited", staticmethod(complete))
+    )
+    return stack
+
+
+def bench_process_batch(results, audio_path, label, repeat, asr_latency, llm_latency):
+    from src.model.pipeline import DataPipeline
+
+    stages: Dict[str, List[float]] = {}
+    totals = []
+    # process_batch prints every intermediate text
+    with stubbed_backends(asr_latency, llm_latency), redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = DataPipeline.process_batch(audio_path, "en", "llama", False)
+            totals.append(time.perf_counter() - start)
+            for stage, seconds in response["stage_timings"].items():
+                stages.setdefault(stage, []).append(seconds)
+    results[f"process_batch/{label}/total"] = summarize(totals)
+    for stage, samples in stages.items():
+        results[f"process_batch/{label}/{stage}"] = summarize(samples)
+
+
+# Reporting
+
+def environment() -> dict:
+    try:
+        commit = (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                timeout=10,
+            ).stdout.strip()
+            or None
+        )
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(
+    results: Dict[str, dict], baseline: Dict[str, dict], threshold: float
+) -> dict:
+    """Compare medians with the baseline; ratio > 1 means slower than the baseline."""
+    comparison = {
+        "regressions": [],
+        "improvements": [],
+        "unchanged": 0,
+        "new": [],
+        "missing": [],
+    }
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            comparison["new"].append(name)
+            continue
+        if (
+            "median_s" not in current
+            or "median_s" not in previous
+            or not previous["median_s"]
+        ):
+            continue
+        ratio = current["median_s"] / previous["median_s"]
+        entry = {
+            "name": name,
+            "baseline_s": previous["median_s"],
+            "current_s": current["median_s"],
+            "ratio": round(ratio, 3),
+        }
+        if ratio > 1 + threshold:
+            comparison["regressions"].append(entry)
+        elif ratio < 1 - threshold:
+            comparison["improvements"].append(entry)
+        else:
+            comparison["unchanged"] += 1
+    comparison["missing"] = sorted(set(baseline) - set(results))
+    return comparison
+
+
+def print_report(results: Dict[str, dict], comparison: Optional[dict]) -> None:
+    width = max(len(name) for name in results)
+    for name, stats in results.items():
+        if "error" in stats:
+            print(f"{name:<{width}}  ERROR {stats['error']}")
+        else:
+            print(f"{name:<{width}}  median {stats['median_s'] * 1000:10.3f} ms  "
+                  f"p95 {stats['p95_s'] * 1000:10.3f} ms  ({stats['runs']} runs)")
+    if comparison:
+        print()
+        for kind in ("regressions", "improvements"):
+            for entry in comparison[kind]:
+                print(
+                    f"{kind[:-1].upper():<11} {entry['name']}: "
+                    f"{entry['baseline_s'] * 1000:.3f} ms -> "
+                    f"{entry['current_s'] * 1000:.3f} ms (x{entry['ratio']})"
+                )
+        print(f"{comparison['unchanged']} unchanged, {len(comparison['new'])} new, "
+              f"{len(comparison['missing'])} missing from this run")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of the processing pipeline"
+    )
+    parser.add_argument(
+        "--durations",
+        default="5,30,120",
+        help="Comma-separated audio durations in seconds",
+    )
+    parser.add_argument(
+        "--sample-rates",
+        default="16000,22050,44100",
+        help="Comma-separated sample rates",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed runs per audio benchmark"
+    )
+    parser.add_argument(
+        "--db-rows",
+        type=int,
+        default=2000,
+        help="Rows inserted by the database benchmark",
+    )
+    parser.add_argument(
+        "--asr-latency",
+        type=float,
+        default=0.0,
+        help="Seconds the stubbed ASR call takes",
+    )
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        default=0.0,
+        help="Seconds each stubbed LLM call takes",
+    )
+    parser.add_argument(
+        "--only",
+        help="Comma-separated groups: preprocess,chunking,text,db,process_batch",
+    )
+    parser.add_argument(
+        "--output", default="benchmark_results.json", help="JSON file for the results"
+    )
+    parser.add_argument("--baseline", help="Earlier results file to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="Relative median change reported as a regression or improvement",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        metavar="PATH",
+        help="Also write the results as a new baseline",
+    )
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="Exit with status 1 on regressions",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    all_groups = {"preprocess", "chunking", "text", "db", "process_batch"}
+    groups = set(args.only.split(",")) if args.only else all_groups
+    if groups - all_groups:
+        parser.error(f"unknown groups: {', '.join(sorted(groups - all_groups))}")
+    durations = [float(value) for value in args.durations.split(",")]
+    sample_rates = [int(value) for value in args.sample_rates.split(",")]
+
+    results: Dict[str, dict] = {}
+    directory = tempfile.mkdtemp(prefix="pipeline_bench_")
+    try:
+        if groups & {"preprocess", "chunking", "process_batch"}:
+            from src.model.audio_preprocessing import AudioPreprocessingService
+            AudioPreprocessingService.warm_up()
+        for sr in sample_rates:
+            for duration in durations:
+                label = f"{sr}hz_{int(duration)}s"
+                audio_path = write_audio(directory, duration, sr)
+                if "preprocess" in groups:
+                    guarded(
+                        results,
+                        f"preprocess/{label}",
+                        lambda: bench_preprocessing(
+                            results, audio_path, label, args.repeat
+                        ),
+                    )
+                    # Noisy recordings take the full
+                    # treatment under adaptive preprocessing
+                    noisy_path = write_audio(directory, duration, sr, noise=0.05)
+                    guarded(
+                        results,
+                        f"preprocess/{label}_noisy",
+                        lambda: bench_preprocessing(
+                            results, noisy_path, f"{label}_noisy", args.repeat
+                        ),
+                    )
+                if "chunking" in groups:
+                    guarded(
+                        results,
+                        f"chunking/{label}",
+                        lambda: bench_chunking(results, audio_path, label, args.repeat),
+                    )
+                if "process_batch" in groups:
+                    guarded(
+                        results,
+                        f"process_batch/{label}",
+                        lambda: bench_process_batch(
+                            results,
+                            audio_path,
+                            label,
+                            args.repeat,
+                            args.asr_latency,
+                            args.llm_latency,
+                        ),
+                    )
+        if "text" in groups:
+            guarded(results, "text", lambda: bench_text(results, args.repeat))
+        if "db" in groups:
+            guarded(
+                results,
+                "db",
+                lambda: bench_database(results, directory, args.db_rows, args.repeat),
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f)["results"], args.threshold)
+
+    report = {
+        "environment": environment(),
+        "settings": vars(args),
+        "results": results,
+        "comparison": comparison,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+    print_report(results, comparison)
+
+    if args.fail_on_regression and comparison and comparison["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Micro-benchmark of the completion parsers in src/model/utils/text_parser.py.
+
+Raw LLM completions are not stored, so the corpus is rebuilt from stored
+results. Each result's ``json_data`` and ``reasoning`` are laid out the way
+the extraction prompt asks for them. Variants add the mistakes seen in real
+completions: code fences, ``NULL``, trailing commas, braces in the
+reasoning, and a missing closing brace. Each completion is parsed with the
+current parser and with the regex parser it replaced. The benchmark reports
+time per parse and how many parses recover the stored JSON.
+
+Usage:
+    python -m benchmarks.text_parser --db app_data.db --repeat 200
+"""
+import re
+import json
+import time
+import sqlite3
+import argparse
+from typing import Callable, List, Tuple
+
+from src.core.cold_storage import ColdStorageService
+from src.model.utils.text_parser import parse_refined_text_voice2
+
+FALLBACK_RESULT = {
+    "json_data": {
+        "chief_complaint": "Bilateral knee pain for five years",
+        "icd10_codes": ["M17.0 - Bilateral primary osteoarthritis of knee"],
+        "history_of_illness": (
+            "Worse on the right side; X-ray shows grade 4 osteoarthritis"
+        ),
+        "current_medication": "NSAIDs",
+        "imaging_results": "X-ray: advanced osteoarthritis grade 4",
+        "plan": "Local injection, analgesics",
+        "assessment": "Advanced bilateral knee osteoarthritis",
+        "follow_up": None,
+    },
+    "reasoning": "M17.0 fits bilateral primary osteoarthritis of the knee.",
+}
+
+
+def legacy_parse_refined_text_voice2(refined_text):
+    """The parser before the single-pass scanner, kept for comparison."""
+    json_section = re.search(
+        r"# SECTION 1: PATIENT DATA \(JSON FORMAT\)(.*?)# SECTION 2:",
+        refined_text,
+        re.DOTALL,
+    )
+    reasoning_section = re.search(
+        r"# SECTION 2: ANALYSIS NOTES(.*)", refined_text, re.DOTALL
+    )
+    json_data = {}
+    if json_section:
+        json_match = re.search(r'\{.*\}', json_section.group(1).strip(), re.DOTALL)
+        if json_match:
+            try:
+                json_data = json.loads(json_match.group(0))
+            except json.JSONDecodeError:
+                json_data = {"error": "Invalid JSON format"}
+    reasoning = reasoning_section.group(1).strip() if reasoning_section else ""
+    return json_data, reasoning
+
+
+def load_results(db_path: str, limit: int) -> List[dict]:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    rows = [
+        dict(row)
+        for row in conn.execute(
+            "SELECT id, json_data, reasoning FROM audio_results "
+            "ORDER BY id DESC LIMIT ?",
+            (limit,),
+        )
+    ]
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (ColdStorageService.TABLE,)).fetchone():
+        ColdStorageService.hydrate(conn, rows, ("json_data", "reasoning"))
+    conn.close()
+
+    results = []
+    for row in rows:
+        try:
+            data = json.loads(row["json_data"] or "")
+        except (TypeError, ValueError):
+            continue
+        if isinstance(data, dict) and "error" not in data:
+            results.append({"json_data": data, "reasoning": row["reasoning"] or ""})
+    return results or [FALLBACK_RESULT]
+
+
+def build_corpus(results: List[dict]) -> List[Tuple[str, str, dict]]:
+    """Return ``(variant, completion, expected json)`` triples."""
+    corpus = []
+    for result in results:
+        data, reasoning = result["json_data"], result["reasoning"]
+        body = json.dumps(data, indent=4, ensure_ascii=False)
+        layouts = {
+            "clean": body,
+            "code_fence": f"```json\n{body}\n```",
+            "null_literal": body.replace(": null", ": NULL"),
+            "trailing_comma": re.sub(r"(\S)(\n\s*[}\]])", r"\1,\2", body),
+            "truncated": body[:body.rstrip().rfind("}")],
+        }
+        for variant, json_text in layouts.items():
+            notes = reasoning
+            if variant == "clean":
+                notes = f"{reasoning}\nCodes follow the {{ICD-10-CM}} guidelines."
+            completion = (f"# SECTION 1: PATIENT DATA (JSON FORMAT)\n{json_text}\n\n"
+                          f"# SECTION 2: ANALYSIS NOTES\n{notes}")
+            corpus.append((variant, completion, data))
+    return corpus
+
+
+def measure(parser: Callable, corpus, repeat: int) -> dict:
+    variants = {}
+    for variant, completion, expected in corpus:
+        variants.setdefault(variant, []).append((completion, expected))
+
+    results = {}
+    for variant, cases in variants.items():
+        recovered = sum(
+            parser(completion)[0] == expected for completion, expected in cases
+        )
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for completion, _ in cases:
+                parser(completion)
+        elapsed = time.perf_counter() - start
+        results[variant] = {
+            "us_per_parse": round(elapsed / (repeat * len(cases)) * 1e6, 2),
+            "recovered": f"{recovered}/{len(cases)}",
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM completion parsers")
+    parser.add_argument(
+        "--db", default="app_data.db", help="SQLite database with stored results"
+    )
+    parser.add_argument(
+        "--limit", type=int, default=500, help="Stored results used to build the corpus"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=200, help="Timed passes over the corpus"
+    )
+    args = parser.parse_args()
+
+    corpus = build_corpus(load_results(args.db, args.limit))
+    results = {
+        "completions": len(corpus),
+        "single_pass": measure(parse_refined_text_voice2, corpus, args.repeat),
+        "legacy_regex": measure(legacy_parse_refined_text_voice2, corpus, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
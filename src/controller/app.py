@@ -1,21 +1,43 @@
+import time
+
+# Measure how long the application module takes to import (reported by /ready)
+_import_start = time.perf_counter()
+
 from fastapi import FastAPI, UploadFile, File, Form, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import (
+    JSONResponse,
+    HTMLResponse,
+    Response,
+    PlainTextResponse,
+    FileResponse,
+)
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-import time
-import pandas as pd
+from starlette.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+import hmac
 import logging
 from typing import Optional
 import os
-import uvicorn
 import json
+import re
 from datetime import datetime
 import sys
 
 # Import your services
 from ..core.config import Config
 from ..model.pipeline import DataPipeline
-from ..core.database import DatabaseService
+from ..core.database import DatabaseService, ResultPending
+from ..core.db_connection import ConnectionManager
+from ..core.cold_storage import ColdStorageService
+from ..model.forms_catalog import FormsCatalogService
+from ..model.icd10 import ICD10Service
+from ..model.lexicon import LexiconService
+from ..core.scratch import ScratchManager, ScratchQuotaExceeded
+from ..core.admission import AdmissionController, AdmissionRejected
+from ..core.metrics import MetricsRegistry
+from ..core.profiling import ProfilingService
+from ..core.startup import StartupState
+from ..model.audio_preprocessing import AudioPreprocessingService
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -23,44 +45,115 @@ logger = logging.getLogger(__name__)
 # Initialize FastAPI app
 app = FastAPI(title="Audio Processing API")
 
+StartupState.record("import_app", time.perf_counter() - _import_start)
 
-def load_forms_dataframe():
-    try:
-        logger.info("Loading forms dataframe from data_latest.parquet")
-        df = pd.read_parquet("data_latest.parquet", engine="pyarrow")
-        logger.info(f"Loaded dataframe with {len(df)} forms")
-        return df
-    except Exception as e:
-        logger.error(f"Error loading forms dataframe: {str(e)}")
-        return pd.DataFrame(columns=['name', 'json_format'])
+
+def warm_up_forms_catalog():
+    """Load the form names and compile every form, so first requests hit the cache."""
+    for name in FormsCatalogService.get_form_names():
+        FormsCatalogService.get_compiled_form(name)
+
+
+def admission_rejected_response(error: AdmissionRejected):
+    """Build the 429 response for a request that could not be admitted."""
+    return JSONResponse(
+        content={
+            "error": str(error),
+            "stage": error.stage,
+            "retry_after": error.retry_after,
+        },
+        status_code=429,
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+def is_admin(request: Request) -> bool:
+    """Check the X-Admin-Token header against the configured admin token."""
+    token = request.headers.get("x-admin-token", "")
+    return bool(Config.ADMIN_TOKEN) and hmac.compare_digest(token, Config.ADMIN_TOKEN)
+
+def profiling_requested(request: Request) -> bool:
+    """Return True if the request opted in to profiling via ?profile=1 or X-Profile."""
+    flag = request.query_params.get("profile") or request.headers.get("x-profile") or ""
+    return flag.lower() in ("1", "true", "yes", "on")
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
     logger.info("Initializing application")
     
+    # Remove scratch workspaces left behind by processes that crashed or were killed
+    with StartupState.phase("scratch_sweep"):
+        ScratchManager.sweep_stale()
+    
     # Initialize database
-    db_initialized = DatabaseService.initialize_db()
+    with StartupState.phase("init_db"):
+        db_initialized = DatabaseService.initialize_db()
     if db_initialized:
         logger.info("Database initialized successfully")
     else:
         logger.error("Failed to initialize database")
+    
+    # Heavy dependencies are loaded in the background; /ready flips once they are
+    if Config.WARMUP:
+        StartupState.start_warm_up([
+            ("audio", AudioPreprocessingService.warm_up),
+            ("database", lambda: DatabaseService.get_audio_results(limit=1)),
+            ("search_index", DatabaseService.backfill_search_index),
+            ("rollups", DatabaseService.rebuild_rollups),
+            ("forms_catalog", warm_up_forms_catalog),
+            ("icd10", ICD10Service.get_index),
+            ("lexicon", LexiconService.get_lexicon),
+        ])
+    else:
+        StartupState.mark_ready()
+
+    # Old results are moved to compressed cold storage in the background
+    if db_initialized and Config.COLD_STORAGE_AGE_DAYS > 0:
+        ColdStorageService.start_background(DatabaseService.DB_PATH)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release resources held for the lifetime of the process"""
+    ColdStorageService.stop_background()
+    # Queued result writes must reach the database before connections close
+    DatabaseService.shutdown()
+    ConnectionManager.close_all()
+    ScratchManager.cleanup_all()
+
+@app.get("/health")
+async def health():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once warm-up finished, 503 before, with startup timings."""
+    report = StartupState.report()
+    return JSONResponse(content=report, status_code=200 if report["ready"] else 503)
 
 @app.get('/get_forms')
-async def get_forms():
-    df = load_forms_dataframe()
-    form_names = df['name'].dropna().unique().tolist()
-    return JSONResponse(form_names)
+async def get_forms(request: Request):
+    # May re-read the parquet file after it changed, so keep it off the event loop
+    form_names, etag = await run_in_threadpool(FormsCatalogService.get_form_listing)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(form_names, headers=headers)
 
 # Modify the existing upload endpoint to not require feedback initially
 @app.post("/upload")
 async def upload(
+    request: Request,
     audio: UploadFile = File(...),
     language: str = Form("en"),
     model: str = Form("deepseek"),
     isConversation: Optional[str] = Form(None),
     doctorName: Optional[str] = Form(None),  # Keep doctor name field
-    feedback: Optional[str] = Form(None)     # Make feedback optional (it will be populated later)
+    # Make feedback optional (it will be populated later)
+    feedback: Optional[str] = Form(None),
+    clinicalSheet: Optional[str] = Form(None),  # Form to extract into (see /get_forms)
+    # "llm" or "lexicon"; Config.REFINE_MODE when omitted
+    refineMode: Optional[str] = Form(None),
 ):
     """Handle file uploads and processing."""
     logger.info("Received upload request")
@@ -70,73 +163,157 @@ async def upload(
     logger.info(f"Upload parameters: language={language}, model={model}, conversational mode={conversational_mode}")
     logger.info(f"Doctor: {doctorName}")
     
+    # Fail fast on an unknown form rather than after transcription
+    form_name = clinicalSheet or None
+    # A catalog change re-reads the parquet file; keep it off the event loop
+    if form_name and await run_in_threadpool(
+        FormsCatalogService.get_compiled_form, form_name
+    ) is None:
+        return JSONResponse(
+            content={"error": f"Unknown clinical sheet: {form_name}"}, status_code=400
+        )
+    
+    refine_mode = (refineMode or Config.REFINE_MODE).lower()
+    if refine_mode not in DataPipeline.REFINE_MODES:
+        return JSONResponse(
+            content={"error": f"Unknown refine mode: {refineMode}"}, status_code=400
+        )
+    
+    # Profiling is an admin-only diagnostic; the flag is ignored for everyone else
+    profile = profiling_requested(request) and is_admin(request)
+    
+    # Reject early, before reading the body, if the first stage is saturated
+    try:
+        AdmissionController.check_capacity("preprocess")
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
+    
     # For recorded audio, set a default filename if none is provided
     if audio.filename == "":
         audio.filename = f"recorded_audio_{int(time.time())}.wav"
         logger.info(f"Set default filename: {audio.filename}")
     
-    # Save the uploaded file
+    # Save the uploaded file into a scratch workspace owned by this request only
+    # (on tmpfs when it fits), so concurrent requests never share file names
+    workspace = None
     try:
-        # Create a temporary file object
         contents = await audio.read()
-        file_path = os.path.join(Config.UPLOAD_FOLDER, audio.filename)
-        
-        # Ensure upload directory exists
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        workspace = ScratchManager.create(len(contents) * Config.SCRATCH_SIZE_FACTOR)
+        file_path = workspace.file_path(audio.filename)
         
         # Write file
         with open(file_path, "wb") as f:
             f.write(contents)
         logger.info(f"File saved to {file_path}")
+    except ScratchQuotaExceeded as e:
+        logger.warning(f"Upload rejected: {str(e)}")
+        return JSONResponse(
+            content={"error": str(e)}, status_code=503, headers={"Retry-After": "5"}
+        )
     except Exception as e:
         logger.error(f"Error saving file: {str(e)}", exc_info=True)
+        if workspace:
+            workspace.cleanup()
         return JSONResponse(content={"error": str(e)}, status_code=500)
     
+    # The pipeline thread owns the workspace once it starts: if the request is
+    # cancelled (client disconnect) the thread keeps writing into it, so only
+    # the thread may remove it and release its reservation
+    handed_over = False
+    
+    def process_in_workspace():
+        nonlocal handed_over
+        handed_over = True
+        try:
+            if profile:
+                return ProfilingService.run_profiled(
+                    audio.filename,
+                    DataPipeline.process_batch,
+                    file_path,
+                    language,
+                    model,
+                    conversational_mode,
+                    form_name,
+                    refine_mode,
+                )
+            return DataPipeline.process_batch(
+                file_path, language, model, conversational_mode, form_name, refine_mode
+            ), None
+        finally:
+            workspace.cleanup()
+    
     try:
         logger.info("Starting batch processing mode")
         
-        # Process the uploaded file
-        response_data = DataPipeline.process_batch(file_path, language, model, conversational_mode)
+        # Process the uploaded file off the event loop so queued requests don't block it
+        response_data, profile_id = await run_in_threadpool(process_in_workspace)
         
         # Save results to database
         json_data_str = json.dumps(response_data["json_data"]) if isinstance(response_data["json_data"], (dict, list)) else response_data["json_data"]
         
+        stage_timings = response_data.get("stage_timings", {})
+        
         # Store in database with new fields (feedback is initially empty or with minimal value)
-        result_id = DatabaseService.save_audio_result(
-            filename=audio.filename,
-            language=language,
-            model=model,
-            is_conversation=conversational_mode,
-            raw_text=response_data["raw_text"],
-            arabic_text=response_data["arabic_text"],
-            translation_text=response_data["translation_text"],
-            json_data=json_data_str,
-            reasoning=response_data["reasoning"],
-            preprocessing_time=response_data["preprocessing_time"],
-            voice_processing_time=response_data["voice_processing_time"],
-            llm_processing_time=3,
-            doctor_name=doctorName,
-            feedback=""  # Initially empty, will be populated via the save-feedback endpoint
-        )
+        # Without write-behind this waits on the id-block lock; keep it off the loop
+        with MetricsRegistry.track("db_write"):
+            result_id = await run_in_threadpool(
+                DatabaseService.save_audio_result,
+                filename=audio.filename,
+                language=language,
+                model=model,
+                is_conversation=conversational_mode,
+                raw_text=response_data["raw_text"],
+                arabic_text=response_data["arabic_text"],
+                translation_text=response_data["translation_text"],
+                json_data=json_data_str,
+                reasoning=response_data["reasoning"],
+                preprocessing_time=response_data["preprocessing_time"],
+                voice_processing_time=response_data["voice_processing_time"],
+                llm_processing_time=response_data["llm_processing_time"],
+                doctor_name=doctorName,
+                # Initially empty, will be populated via the save-feedback endpoint
+                feedback="",
+                validation_time=stage_timings.get("validate"),
+                refine_time=stage_timings.get("refine"),
+                translation_time=stage_timings.get("translate"),
+                extraction_time=stage_timings.get("extract"),
+                form_name=form_name,
+            )
+        if result_id is None:
+            MetricsRegistry.record_error("db_write")
         
         logger.info(f"Saved processing result to database with ID: {result_id}")
         
         # Return the response
-        return {
+        response = {
             "raw_text": response_data["raw_text"],
             "refine_text": response_data["arabic_text"],
             "translation_text": response_data["translation_text"],
             "json_data": response_data["json_data"],
+            "form_name": form_name,
             "reasoning": response_data["reasoning"],
             "preprocessing_time": response_data["preprocessing_time"],
             "voice_processing_time": response_data["voice_processing_time"],
+            "llm_processing_time": response_data["llm_processing_time"],
+            "stage_timings": stage_timings,
             "doctor_name": doctorName,
             "saved_to_db": result_id  # Return the actual ID so we can use it for saving feedback
         }
+        if profile_id:
+            response["profile_id"] = profile_id
+        return response
+    except AdmissionRejected as e:
+        logger.warning(f"Upload rejected by admission control: {str(e)}")
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"Error in batch processing: {str(e)}", exc_info=True)
         return JSONResponse(content={"error": str(e)}, status_code=500)
+    finally:
+        # Cancelled before the pipeline thread started: nothing else will remove it
+        if not handed_over:
+            workspace.cleanup()
     
+
 @app.post("/save-feedback")
 async def save_feedback(request: Request):
     """Save feedback for an existing result."""
@@ -149,8 +326,16 @@ async def save_feedback(request: Request):
         if not result_id:
             return JSONResponse(content={"error": "Missing result ID"}, status_code=400)
         
-        # Update the feedback in the database
-        success = DatabaseService.update_feedback(result_id, feedback)
+        # Update the feedback in the database; this
+        # may wait for a row queued by another worker
+        try:
+            success = await run_in_threadpool(
+                DatabaseService.update_feedback, result_id, feedback
+            )
+        except ResultPending as e:
+            logger.warning(str(e))
+            return JSONResponse(content={"error": str(e)}, status_code=503,
+                                headers={"Retry-After": str(e.retry_after)})
         
         if success:
             logger.info(f"Updated feedback for result ID: {result_id}")
@@ -163,34 +348,279 @@ async def save_feedback(request: Request):
         logger.error(f"Error saving feedback: {str(e)}", exc_info=True)
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
+MAX_PAGE_SIZE = 1000
+
+def parse_fields(fields: Optional[str]):
+    """Split a comma-separated ``fields`` query parameter."""
+    return [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard(request: Request):
+async def dashboard(
+    request: Request,
+    cursor: Optional[str] = None,
+    doctor: Optional[str] = None,
+    language: Optional[str] = None,
+    model: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
     """Display dashboard with stored results."""
     try:
-        results = DatabaseService.get_audio_results(limit=50)
+        # The list view never shows the full transcripts, so don't read them
+        page = await run_in_threadpool(
+            DatabaseService.get_audio_results_page,
+            limit=50, cursor=cursor, doctor_name=doctor, language=language, model=model,
+            date_from=date_from, date_to=date_to, fields=DatabaseService.SUMMARY_FIELDS
+        )
         return templates.TemplateResponse("dashboard.html", {
             "request": request,
-            "results": results
+            "results": page["results"],
+            "next_cursor": page["next_cursor"]
         })
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
     except Exception as e:
         logger.error(f"Error displaying dashboard: {str(e)}", exc_info=True)
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
 @app.get("/results")
-async def get_results(limit: int = 100):
-    """Retrieve recent processing results"""
+async def get_results(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    doctor: Optional[str] = None,
+    language: Optional[str] = None,
+    model: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Retrieve processing results, newest first.
+    
+    Pass the returned ``next_cursor`` as ``cursor`` to get the next page, and
+    ``fields`` (comma-separated, or ``summary``) to return only some columns.
+    """
     try:
-        results = DatabaseService.get_audio_results(limit)
-        return {"results": results, "count": len(results)}
+        selected = (
+            DatabaseService.SUMMARY_FIELDS
+            if fields == "summary"
+            else parse_fields(fields)
+        )
+        page = await run_in_threadpool(
+            DatabaseService.get_audio_results_page,
+            limit=min(limit, MAX_PAGE_SIZE),
+            cursor=cursor,
+            doctor_name=doctor,
+            language=language,
+            model=model,
+            date_from=date_from,
+            date_to=date_to,
+            fields=selected,
+        )
+        results = page["results"]
+        return {
+            "results": results,
+            "count": len(results),
+            "next_cursor": page["next_cursor"],
+        }
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
     except Exception as e:
         logger.error(f"Error retrieving results: {str(e)}", exc_info=True)
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
-if __name__ == "__main__":
-    logger.info(f"Starting FastAPI server on port {8587}")
+@app.get("/search")
+async def search(q: str, limit: int = 20, offset: int = 0):
+    """Full-text search over stored transcripts, ranked by relevance.
+    
+    Arabic queries match regardless of diacritics and alef/yaa/taa marbuta
+    spelling. Matched terms in ``snippet`` are wrapped in square brackets.
+    """
+    try:
+        page = await run_in_threadpool(
+            DatabaseService.search_results,
+            q, limit=max(1, min(limit, 100)), offset=max(0, offset)
+        )
+        results = page["results"]
+        return {
+            "results": results,
+            "count": len(results),
+            "next_offset": page["next_offset"],
+        }
+    except Exception as e:
+        logger.error(f"Error searching results: {str(e)}", exc_info=True)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.get("/export/parquet")
+async def export_parquet(
+    request: Request,
+    columns: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    since: Optional[str] = None
+):
+    """Download results as a Parquet file (admin only).
+    
+    ``since`` names an incremental export: only rows added since the previous
+    export with the same name are included, and its watermark is advanced.
+    """
+    if not is_admin(request):
+        return JSONResponse(content={"error": "Forbidden"}, status_code=403)
+
+    # Exports can be much larger than an upload, so keep them off the tmpfs
+    workspace = ScratchManager.create(on_disk=True)
+    path = os.path.join(workspace.path, "audio_results.parquet")
+    try:
+        stats = await run_in_threadpool(
+            DatabaseService.export_parquet,
+            path,
+            columns=parse_fields(columns),
+            date_from=date_from,
+            date_to=date_to,
+            watermark_name=since,
+        )
+    except ValueError as e:
+        workspace.cleanup()
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        workspace.cleanup()
+        logger.error(f"Error exporting results: {str(e)}", exc_info=True)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+    except BaseException:
+        # Cancelled (client went away) before the response was built
+        workspace.cleanup()
+        raise
+
+    headers = {"X-Export-Rows": str(stats["rows"])}
+    if stats["watermark"]:
+        headers["X-Export-Watermark"] = (
+            f"{stats['watermark']['insertion_date']},{stats['watermark']['id']}"
+        )
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename="audio_results.parquet",
+        headers=headers,
+        background=BackgroundTask(workspace.cleanup)
+    )
+
+@app.get("/icd10/lookup")
+async def icd10_lookup(q: str, limit: int = 10):
+    """Validate, complete or search ICD-10 codes against the local index.
+    
+    ``q`` may be a code (``J45.909``), a code prefix (``J45``) or words from
+    a description (``asthma exacerbation``).
+    """
+    limit = max(1, min(limit, 100))
+
+    def lookup():
+        # The first call loads the whole index; keep it off the event loop
+        index = ICD10Service.get_index()
+        exact = index.lookup(q)
+        completions = (
+            index.complete(q, limit=limit) if re.match(r"^\s*[A-Za-z]\d", q) else []
+        )
+        matches = completions or index.search(q, limit=limit)
+        # A partial index cannot rule a code out (None means unknown)
+        valid = True if exact else (False if index.full_code_set else None)
+        return {"query": q, "valid": valid, "code": exact, "results": matches}
+
+    return await run_in_threadpool(lookup)
+
+@app.get("/icd10")
+async def icd10(prefix: str, limit: int = 100, date_from: Optional[str] = None,
+                date_to: Optional[str] = None):
+    """Encounters coded within an ICD-10 family (``J45``, ``J45.x``, ``J45.9``)."""
+    try:
+        page = await run_in_threadpool(
+            DatabaseService.find_by_icd10,
+            prefix,
+            limit=max(1, min(limit, MAX_PAGE_SIZE)),
+            date_from=date_from,
+            date_to=date_to,
+        )
+        return {**page, "count": len(page["results"])}
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Error querying ICD-10 index: {str(e)}", exc_info=True)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.get("/analytics")
+async def analytics(metrics: Optional[str] = None, group_by: Optional[str] = None,
+                    granularity: Optional[str] = None, date_from: Optional[str] = None,
+                    date_to: Optional[str] = None, language: Optional[str] = None,
+                    model: Optional[str] = None, doctor: Optional[str] = None):
+    """Request volume and p50/p95/p99 stage latencies from the hourly rollups.
     
+    ``metrics`` and ``group_by`` are comma separated (group_by: language, model,
+    doctor_name); ``granularity`` is hour, day or month for a time series.
+    """
+    try:
+        results = await run_in_threadpool(
+            DatabaseService.get_analytics,
+            metrics=parse_fields(metrics),
+            group_by=parse_fields(group_by) or (),
+            granularity=granularity,
+            date_from=date_from,
+            date_to=date_to,
+            language=language,
+            model=model,
+            doctor_name=doctor
+        )
+        # While the rollups are rebuilt the percentiles miss part of the history
+        stale = await run_in_threadpool(DatabaseService.rollups_stale)
+        return {"results": results, "count": len(results), "stale": stale}
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Error computing analytics: {str(e)}", exc_info=True)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+@app.get("/queues")
+async def get_queues():
+    """Report live concurrency and queue depth of each pipeline stage."""
+    return AdmissionController.snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose per-stage latency, in-flight and error metrics for Prometheus."""
+    return PlainTextResponse(
+        MetricsRegistry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """List stored request profiles (admin only)."""
+    if not is_admin(request):
+        return JSONResponse(content={"error": "Forbidden"}, status_code=403)
+    return {"profiles": ProfilingService.list_profiles()}
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, kind: str = "json"):
+    """Download a stored profile: the JSON summary or raw cProfile stats (kind=prof)."""
+    if not is_admin(request):
+        return JSONResponse(content={"error": "Forbidden"}, status_code=403)
+    path = ProfilingService.get_artifact_path(profile_id, kind)
+    if not path:
+        return JSONResponse(content={"error": "Profile not found"}, status_code=404)
+    media_type = "application/json" if kind == "json" else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=f"{profile_id}.{kind}")
+
+if __name__ == "__main__":
     # Add project root to Python path
     project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     sys.path.insert(0, project_root)
     
-    uvicorn.run("src.controller.app:app", host="0.0.0.0", port=8587, reload=Config.DEBUG)
+    import uvicorn
+    
+    if Config.DEBUG:
+        # Reload watches the source tree and is only supported with a single process
+        logger.info(f"Starting FastAPI server on port {8587} with reload")
+        uvicorn.run("src.controller.app:app", host="0.0.0.0", port=8587, reload=True)
+    else:
+        logger.info(
+            f"Starting FastAPI server on port {8587} with {Config.WORKERS} workers"
+        )
+        uvicorn.run(
+            "src.controller.app:app", host="0.0.0.0", port=8587, workers=Config.WORKERS
+        )
@@ -0,0 +1,157 @@
+import time
+import math
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a pipeline stage cannot admit more work."""
+
+    def __init__(self, stage: str, retry_after: int, reason: str = "queue full"):
+        self.stage = stage
+        self.retry_after = retry_after
+        self.reason = reason
+        super().__init__(
+            f"Stage '{stage}' is overloaded ({reason}), retry after {retry_after}s"
+        )
+
+
+class StageLimiter:
+    """Concurrency limit with a bounded, time-limited wait queue for one stage."""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, timeout: float):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Moving average of how long a slot is held, used for Retry-After
+        self._avg_hold = 1.0
+        self._cond = threading.Condition()
+
+    def retry_after(self) -> int:
+        """Estimate how many seconds until a queued request would be served."""
+        backlog = (self.waiting + 1) / self.concurrency
+        return max(1, math.ceil(backlog * self._avg_hold))
+
+    def check_capacity(self) -> None:
+        """Raise if a new request would be neither admitted nor queued."""
+        with self._cond:
+            if self.active >= self.concurrency and self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(self.name, self.retry_after())
+
+    def acquire(self) -> None:
+        """Take a slot, waiting in the queue up to ``timeout`` seconds."""
+        with self._cond:
+            if self.active >= self.concurrency:
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise AdmissionRejected(self.name, self.retry_after())
+                self.waiting += 1
+                deadline = time.monotonic() + self.timeout
+                try:
+                    while self.active >= self.concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            raise AdmissionRejected(
+                                self.name, self.retry_after(), "queue timeout"
+                            )
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+
+    def release(self, held_for: float) -> None:
+        """Give a slot back and wake up the next waiter."""
+        with self._cond:
+            self.active -= 1
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held_for
+            self._cond.notify()
+
+    def snapshot(self) -> dict:
+        """Return the live state of this stage."""
+        with self._cond:
+            return {
+                "concurrency": self.concurrency,
+                "active": self.active,
+                "waiting": self.waiting,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_hold_seconds": round(self._avg_hold, 3),
+            }
+
+
+class AdmissionController:
+    """Per-stage admission control for the processing pipeline.
+
+    Each stage (preprocess, asr, llm) has its own concurrency limit and a
+    bounded wait queue. Requests that find the queue full, or wait longer than
+    ``Config.ADMISSION_TIMEOUT``, get an ``AdmissionRejected`` that the API
+    turns into ``429`` with a ``Retry-After`` header.
+    """
+
+    _lock = threading.Lock()
+    _stages: Dict[str, StageLimiter] = {}
+
+    @classmethod
+    def _build_stages(cls) -> Dict[str, StageLimiter]:
+        limits = {
+            "preprocess": Config.PREPROCESS_CONCURRENCY,
+            "asr": Config.ASR_CONCURRENCY,
+            "llm": Config.LLM_CONCURRENCY,
+        }
+        return {
+            name: StageLimiter(
+                name, limit, Config.ADMISSION_QUEUE_SIZE, Config.ADMISSION_TIMEOUT
+            )
+            for name, limit in limits.items()
+        }
+
+    @classmethod
+    def get_stage(cls, name: str) -> StageLimiter:
+        """Return the limiter for a stage, creating all limiters on first use."""
+        with cls._lock:
+            if not cls._stages:
+                cls._stages = cls._build_stages()
+            return cls._stages[name]
+
+    @classmethod
+    @contextmanager
+    def stage(cls, name: str):
+        """Hold a slot of the given stage for the duration of the block."""
+        limiter = cls.get_stage(name)
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.release(time.monotonic() - start)
+
+    @classmethod
+    def check_capacity(cls, name: str) -> None:
+        """Fail fast if the stage's wait queue is already full."""
+        try:
+            cls.get_stage(name).check_capacity()
+        except AdmissionRejected:
+            logger.warning(f"Rejecting request at admission: stage '{name}' is full")
+            raise
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """Return live queue depths and counters for every stage."""
+        cls.get_stage("preprocess")
+        return {name: limiter.snapshot() for name, limiter in cls._stages.items()}
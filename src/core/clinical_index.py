@@ -0,0 +1,311 @@
+import re
+import json
+import logging
+from typing import Iterable, List, Optional, Tuple
+from .cold_storage import ColdStorageService
+
+logger = logging.getLogger(__name__)
+
+
+class ClinicalIndexService:
+    """Indexed side tables for the structured data extracted into json_data.
+
+    ``json_data`` is stored as an opaque JSON string. At insert time its ICD-10
+    codes are normalized into ``encounter_icd_codes`` (one row per code) and a
+    few key fields are copied into ``encounter_fields``, so questions like
+    "every encounter coded J45.x last month" are answered with an index range
+    scan instead of parsing every row.
+
+    Codes are stored with a ``code_key`` (upper case, no dot: ``J45909``), so
+    a code family is a contiguous key range and prefix queries need no LIKE.
+    """
+
+    CODES_TABLE = "encounter_icd_codes"
+    FIELDS_TABLE = "encounter_fields"
+    KEY_FIELDS = ("chief_complaint", "assessment", "plan", "follow_up")
+
+    # Letter, digit, alphanumeric, then an optional
+    # dotted extension of up to 4 characters
+    CODE_PATTERN = re.compile(r"\b([A-Z][0-9][0-9A-Z])(?:\.?([0-9A-Z]{1,4}))?\b")
+    # "J45.909 - Unspecified asthma", "J45.909: ...", "J45.909 (…)"
+    DESCRIPTION_SEPARATOR = re.compile(r"^\s*[-:–—(]?\s*")
+
+    @classmethod
+    def create_schema(cls, cursor) -> None:
+        """Create the side tables and their indexes."""
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {cls.CODES_TABLE} (
+            result_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            code_key TEXT NOT NULL,
+            description TEXT,
+            insertion_date TIMESTAMP NOT NULL,
+            PRIMARY KEY (result_id, position)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS idx_{cls.CODES_TABLE}_code_key
+        ON {cls.CODES_TABLE} (code_key, insertion_date DESC, result_id DESC)
+        ''')
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {cls.FIELDS_TABLE} (
+            result_id INTEGER PRIMARY KEY,
+            {", ".join(f"{field} TEXT" for field in cls.KEY_FIELDS)}
+        )
+        ''')
+
+    @classmethod
+    def normalize_code(cls, text: str) -> Optional[Tuple[str, str]]:
+        """Return ``(code, code_key)`` for the first ICD-10 code in ``text``.
+
+        ``j45909``, ``J45.909`` and ``J45.909 - Asthma`` all give
+        ``("J45.909", "J45909")``.
+        """
+        match = cls.CODE_PATTERN.search(str(text).upper())
+        if not match:
+            return None
+        category, extension = match.group(1), match.group(2) or ""
+        code = f"{category}.{extension}" if extension else category
+        return code, category + extension
+
+    @classmethod
+    def code_key_prefix(cls, prefix: str) -> str:
+        """Normalize a code family query (``J45``, ``j45.x``, ``J45.9*``) to a key."""
+        key = re.sub(r"(\.X+|\.?\*)$", "", str(prefix).strip().upper())
+        key = re.sub(r"[^0-9A-Z]", "", key)
+        if not key:
+            raise ValueError("ICD-10 code prefix must not be empty")
+        return key
+
+    @classmethod
+    def extract_codes(cls, json_data) -> List[Tuple[str, str, Optional[str]]]:
+        """Return ``(code, code_key, description)`` for each code in json_data."""
+        data = cls._load(json_data)
+        entries = data.get("icd10_codes") or []
+        if isinstance(entries, str):
+            entries = re.split(r"[,;\n]", entries)
+
+        codes, seen = [], set()
+        for entry in entries:
+            if isinstance(entry, dict):
+                raw = entry.get("code") or ""
+                description = entry.get("description")
+            else:
+                raw, description = str(entry), None
+            normalized = cls.normalize_code(raw)
+            if not normalized or normalized[1] in seen:
+                continue
+            seen.add(normalized[1])
+            if description is None and not isinstance(entry, dict):
+                match = cls.CODE_PATTERN.search(raw.upper())
+                description = (
+                    cls.DESCRIPTION_SEPARATOR.sub("", raw[match.end():]).rstrip(" )")
+                    or None
+                )
+            codes.append((*normalized, description))
+        return codes
+
+    @staticmethod
+    def _load(json_data) -> dict:
+        if isinstance(json_data, dict):
+            return json_data
+        if not json_data:
+            return {}
+        try:
+            data = json.loads(json_data)
+        except (TypeError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    @classmethod
+    def index_rows(cls, conn, records: Iterable[dict]) -> None:
+        """Replace the side-table rows of the given audio_results rows."""
+        records = list(records)
+        ids = [(record["id"],) for record in records]
+        conn.executemany(f"DELETE FROM {cls.CODES_TABLE} WHERE result_id = ?", ids)
+
+        code_rows, field_rows = [], []
+        for record in records:
+            for position, (code, code_key, description) in enumerate(
+                cls.extract_codes(record.get("json_data"))
+            ):
+                code_rows.append(
+                    (
+                        record["id"],
+                        position,
+                        code,
+                        code_key,
+                        description,
+                        record["insertion_date"],
+                    )
+                )
+            data = cls._load(record.get("json_data"))
+            values = [data.get(field) for field in cls.KEY_FIELDS]
+            values = [
+                (
+                    None
+                    if value in (None, "", "null")
+                    else value if isinstance(value, str) else json.dumps(value)
+                )
+                for value in values
+            ]
+            field_rows.append((record["id"], *values))
+
+        conn.executemany(
+            f"INSERT INTO {cls.CODES_TABLE} "
+            "(result_id, position, code, code_key, description, insertion_date) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            code_rows,
+        )
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {cls.FIELDS_TABLE} "
+            f"(result_id, {', '.join(cls.KEY_FIELDS)}) "
+            f"VALUES ({', '.join('?' * (len(cls.KEY_FIELDS) + 1))})",
+            field_rows,
+        )
+
+    @classmethod
+    def backfill(cls, conn, batch_size: int = 500, rebuild: bool = False) -> int:
+        """Index existing rows in batches, committing after each batch.
+
+        Args:
+            batch_size: Rows per transaction
+            rebuild: Re-index every row instead of only rows missing from the index
+
+        Returns:
+            int: Number of rows indexed
+        """
+        missing = (
+            ""
+            if rebuild
+            else f"AND NOT EXISTS (SELECT 1 FROM {cls.FIELDS_TABLE} f "
+            "WHERE f.result_id = audio_results.id)"
+        )
+        total = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(f'''
+                SELECT id, json_data, insertion_date FROM audio_results
+                WHERE id > ? {missing}
+                ORDER BY id LIMIT ?
+            ''', (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            cls.index_rows(
+                conn, ColdStorageService.hydrate(conn, [dict(row) for row in rows])
+            )
+            conn.commit()
+            total += len(rows)
+            last_id = rows[-1]["id"]
+            logger.info(f"Indexed ICD-10 codes up to result {last_id} ({total} rows)")
+        return total
+
+    @classmethod
+    def find_by_code(
+        cls,
+        conn,
+        prefix: str,
+        limit: int = 100,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+    ) -> List[dict]:
+        """Return encounters with a code in the ``prefix`` family, newest first.
+
+        Each encounter appears once, with the codes that matched.
+        """
+        key = cls.code_key_prefix(prefix)
+        # Every key starting with the prefix sorts
+        # between the prefix and the prefix + '~'
+        conditions = ["c.code_key >= ?", "c.code_key < ?"]
+        params = [key, key + "~"]
+        if date_from:
+            conditions.append("c.insertion_date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("c.insertion_date < ?")
+            params.append(date_to)
+
+        rows = conn.execute(f'''
+            SELECT c.result_id, c.insertion_date, group_concat(c.code, ',') AS codes,
+                   r.doctor_name, r.language, r.model,
+                   {", ".join(f"f.{field}" for field in cls.KEY_FIELDS)}
+            FROM {cls.CODES_TABLE} c
+            JOIN audio_results r ON r.id = c.result_id
+            LEFT JOIN {cls.FIELDS_TABLE} f ON f.result_id = c.result_id
+            WHERE {" AND ".join(conditions)}
+            GROUP BY c.result_id
+            ORDER BY c.insertion_date DESC, c.result_id DESC
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
+
+        results = []
+        for row in rows:
+            result = dict(row)
+            result["codes"] = result["codes"].split(",")
+            results.append(result)
+        return results
+
+    @classmethod
+    def code_counts(cls, conn, prefix: str, date_from: Optional[str] = None,
+                    date_to: Optional[str] = None) -> List[dict]:
+        """Return the number of encounters per code within the ``prefix`` family."""
+        key = cls.code_key_prefix(prefix)
+        conditions = ["code_key >= ?", "code_key < ?"]
+        params = [key, key + "~"]
+        if date_from:
+            conditions.append("insertion_date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("insertion_date < ?")
+            params.append(date_to)
+        rows = conn.execute(f'''
+            SELECT code, COUNT(DISTINCT result_id) AS encounters
+            FROM {cls.CODES_TABLE}
+            WHERE {" AND ".join(conditions)}
+            GROUP BY code_key
+            ORDER BY encounters DESC, code
+        ''', params).fetchall()
+        return [dict(row) for row in rows]
+
+
+def main():
+    """Backfill the ICD-10 index for results stored before it existed."""
+    import argparse
+    import sqlite3
+    import time
+    from .database import DatabaseService
+
+    parser = argparse.ArgumentParser(
+        description="Backfill the ICD-10 code index from audio_results.json_data"
+    )
+    parser.add_argument("--db", default="app_data.db", help="SQLite database path")
+    parser.add_argument(
+        "--batch-size", type=int, default=500, help="Rows per transaction"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Re-index every row, not only missing ones",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # Bring older databases up to the current schema; the backfill reads the
+    # cold storage table
+    DatabaseService.DB_PATH = args.db
+    if not DatabaseService.initialize_db():
+        raise SystemExit(f"Could not initialize the database at {args.db}")
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+
+    start = time.perf_counter()
+    total = ClinicalIndexService.backfill(
+        conn, batch_size=args.batch_size, rebuild=args.rebuild
+    )
+    conn.close()
+    logger.info(f"Indexed {total} results in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
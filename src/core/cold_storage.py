@@ -0,0 +1,452 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence
+from .config import Config
+from .db_connection import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class ColdStorageService:
+    """Compressed cold tier for the bulky text columns of old results.
+
+    Rows older than ``COLD_STORAGE_AGE_DAYS`` have their large text columns
+    packed into one compressed blob in ``audio_results_cold`` and set to NULL
+    in ``audio_results``, so the hot table stays small and range scans over
+    recent rows touch far fewer pages. ``hydrate`` puts the columns back when
+    rows are read, so callers of DatabaseService never see the difference.
+
+    Blobs are compressed with zstd when the ``zstandard`` package is installed
+    and with zlib otherwise, both with a dictionary built from a sample of the
+    rows being compacted: transcripts are short and repetitive, which is where
+    a shared dictionary helps most. Dictionaries are stored in
+    ``cold_dictionaries`` and never change once written, so old blobs stay
+    readable. zstd needs a reasonable amount of sample data to train on; until
+    there is enough, a zlib dictionary is used, and a zstd one is trained on a
+    later run.
+
+    Every server process starts the background loop, but only the one holding
+    the lease row in ``cold_storage_lease`` compacts and vacuums. The lease
+    lasts ``LEASE_INTERVALS`` intervals and is renewed on each run, so another
+    process takes over when its holder dies.
+    """
+
+    TABLE = "audio_results_cold"
+    DICTIONARY_TABLE = "cold_dictionaries"
+    LEASE_TABLE = "cold_storage_lease"
+    LEASE_INTERVALS = 3
+    COLUMNS = ("raw_text", "arabic_text", "translation_text", "reasoning", "json_data")
+    # zlib only uses the last 32 KB of a preset dictionary
+    ZLIB_DICTIONARY_SIZE = 32 * 1024
+    ZSTD_DICTIONARY_SIZE = 112 * 1024
+    DICTIONARY_SAMPLES = 2000
+    # Below this much sample data zstd training fails or gives a useless dictionary
+    ZSTD_MIN_SAMPLES = 100
+    ZSTD_MIN_SAMPLE_BYTES = 4 * ZSTD_DICTIONARY_SIZE
+
+    _dictionaries: Dict[int, tuple] = {}
+    # zlib objects primed with a dictionary; copying
+    # one is much cheaper than priming a new one
+    _zlib_compressors: Dict[int, object] = {}
+    _zlib_decompressors: Dict[int, object] = {}
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+    _stopping = threading.Event()
+    _holder: Optional[str] = None
+    _db_path: Optional[str] = None
+
+    @classmethod
+    def create_schema(cls, cursor) -> None:
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {cls.DICTIONARY_TABLE} (
+            id INTEGER PRIMARY KEY,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        ''')
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {cls.TABLE} (
+            result_id INTEGER PRIMARY KEY,
+            dictionary_id INTEGER NOT NULL,
+            payload BLOB NOT NULL
+        )
+        ''')
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {cls.LEASE_TABLE} (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        ''')
+
+    @staticmethod
+    def _zstd():
+        try:
+            import zstandard
+            return zstandard
+        except ImportError:
+            return None
+
+    # Compression
+
+    @classmethod
+    def _encode(cls, record: dict) -> bytes:
+        return json.dumps({column: record.get(column) for column in cls.COLUMNS},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def _get_dictionary(cls, conn, dictionary_id: int) -> tuple:
+        """Return ``(codec, data)`` of a stored dictionary, cached per process."""
+        with cls._lock:
+            cached = cls._dictionaries.get(dictionary_id)
+        if cached is None:
+            row = conn.execute(
+                f"SELECT codec, data FROM {cls.DICTIONARY_TABLE} WHERE id = ?",
+                (dictionary_id,),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Missing cold storage dictionary {dictionary_id}")
+            cached = (row[0], bytes(row[1]))
+            with cls._lock:
+                cls._dictionaries[dictionary_id] = cached
+        return cached
+
+    @classmethod
+    def _train_zstd(cls, samples: List[bytes]) -> Optional[bytes]:
+        """Train a zstd dictionary, or return None when the samples are not enough."""
+        zstd = cls._zstd()
+        if zstd is None:
+            return None
+        if (
+            len(samples) < cls.ZSTD_MIN_SAMPLES
+            or sum(map(len, samples)) < cls.ZSTD_MIN_SAMPLE_BYTES
+        ):
+            logger.info(
+                f"Not enough samples for a zstd dictionary yet ({len(samples)} rows, "
+                f"{sum(map(len, samples))} bytes)"
+            )
+            return None
+        try:
+            return zstd.train_dictionary(cls.ZSTD_DICTIONARY_SIZE, samples).as_bytes()
+        except Exception as e:
+            logger.warning(f"zstd dictionary training failed, using zlib: {str(e)}")
+            return None
+
+    @classmethod
+    def _train_dictionary(
+        cls, conn, samples: List[bytes], zstd_only: bool = False
+    ) -> Optional[int]:
+        """Build a dictionary from sample payloads and store it.
+
+        Trains a zstd dictionary when possible and a zlib one otherwise. With
+        ``zstd_only`` (a zlib dictionary already exists) nothing is stored
+        unless zstd training succeeds, and None is returned.
+        """
+        data = cls._train_zstd(samples)
+        if data is not None:
+            codec = "zstd"
+        elif zstd_only:
+            return None
+        else:
+            codec = "zlib"
+            # zlib only keeps the end of the dictionary and favours the closest
+            # matches, so the newest samples go last
+            data = b"".join(samples)[-cls.ZLIB_DICTIONARY_SIZE:]
+        cursor = conn.execute(
+            f"INSERT INTO {cls.DICTIONARY_TABLE} (codec, data, created_at) "
+            "VALUES (?, ?, ?)",
+            (codec, data, datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")),
+        )
+        logger.info(
+            f"Trained {len(data)} byte {codec} dictionary from {len(samples)} samples"
+        )
+        return cursor.lastrowid
+
+    @classmethod
+    def _current_dictionary(cls, conn) -> Optional[tuple]:
+        """Return ``(id, codec)`` of the newest dictionary the installed codecs read."""
+        codecs = ("zstd", "zlib") if cls._zstd() is not None else ("zlib",)
+        row = conn.execute(
+            f"SELECT id, codec FROM {cls.DICTIONARY_TABLE} "
+            f"WHERE codec IN ({', '.join('?' * len(codecs))}) "
+            f"ORDER BY codec = ? DESC, id DESC LIMIT 1",
+            (*codecs, codecs[0])
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    @classmethod
+    def compress(cls, conn, dictionary_id: int, payload: bytes) -> bytes:
+        codec, data = cls._get_dictionary(conn, dictionary_id)
+        if codec == "zstd":
+            zstd = cls._zstd()
+            return zstd.ZstdCompressor(
+                level=10, dict_data=zstd.ZstdCompressionDict(data)
+            ).compress(payload)
+        primed = cls._zlib_compressors.get(dictionary_id)
+        if primed is None:
+            primed = cls._zlib_compressors[dictionary_id] = zlib.compressobj(
+                level=6, zdict=data
+            )
+        compressor = primed.copy()
+        return compressor.compress(payload) + compressor.flush()
+
+    @classmethod
+    def decompress(cls, conn, dictionary_id: int, blob: bytes) -> dict:
+        codec, data = cls._get_dictionary(conn, dictionary_id)
+        if codec == "zstd":
+            zstd = cls._zstd()
+            if zstd is None:
+                raise RuntimeError(
+                    "zstandard is required to read results compressed with zstd"
+                )
+            payload = zstd.ZstdDecompressor(
+                dict_data=zstd.ZstdCompressionDict(data)
+            ).decompress(blob)
+        else:
+            primed = cls._zlib_decompressors.get(dictionary_id)
+            if primed is None:
+                primed = cls._zlib_decompressors[dictionary_id] = zlib.decompressobj(
+                    zdict=data
+                )
+            decompressor = primed.copy()
+            payload = decompressor.decompress(blob) + decompressor.flush()
+        return json.loads(payload)
+
+    # Reads
+
+    @classmethod
+    def hydrate(
+        cls, conn, rows: List[dict], columns: Optional[Sequence[str]] = None
+    ) -> List[dict]:
+        """Fill in the cold columns of rows that were compacted, in place.
+
+        Only rows that have an ``id`` and were read with at least one cold
+        column need a lookup; everything else is returned untouched.
+        """
+        wanted = [
+            column for column in (columns or cls.COLUMNS) if column in cls.COLUMNS
+        ]
+        ids = [
+            row["id"]
+            for row in rows
+            if "id" in row and any(column in row for column in wanted)
+        ]
+        if not ids:
+            return rows
+
+        blobs = {}
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            blobs.update(
+                (result_id, (dictionary_id, payload))
+                for result_id, dictionary_id, payload in conn.execute(
+                    f"SELECT result_id, dictionary_id, payload FROM {cls.TABLE} "
+                    f"WHERE result_id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        if not blobs:
+            return rows
+
+        for row in rows:
+            cold = blobs.get(row.get("id"))
+            if cold:
+                values = cls.decompress(conn, *cold)
+                for column in wanted:
+                    if column in row:
+                        row[column] = values.get(column)
+        return rows
+
+    # Compaction
+
+    @classmethod
+    def compact(cls, db_path: str, age_days: Optional[float] = None,
+                batch_size: Optional[int] = None) -> int:
+        """Move the text columns of rows older than ``age_days`` to the cold table.
+
+        Each batch is written in its own short transaction, so the server
+        keeps writing while a large backlog is compacted.
+
+        Returns:
+            int: Number of rows moved
+        """
+        age_days = Config.COLD_STORAGE_AGE_DAYS if age_days is None else age_days
+        batch_size = batch_size or Config.COLD_STORAGE_BATCH_SIZE
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=age_days)).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
+        select = (
+            f"SELECT id, {', '.join(cls.COLUMNS)} FROM audio_results "
+            f"WHERE insertion_date < ? AND id > ? "
+            f"AND NOT EXISTS (SELECT 1 FROM {cls.TABLE} c "
+            f"WHERE c.result_id = audio_results.id) "
+            f"ORDER BY id LIMIT ?"
+        )
+        clear = (
+            f"UPDATE audio_results SET {', '.join(f'{c} = NULL' for c in cls.COLUMNS)} "
+            "WHERE id = ?"
+        )
+
+        conn = ConnectionManager.get_connection(db_path)
+        current = cls._current_dictionary(conn)
+        dictionary_id = current[0] if current else None
+        # Train when there is no dictionary yet, or to replace a zlib fallback with zstd
+        if current is None or (current[1] != "zstd" and cls._zstd() is not None):
+            samples = [
+                cls._encode(dict(row))
+                for row in conn.execute(
+                    f"{select.replace('ORDER BY id', 'ORDER BY id DESC')}",
+                    (cutoff, 0, cls.DICTIONARY_SAMPLES),
+                )
+            ]
+            if not samples:
+                return 0
+            with ConnectionManager.transaction(db_path):
+                trained = cls._train_dictionary(
+                    conn, samples[::-1], zstd_only=current is not None
+                )
+            dictionary_id = trained or dictionary_id
+
+        total, last_id, raw_bytes, stored_bytes = 0, 0, 0, 0
+        start = time.perf_counter()
+        while not cls._stopping.is_set():
+            rows = conn.execute(select, (cutoff, last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            # Compress before taking the write lock so request writes are not held up
+            cold_rows = []
+            for row in rows:
+                payload = cls._encode(dict(row))
+                blob = cls.compress(conn, dictionary_id, payload)
+                raw_bytes += len(payload)
+                stored_bytes += len(blob)
+                cold_rows.append((row["id"], dictionary_id, blob))
+            with ConnectionManager.transaction(db_path):
+                # Another worker may have moved some of these rows meanwhile; its blobs
+                # hold the same data
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO {cls.TABLE} "
+                    "(result_id, dictionary_id, payload) VALUES (?, ?, ?)",
+                    cold_rows,
+                )
+                conn.executemany(clear, [(row["id"],) for row in rows])
+            total += len(rows)
+            last_id = rows[-1]["id"]
+
+        if total:
+            logger.info(
+                f"Moved {total} results to cold storage "
+                f"in {time.perf_counter() - start:.2f}s "
+                f"({raw_bytes} -> {stored_bytes} bytes)"
+            )
+        return total
+
+    @classmethod
+    def vacuum_if_needed(
+        cls, db_path: str, min_free_ratio: Optional[float] = None
+    ) -> bool:
+        """VACUUM when at least ``min_free_ratio`` of the file is free pages."""
+        min_free_ratio = (
+            Config.COLD_STORAGE_VACUUM_RATIO
+            if min_free_ratio is None
+            else min_free_ratio
+        )
+        conn = ConnectionManager.get_connection(db_path)
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        total_pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        if not total_pages or free_pages / total_pages < min_free_ratio:
+            return False
+        start = time.perf_counter()
+        conn.execute("VACUUM")
+        logger.info(
+            f"VACUUM reclaimed {free_pages} of {total_pages} pages "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+        return True
+
+    @classmethod
+    def run_once(cls, db_path: str) -> int:
+        moved = cls.compact(db_path)
+        cls.vacuum_if_needed(db_path)
+        return moved
+
+    @classmethod
+    def acquire_lease(cls, db_path: str, holder: str, duration: float) -> bool:
+        """Take or renew the compaction lease; False while another process holds it."""
+        conn = ConnectionManager.get_connection(db_path)
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT holder, expires_at FROM {cls.LEASE_TABLE} "
+                "WHERE name = 'compaction'"
+            ).fetchone()
+            if row and row[0] != holder and row[1] > now:
+                conn.rollback()
+                return False
+            conn.execute(
+                f"INSERT OR REPLACE INTO {cls.LEASE_TABLE} (name, holder, expires_at) "
+                "VALUES ('compaction', ?, ?)",
+                (holder, now + duration),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return True
+
+    @classmethod
+    def release_lease(cls, db_path: str, holder: str) -> None:
+        with ConnectionManager.transaction(db_path) as conn:
+            conn.execute(
+                f"DELETE FROM {cls.LEASE_TABLE} "
+                "WHERE name = 'compaction' AND holder = ?",
+                (holder,),
+            )
+
+    @classmethod
+    def start_background(cls, db_path: str, interval: Optional[float] = None) -> None:
+        """Compact and vacuum every ``interval`` seconds while holding the lease."""
+        interval = Config.COLD_STORAGE_INTERVAL if interval is None else interval
+        if cls._thread is not None and cls._thread.is_alive():
+            return
+        cls._stopping.clear()
+        holder = cls._holder = f"{os.getpid()}-{uuid.uuid4().hex}"
+        cls._db_path = db_path
+
+        def run():
+            while not cls._stopping.wait(interval):
+                try:
+                    lease = interval * cls.LEASE_INTERVALS
+                    if cls.acquire_lease(db_path, holder, lease):
+                        cls.run_once(db_path)
+                except Exception as e:
+                    logger.error(
+                        f"Cold storage compaction failed: {str(e)}", exc_info=True
+                    )
+            ConnectionManager.close_thread_connections()
+
+        cls._thread = threading.Thread(target=run, name="cold-storage", daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop_background(cls) -> None:
+        cls._stopping.set()
+        if cls._thread is not None:
+            cls._thread.join(timeout=30)
+            cls._thread = None
+        if cls._holder is not None:
+            # Let another process take over without waiting for the lease to expire
+            try:
+                cls.release_lease(cls._db_path, cls._holder)
+            except Exception as e:
+                logger.warning(f"Could not release the cold storage lease: {str(e)}")
+            cls._holder = None
@@ -7,13 +7,97 @@ class Config:
 
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload
     ALLOWED_EXTENSIONS = {'mp3', 'wav', 'ogg'}
-    DEBUG = True
+    DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
     TESTING = False
     PORT = 8586
+    # Server processes used when running without reload (DEBUG off)
+    WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1))
+    # Load librosa, the database and the forms catalog in the background after startup
+    WARMUP = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
+    # Request scratch workspaces go on this tmpfs when they fit, else on disk
+    # under UPLOAD_FOLDER (empty disables)
+    SCRATCH_MEMORY_DIR = os.getenv("SCRATCH_MEMORY_DIR", "/dev/shm")
+    # Scratch space one process may reserve on the tmpfs, and on disk (0 means no limit)
+    SCRATCH_MEMORY_QUOTA_MB = float(os.getenv("SCRATCH_MEMORY_QUOTA_MB", 1024))
+    SCRATCH_DISK_QUOTA_MB = float(os.getenv("SCRATCH_DISK_QUOTA_MB", 0))
+    # A request reserves this multiple of its upload size (decoded and processed copies)
+    SCRATCH_SIZE_FACTOR = float(os.getenv("SCRATCH_SIZE_FACTOR", 4))
+    # Scratch directories older than this many seconds are removed at startup,
+    # even if their process lives
+    SCRATCH_MAX_AGE = float(os.getenv("SCRATCH_MAX_AGE", 6 * 3600))
+    FORMS_PATH = os.getenv("FORMS_PATH", "data_latest.parquet")
+    # CMS ICD-10-CM code or order file; the curated bundled subset is used when unset
+    ICD10_CODES_PATH = os.getenv("ICD10_CODES_PATH")
+    # Medical vocabulary ("term count" per line) for local transcript
+    # correction; the bundled list is used when unset
+    LEXICON_PATH = os.getenv("LEXICON_PATH")
+    # English word list (one per line) whose words the lexicon never changes;
+    # pyspellchecker's English dictionary is used when unset
+    ENGLISH_WORDS_PATH = os.getenv("ENGLISH_WORDS_PATH")
+    # How English notes are refined: "llm" (full LLM pass) or "lexicon"
+    # (local vocabulary correction)
+    REFINE_MODE = os.getenv("REFINE_MODE", "llm").lower()
+    # Run only the preprocessing steps a recording
+    # needs, chosen from a quick signal analysis
+    ADAPTIVE_PREPROCESSING = (
+        os.getenv("ADAPTIVE_PREPROCESSING", "true").lower() in ("1", "true", "yes")
+    )
+    # Adaptive preprocessing denoises recordings with an estimated SNR below this
+    DENOISE_SNR_DB = float(os.getenv("DENOISE_SNR_DB", 20))
+    # Conversational mode: split the audio into speaker turns locally and let the LLM
+    # only name the roles
+    SPEAKER_TURNS = os.getenv("SPEAKER_TURNS", "false").lower() in ("1", "true", "yes")
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
     FIREWORKS_API_KEY = os.getenv("FIREWORKS_API_KEY")
 
-    # Create upload folder if it doesn't exist
-    if not os.path.exists(UPLOAD_FOLDER):
-        os.makedirs(UPLOAD_FOLDER)
+    # Admission control: concurrent slots per pipeline stage and shared queue settings
+    PREPROCESS_CONCURRENCY = int(
+        os.getenv("PREPROCESS_CONCURRENCY", os.cpu_count() or 2)
+    )
+    ASR_CONCURRENCY = int(os.getenv("ASR_CONCURRENCY", 8))
+    LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 16))
+    ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 32))
+    ADMISSION_TIMEOUT = float(os.getenv("ADMISSION_TIMEOUT", 30))
+    # Requests per minute sent to the ASR and LLM providers, per process
+    # (0 means no limit)
+    ASR_RATE_LIMIT = float(os.getenv("ASR_RATE_LIMIT", 0))
+    LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", 0))
+
+    # SQLite connection tuning
+    DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+    DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+    DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 16384))
+    DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 256 * 1024 * 1024))
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 256))
+
+    # Write-behind batching of audio_results inserts and feedback updates
+    WRITE_BEHIND = os.getenv("WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 200))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 0.5))
+    WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 10000))
+    # Attempts before a failing write is moved to <DB>.failed.jsonl (lock
+    # timeouts are retried indefinitely)
+    WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", 10))
+    ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", 100))
+
+    # Parquet export: rows per batch/row group, and
+    # how old rows must be for incremental exports
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 10000))
+    EXPORT_SAFETY_LAG = float(os.getenv("EXPORT_SAFETY_LAG", 300))
+
+    # Cold storage: compress the text columns of
+    # results older than this many days (0 disables)
+    COLD_STORAGE_AGE_DAYS = float(os.getenv("COLD_STORAGE_AGE_DAYS", 90))
+    COLD_STORAGE_INTERVAL = float(os.getenv("COLD_STORAGE_INTERVAL", 3600))
+    COLD_STORAGE_BATCH_SIZE = int(os.getenv("COLD_STORAGE_BATCH_SIZE", 500))
+    # VACUUM after compaction once this fraction of the database file is free pages
+    COLD_STORAGE_VACUUM_RATIO = float(os.getenv("COLD_STORAGE_VACUUM_RATIO", 0.2))
+
+    # Admin endpoints and opt-in request profiling (disabled when ADMIN_TOKEN is unset)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    PROFILE_FOLDER = os.getenv("PROFILE_FOLDER", "profiles")
+    PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", 50))
+
+    # Create upload folder if it doesn't exist (several workers may race here)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
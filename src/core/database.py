@@ -1,160 +1,479 @@
 import sqlite3
 import logging
 import os
-from datetime import datetime
+import json
+import base64
+import time
+import threading
+from datetime import datetime, timezone
+from .config import Config
+from .db_connection import ConnectionManager
+from .write_behind import WriteBehindQueue
+from .search_index import SearchIndexService
+from .rollups import RollupService
+from .clinical_index import ClinicalIndexService
+from .export import ExportService
+from .cold_storage import ColdStorageService
 
 logger = logging.getLogger(__name__)
 
+
+class ResultPending(Exception):
+    """Raised when a result id was handed out but its row is not committed yet.
+
+    With several worker processes the row may still sit in another worker's
+    write-behind queue, so the caller should retry shortly.
+    """
+
+    def __init__(self, result_id: int, retry_after: int = 1):
+        self.result_id = result_id
+        self.retry_after = retry_after
+        super().__init__(
+            f"Result {result_id} is not saved yet, retry after {retry_after}s"
+        )
+
+
+class IdBlockAllocator:
+    """Hands out audio_results ids from blocks reserved in the database.
+
+    Rows are written after the request returns, so the id the client needs
+    for /save-feedback is assigned up front. Each process reserves a block of
+    ids with one short transaction and serves ids from memory until it runs
+    out, so concurrent workers never hand out the same id. Ids left in a block
+    when a process exits are skipped.
+    """
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._pid = None
+        self._db_path = None
+
+    def next_id(self, db_path: str) -> int:
+        with self._lock:
+            if (
+                self._pid != os.getpid()
+                or self._db_path != db_path
+                or self._next >= self._end
+            ):
+                self._reserve_block(ConnectionManager.get_connection(db_path))
+                self._db_path = db_path
+            result_id = self._next
+            self._next += 1
+            return result_id
+
+    def _reserve_block(self, conn: sqlite3.Connection) -> None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT next_id FROM id_blocks WHERE name = 'audio_results'"
+            ).fetchone()
+            max_id = conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM audio_results"
+            ).fetchone()[0]
+            start = max(row[0] if row else 1, max_id + 1)
+            conn.execute(
+                "INSERT OR REPLACE INTO id_blocks (name, next_id) "
+                "VALUES ('audio_results', ?)",
+                (start + self.block_size,),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self._next, self._end, self._pid = start, start + self.block_size, os.getpid()
+        logger.info(f"Reserved audio_results ids {start}..{self._end - 1}")
+
+
 class DatabaseService:
     """Service for database operations"""
-    
+
     DB_PATH = "app_data.db"
-    
+
+    # Columns added after the original schema, created on startup when missing
+    MIGRATED_COLUMNS = {
+        "validation_time": "REAL",
+        "refine_time": "REAL",
+        "translation_time": "REAL",
+        "extraction_time": "REAL",
+        "form_name": "TEXT",
+    }
+
+    # Columns written by save_audio_result, in insert order
+    AUDIO_RESULT_COLUMNS = (
+        "id",
+        "filename",
+        "language",
+        "model",
+        "is_conversation",
+        "raw_text",
+        "arabic_text",
+        "translation_text",
+        "json_data",
+        "reasoning",
+        "preprocessing_time",
+        "voice_processing_time",
+        "llm_processing_time",
+        "doctor_name",
+        "feedback",
+        "insertion_date",
+        "validation_time",
+        "refine_time",
+        "translation_time",
+        "extraction_time",
+        "form_name",
+    )
+
+    # Statements are kept as constants so sqlite3's statement cache reuses them
+    INSERT_AUDIO_RESULT_SQL = (
+        f"INSERT INTO audio_results ({', '.join(AUDIO_RESULT_COLUMNS)}) "
+        f"VALUES ({', '.join(':' + column for column in AUDIO_RESULT_COLUMNS)})"
+    )
+    # Every column a caller may ask for, and the subset list views use
+    RESULT_FIELDS = AUDIO_RESULT_COLUMNS
+    SUMMARY_FIELDS = (
+        "id",
+        "filename",
+        "language",
+        "model",
+        "is_conversation",
+        "translation_text",
+        "json_data",
+        "preprocessing_time",
+        "voice_processing_time",
+        "llm_processing_time",
+        "doctor_name",
+        "feedback",
+        "insertion_date",
+        "form_name",
+    )
+    # Result listing is always newest first; these back the keyset pagination
+    # and filters
+    INDEXES = {
+        "idx_audio_results_insertion_date": (
+            "audio_results (insertion_date DESC, id DESC)"
+        ),
+        "idx_audio_results_doctor_name": (
+            "audio_results (doctor_name, insertion_date DESC, id DESC)"
+        ),
+        "idx_audio_results_language": (
+            "audio_results (language, insertion_date DESC, id DESC)"
+        ),
+    }
+    UPDATE_FEEDBACK_SQL = """
+            UPDATE audio_results
+            SET feedback = ?
+            WHERE id = ?
+            """
+
+    _id_allocator = IdBlockAllocator(Config.ID_BLOCK_SIZE)
+    _writer = None
+    _writer_lock = threading.Lock()
+    # Ids whose INSERT is queued but not committed yet
+    _pending_ids = set()
+    _rollup_thread = None
+
     @classmethod
     def initialize_db(cls):
         """Create database tables if they don't exist"""
         try:
-            conn = sqlite3.connect(cls.DB_PATH)
-            cursor = conn.cursor()
-            
-            # Create table for audio processing results
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS audio_results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT NOT NULL,
-                language TEXT NOT NULL,
-                model TEXT NOT NULL,
-                is_conversation BOOLEAN NOT NULL,
-                raw_text TEXT,
-                arabic_text TEXT,
-                translation_text TEXT,
-                json_data TEXT,
-                reasoning TEXT,
-                preprocessing_time REAL,
-                voice_processing_time REAL,
-                llm_processing_time REAL,
-                doctor_name TEXT,
-                feedback TEXT,
-                insertion_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-            
-            conn.commit()
+            with ConnectionManager.transaction(cls.DB_PATH) as conn:
+                # Every worker runs this at startup; migrate one at a time
+                conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.cursor()
+
+                # Create table for audio processing results
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS audio_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    is_conversation BOOLEAN NOT NULL,
+                    raw_text TEXT,
+                    arabic_text TEXT,
+                    translation_text TEXT,
+                    json_data TEXT,
+                    reasoning TEXT,
+                    preprocessing_time REAL,
+                    voice_processing_time REAL,
+                    llm_processing_time REAL,
+                    doctor_name TEXT,
+                    feedback TEXT,
+                    insertion_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    validation_time REAL,
+                    refine_time REAL,
+                    translation_time REAL,
+                    extraction_time REAL,
+                    form_name TEXT
+                )
+                ''')
+
+                # Bring databases created with an older schema up to date
+                cursor.execute("PRAGMA table_info(audio_results)")
+                existing_columns = {row[1] for row in cursor.fetchall()}
+                for column, column_type in cls.MIGRATED_COLUMNS.items():
+                    if column not in existing_columns:
+                        cursor.execute(
+                            "ALTER TABLE audio_results "
+                            f"ADD COLUMN {column} {column_type}"
+                        )
+                        logger.info(f"Added column audio_results.{column}")
+
+                for index_name, definition in cls.INDEXES.items():
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS {index_name} ON {definition}"
+                    )
+
+                SearchIndexService.create_schema(cursor)
+                RollupService.create_schema(cursor)
+                ClinicalIndexService.create_schema(cursor)
+                ExportService.create_schema(cursor)
+                ColdStorageService.create_schema(cursor)
+
+                # Next free id per table, shared by all processes (see IdBlockAllocator)
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS id_blocks (
+                    name TEXT PRIMARY KEY,
+                    next_id INTEGER NOT NULL
+                )
+                ''')
+
             logger.info(f"Database initialized at {cls.DB_PATH}")
             return True
         except Exception as e:
             logger.error(f"Error initializing database: {str(e)}")
             return False
-        finally:
-            if conn:
-                conn.close()
-
-    @classmethod
-    def save_audio_result(cls, 
-                          filename, 
-                          language, 
-                          model, 
-                          is_conversation, 
-                          raw_text, 
-                          arabic_text, 
-                          translation_text, 
-                          json_data, 
-                          reasoning, 
-                          preprocessing_time, 
-                          voice_processing_time, 
+
+    @classmethod
+    def save_audio_result(cls,
+                          filename,
+                          language,
+                          model,
+                          is_conversation,
+                          raw_text,
+                          arabic_text,
+                          translation_text,
+                          json_data,
+                          reasoning,
+                          preprocessing_time,
+                          voice_processing_time,
                           llm_processing_time,
                           doctor_name=None,
-                          feedback=None):
-        """Save audio processing results to database"""
+                          feedback=None,
+                          validation_time=None,
+                          refine_time=None,
+                          translation_time=None,
+                          extraction_time=None,
+                          form_name=None,
+                          result_id=None):
+        """Save audio processing results to database.
+        
+        With write-behind enabled the row is queued and written in a batch in
+        the background; the returned id is valid immediately either way.
+        ``result_id`` stores the row under an id from ``reserve_result_id``
+        instead of a new one.
+        
+        Returns:
+            int: The id of the new row, or None if it could not be saved
+        """
         try:
-            conn = sqlite3.connect(cls.DB_PATH)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            INSERT INTO audio_results 
-            (filename, language, model, is_conversation, raw_text, arabic_text, translation_text, 
-            json_data, reasoning, preprocessing_time, voice_processing_time, llm_processing_time,
-            doctor_name, feedback)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                filename, 
-                language, 
-                model, 
-                is_conversation, 
-                raw_text, 
-                arabic_text, 
-                translation_text, 
-                json_data, 
-                reasoning, 
-                preprocessing_time, 
-                voice_processing_time, 
-                llm_processing_time,
-                doctor_name,
-                feedback
-            ))
-            
-            conn.commit()
-            result_id = cursor.lastrowid
-            logger.info(f"Saved audio result with ID: {result_id}")
+            record = {
+                "id": (
+                    result_id
+                    if result_id is not None
+                    else cls._id_allocator.next_id(cls.DB_PATH)
+                ),
+                "filename": filename,
+                "language": language,
+                "model": model,
+                "is_conversation": is_conversation,
+                "raw_text": raw_text,
+                "arabic_text": arabic_text,
+                "translation_text": translation_text,
+                "json_data": json_data,
+                "reasoning": reasoning,
+                "preprocessing_time": preprocessing_time,
+                "voice_processing_time": voice_processing_time,
+                "llm_processing_time": llm_processing_time,
+                "doctor_name": doctor_name,
+                "feedback": feedback,
+                # Same format as CURRENT_TIMESTAMP, taken now rather than at flush time
+                "insertion_date": datetime.now(timezone.utc).strftime(
+                    "%Y-%m-%d %H:%M:%S"
+                ),
+                "validation_time": validation_time,
+                "refine_time": refine_time,
+                "translation_time": translation_time,
+                "extraction_time": extraction_time,
+                "form_name": form_name,
+            }
+            result_id = record["id"]
+
+            if Config.WRITE_BEHIND:
+                with cls._writer_lock:
+                    cls._pending_ids.add(result_id)
+                cls._get_writer().enqueue("insert", record)
+                logger.info(f"Queued audio result with ID: {result_id}")
+            else:
+                with ConnectionManager.transaction(cls.DB_PATH) as conn:
+                    cls._apply_writes(conn, [("insert", record)])
+                logger.info(f"Saved audio result with ID: {result_id}")
             return result_id
         except Exception as e:
             logger.error(f"Error saving audio result: {str(e)}")
             return None
-        finally:
-            if conn:
-                conn.close()
-    
+
+    @classmethod
+    def reserve_result_id(cls):
+        """Allocate an audio_results id ahead of saving the row.
+        
+        Lets a caller record the id elsewhere first, so it can later tell
+        whether the row was written (see ``_result_exists``).
+        """
+        return cls._id_allocator.next_id(cls.DB_PATH)
+
     @classmethod
     def get_audio_results(cls, limit=100):
         """Get recent audio processing results"""
         try:
-            conn = sqlite3.connect(cls.DB_PATH)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-            SELECT * FROM audio_results
-            ORDER BY insertion_date DESC
-            LIMIT ?
-            ''', (limit,))
-            
-            results = [dict(row) for row in cursor.fetchall()]
-            logger.info(f"Retrieved {len(results)} audio results")
-            return results
+            return cls.get_audio_results_page(limit=limit)["results"]
         except Exception as e:
             logger.error(f"Error retrieving audio results: {str(e)}")
             return []
-        finally:
-            if conn:
-                conn.close()
 
+    @staticmethod
+    def encode_cursor(row):
+        """Build the opaque pagination cursor pointing just after ``row``."""
+        raw = json.dumps([row["insertion_date"], row["id"]]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor from encode_cursor, raising ValueError if it is malformed."""
+        try:
+            insertion_date, result_id = json.loads(
+                base64.urlsafe_b64decode(cursor.encode("ascii"))
+            )
+            return str(insertion_date), int(result_id)
+        except Exception:
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def _normalize_timestamp(value):
+        """Turn an ISO date or datetime into the stored 'YYYY-MM-DD HH:MM:SS' form."""
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+
+    @classmethod
+    def get_audio_results_page(
+        cls,
+        limit=100,
+        cursor=None,
+        doctor_name=None,
+        language=None,
+        model=None,
+        date_from=None,
+        date_to=None,
+        fields=None,
+    ):
+        """
+        Get one page of results, newest first, using keyset pagination.
+        
+        Args:
+            limit: Maximum number of rows to return
+            cursor: ``next_cursor`` of the previous page, or None for the first page
+            doctor_name, language, model: Optional exact-match filters
+            date_from: Only rows inserted at or after this ISO date/datetime
+            date_to: Only rows inserted before this ISO date/datetime
+            fields: Columns to return (defaults to all); id and insertion_date are
+                always included
+            
+        Returns:
+            dict: ``results`` (list of dicts) and ``next_cursor`` (None on the
+            last page)
+            
+        Raises:
+            ValueError: If the cursor, a date or a field name is invalid
+        """
+        limit = max(1, int(limit))
+        if fields:
+            unknown = set(fields) - set(cls.RESULT_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+            columns = ["id", "insertion_date"] + [
+                f for f in fields if f not in ("id", "insertion_date")
+            ]
+        else:
+            columns = list(cls.RESULT_FIELDS)
+
+        conditions = []
+        params = []
+        for column, value in (
+            ("doctor_name", doctor_name),
+            ("language", language),
+            ("model", model),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if date_from:
+            conditions.append("insertion_date >= ?")
+            params.append(cls._normalize_timestamp(date_from))
+        if date_to:
+            conditions.append("insertion_date < ?")
+            params.append(cls._normalize_timestamp(date_to))
+        if cursor:
+            # Row-value comparison lets SQLite seek straight into the index
+            conditions.append("(insertion_date, id) < (?, ?)")
+            params.extend(cls.decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = (f"SELECT {', '.join(columns)} FROM audio_results {where} "
+                 f"ORDER BY insertion_date DESC, id DESC LIMIT ?")
+        # Fetch one extra row to know whether another page exists
+        params.append(limit + 1)
+
+        conn = ConnectionManager.get_connection(cls.DB_PATH)
+        rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+        ColdStorageService.hydrate(conn, rows, columns)
+        next_cursor = cls.encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        results = rows[:limit]
+
+        logger.info(f"Retrieved {len(results)} audio results")
+        return {"results": results, "next_cursor": next_cursor}
 
     @classmethod
     def update_feedback(cls, result_id, feedback):
         """
         Update the feedback for an existing audio result record.
-        
+
         Args:
             result_id: The ID of the result to update
             feedback: The new feedback text
-            
+
         Returns:
             bool: True if successful, False otherwise
+
+        Raises:
+            ResultPending: The id exists but its row is still queued in
+                another worker process
         """
         try:
-            conn = sqlite3.connect(cls.DB_PATH)
-            cursor = conn.cursor()
-            
-            # Update the feedback field
-            query = """
-            UPDATE audio_results 
-            SET feedback = ?
-            WHERE id = ?
-            """
-            
-            cursor.execute(query, (feedback, result_id))
-            conn.commit()
-            
+            if Config.WRITE_BEHIND:
+                if not cls._result_exists(result_id):
+                    logger.warning(f"No record found with ID: {result_id}")
+                    return False
+                cls._get_writer().enqueue(
+                    "update_feedback", {"id": result_id, "feedback": feedback}
+                )
+                logger.info(f"Queued feedback update for result ID: {result_id}")
+                return True
+
+            with ConnectionManager.transaction(cls.DB_PATH) as conn:
+                cursor = conn.execute(cls.UPDATE_FEEDBACK_SQL, (feedback, result_id))
+
             # Check if any rows were affected
             if cursor.rowcount > 0:
                 logger.info(f"Updated feedback for result ID: {result_id}")
@@ -162,10 +481,238 @@ class DatabaseService:
             else:
                 logger.warning(f"No record found with ID: {result_id}")
                 return False
-                
+
+        except ResultPending:
+            raise
         except Exception as e:
             logger.error(f"Error updating feedback in database: {str(e)}", exc_info=True)
             return False
-        finally:
-            if conn:
-                conn.close()
\ No newline at end of file
+
+    @classmethod
+    def _result_exists(cls, result_id, wait=True):
+        """Return True if the row is committed or still queued for insertion.
+
+        An id that was allocated (by any process) but is not in the table yet
+        may be queued in another worker; with ``wait``, wait up to two flush
+        intervals for it to be committed before raising ResultPending.
+        """
+        with cls._writer_lock:
+            if result_id in cls._pending_ids:
+                return True
+        conn = ConnectionManager.get_connection(cls.DB_PATH)
+
+        def committed():
+            query = "SELECT 1 FROM audio_results WHERE id = ?"
+            return conn.execute(query, (result_id,)).fetchone() is not None
+
+        if committed():
+            return True
+        if not wait:
+            return False
+        row = conn.execute(
+            "SELECT next_id FROM id_blocks WHERE name = 'audio_results'"
+        ).fetchone()
+        if not row or not 0 < int(result_id) < row[0]:
+            return False
+        deadline = time.monotonic() + 2 * Config.WRITE_BEHIND_FLUSH_INTERVAL + 1
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            if committed():
+                return True
+        raise ResultPending(result_id)
+
+    @classmethod
+    def _apply_writes(cls, conn, writes):
+        """Apply queued writes in order inside the caller's transaction.
+        
+        Consecutive writes of the same kind are sent with one executemany.
+        """
+        index = 0
+        while index < len(writes):
+            op = writes[index][0]
+            end = index
+            while end < len(writes) and writes[end][0] == op:
+                end += 1
+            payloads = [payload for _, payload in writes[index:end]]
+
+            if op == "insert":
+                conn.executemany(cls.INSERT_AUDIO_RESULT_SQL, payloads)
+                # Derived indexes are kept in the same transaction as the rows
+                SearchIndexService.index_rows(conn, payloads)
+                RollupService.apply_inserts(conn, payloads)
+                ClinicalIndexService.index_rows(conn, payloads)
+            elif op == "update_feedback":
+                for payload in payloads:
+                    cursor = conn.execute(
+                        cls.UPDATE_FEEDBACK_SQL, (payload["feedback"], payload["id"])
+                    )
+                    if cursor.rowcount == 0:
+                        logger.warning(f"No record found with ID: {payload['id']}")
+            else:
+                raise ValueError(f"Unknown write operation: {op}")
+            index = end
+
+    @classmethod
+    def search_results(cls, query, limit=20, offset=0):
+        """
+        Full-text search over raw, refined and translated transcripts.
+        
+        Returns:
+            dict: ``results`` ranked best first, each with a highlighted
+            ``snippet``, and ``next_offset`` (None on the last page)
+        """
+        conn = ConnectionManager.get_connection(cls.DB_PATH)
+        rows = SearchIndexService.search(conn, query, limit=limit, offset=offset)
+        next_offset = offset + limit if len(rows) > limit else None
+        return {"results": rows[:limit], "next_offset": next_offset}
+
+    @classmethod
+    def backfill_search_index(cls):
+        """Index results that were stored before the search index existed."""
+        conn = ConnectionManager.get_connection(cls.DB_PATH)
+        return SearchIndexService.backfill(conn)
+
+    @classmethod
+    def get_analytics(cls, metrics=None, group_by=(), granularity=None, date_from=None,
+                      date_to=None, language=None, model=None, doctor_name=None):
+        """
+        Request volume and latency quantiles, read from the hourly rollups only.
+        
+        Raises:
+            ValueError: On an unknown metric, dimension, granularity or bad date
+        """
+        conn = ConnectionManager.get_connection(cls.DB_PATH)
+        return RollupService.query(
+            conn,
+            metrics=metrics,
+            group_by=group_by,
+            granularity=granularity,
+            date_from=date_from,
+            date_to=date_to,
+            language=language,
+            model=model,
+            doctor_name=doctor_name,
+        )
+
+    @classmethod
+    def rebuild_rollups(cls):
+        """Build the rollups from existing results unless they already cover them."""
+        conn = ConnectionManager.get_connection(cls.DB_PATH)
+        return RollupService.rebuild(conn)
+
+    @classmethod
+    def rollups_stale(cls):
+        """
+        Whether the rollups miss part of the history.
+        
+        A failed rollup update drops the "built" marker; the first caller to
+        notice starts the rebuild in the background.
+        """
+        conn = ConnectionManager.get_connection(cls.DB_PATH)
+        if RollupService.is_built(conn):
+            return False
+
+        def run():
+            try:
+                cls.rebuild_rollups()
+            except Exception as e:
+                logger.error(f"Rollup rebuild failed: {str(e)}", exc_info=True)
+            finally:
+                ConnectionManager.close_thread_connections()
+
+        with cls._writer_lock:
+            if cls._rollup_thread is None or not cls._rollup_thread.is_alive():
+                cls._rollup_thread = threading.Thread(
+                    target=run, name="rollup-rebuild", daemon=True
+                )
+                cls._rollup_thread.start()
+        return True
+
+    @classmethod
+    def find_by_icd10(cls, prefix, limit=100, date_from=None, date_to=None):
+        """
+        Encounters coded within an ICD-10 family, e.g. ``J45`` or ``J45.x``.
+        
+        Returns:
+            dict: ``results`` newest first, and ``codes`` with the number of
+            encounters per matching code
+        
+        Raises:
+            ValueError: On an empty prefix or a bad date
+        """
+        date_from = cls._normalize_timestamp(date_from) if date_from else None
+        date_to = cls._normalize_timestamp(date_to) if date_to else None
+        conn = ConnectionManager.get_connection(cls.DB_PATH)
+        return {
+            "results": ClinicalIndexService.find_by_code(
+                conn, prefix, limit=limit, date_from=date_from, date_to=date_to
+            ),
+            "codes": ClinicalIndexService.code_counts(
+                conn, prefix, date_from=date_from, date_to=date_to
+            ),
+        }
+
+    @classmethod
+    def export_parquet(
+        cls, sink, columns=None, date_from=None, date_to=None, watermark_name=None
+    ):
+        """
+        Stream results into a Parquet file, see ExportService.export.
+        
+        Raises:
+            ValueError: On an unknown column or a bad date
+        """
+        columns = list(columns or cls.AUDIO_RESULT_COLUMNS)
+        unknown = [c for c in columns if c not in cls.AUDIO_RESULT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        conn = ConnectionManager.get_connection(cls.DB_PATH)
+        return ExportService.export(
+            conn, sink, columns,
+            date_from=cls._normalize_timestamp(date_from) if date_from else None,
+            date_to=cls._normalize_timestamp(date_to) if date_to else None,
+            watermark_name=watermark_name
+        )
+
+    @classmethod
+    def compact_cold_storage(cls):
+        """Move old results to compressed cold storage and VACUUM if worthwhile."""
+        return ColdStorageService.run_once(cls.DB_PATH)
+
+    @classmethod
+    def _on_writes_done(cls, writes):
+        with cls._writer_lock:
+            for op, payload in writes:
+                if op == "insert":
+                    cls._pending_ids.discard(payload["id"])
+
+    @classmethod
+    def _get_writer(cls):
+        """Return the write-behind queue, starting its writer thread on first use."""
+        with cls._writer_lock:
+            if cls._writer is None:
+                cls._writer = WriteBehindQueue(
+                    cls.DB_PATH,
+                    cls._apply_writes,
+                    batch_size=Config.WRITE_BEHIND_BATCH_SIZE,
+                    flush_interval=Config.WRITE_BEHIND_FLUSH_INTERVAL,
+                    max_pending=Config.WRITE_BEHIND_MAX_PENDING,
+                    on_done=cls._on_writes_done,
+                    max_attempts=Config.WRITE_BEHIND_MAX_ATTEMPTS,
+                )
+            return cls._writer
+
+    @classmethod
+    def flush_writes(cls, timeout=30.0):
+        """Wait until every queued write is committed."""
+        with cls._writer_lock:
+            writer = cls._writer
+        return writer.flush(timeout) if writer else True
+
+    @classmethod
+    def shutdown(cls):
+        """Drain queued writes and stop the writer thread (graceful shutdown)."""
+        with cls._writer_lock:
+            writer, cls._writer = cls._writer, None
+        if writer:
+            writer.stop()
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """Thread-local, long-lived SQLite connections with tuned pragmas.
+
+    Each thread keeps one open connection per database file instead of
+    connecting for every query. Connections run in WAL mode so writers do not
+    block readers, wait ``busy_timeout`` on lock contention instead of failing,
+    and keep a per-connection prepared statement cache.
+    """
+
+    _local = threading.local()
+    _lock = threading.Lock()
+    _all_connections = []
+    # Bumped by close_all() so threads drop connections that were closed under them
+    _generation = 0
+
+    @staticmethod
+    def _configure(conn: sqlite3.Connection) -> None:
+        """Apply the connection pragmas."""
+        conn.execute(f"PRAGMA busy_timeout = {Config.DB_BUSY_TIMEOUT_MS}")
+        mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            logger.warning(f"Could not enable WAL, journal mode is {mode}")
+        # NORMAL is durable in WAL mode except for the last commits on power loss
+        conn.execute(f"PRAGMA synchronous = {Config.DB_SYNCHRONOUS}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA cache_size = -{Config.DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {Config.DB_MMAP_SIZE}")
+
+    @classmethod
+    def get_connection(cls, db_path: str) -> sqlite3.Connection:
+        """Return this thread's connection to ``db_path``, opening it on first use."""
+        connections = getattr(cls._local, "connections", None)
+        # A forked worker must not reuse its parent's connections
+        if (connections is None
+                or getattr(cls._local, "pid", None) != os.getpid()
+                or getattr(cls._local, "generation", None) != cls._generation):
+            connections = cls._local.connections = {}
+            cls._local.pid = os.getpid()
+            cls._local.generation = cls._generation
+
+        conn = connections.get(db_path)
+        if conn is None:
+            conn = sqlite3.connect(
+                db_path,
+                timeout=Config.DB_BUSY_TIMEOUT_MS / 1000,
+                cached_statements=Config.DB_STATEMENT_CACHE_SIZE,
+                # Only the owning thread uses it; this just lets close_all() close it
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            cls._configure(conn)
+            connections[db_path] = conn
+            with cls._lock:
+                cls._all_connections.append(conn)
+            logger.info(
+                f"Opened SQLite connection to {db_path} "
+                f"on thread {threading.current_thread().name}"
+            )
+        return conn
+
+    @classmethod
+    @contextmanager
+    def transaction(cls, db_path: str):
+        """Yield this thread's connection and commit, or roll back on error."""
+        conn = cls.get_connection(db_path)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    @classmethod
+    def close_thread_connections(cls) -> None:
+        """Close the connections owned by the calling thread."""
+        connections = getattr(cls._local, "connections", None) or {}
+        with cls._lock:
+            for conn in connections.values():
+                if conn in cls._all_connections:
+                    cls._all_connections.remove(conn)
+        for conn in connections.values():
+            conn.close()
+        cls._local.connections = {}
+
+    @classmethod
+    def close_all(cls) -> None:
+        """Close every connection opened by this process (used on shutdown)."""
+        with cls._lock:
+            connections, cls._all_connections = cls._all_connections, []
+            cls._generation += 1
+        for conn in connections:
+            conn.close()
@@ -0,0 +1,264 @@
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+from .config import Config
+from .cold_storage import ColdStorageService
+
+logger = logging.getLogger(__name__)
+
+
+class ExportService:
+    """Streams audio_results into a Parquet file with bounded memory.
+
+    Rows are read with a single cursor in (insertion_date, id) order and
+    written ``batch_size`` rows at a time, one Parquet row group per batch, so
+    memory use depends on the batch size and not on the table size. The read
+    runs in one SQLite snapshot, so an export is consistent even while the
+    server keeps writing.
+
+    Incremental exports remember the last exported (insertion_date, id) under
+    a name in ``export_watermarks``. Rows younger than ``EXPORT_SAFETY_LAG``
+    seconds are left for the next run: insertion_date is taken when a result
+    is saved, and with write-behind and several workers a row can be committed
+    a little after rows with a later timestamp.
+    """
+
+    WATERMARK_TABLE = "export_watermarks"
+
+    @staticmethod
+    def _schema_types():
+        import pyarrow as pa
+
+        return {
+            "id": pa.int64(),
+            "is_conversation": pa.bool_(),
+            "insertion_date": pa.timestamp("s"),
+            "preprocessing_time": pa.float64(),
+            "voice_processing_time": pa.float64(),
+            "llm_processing_time": pa.float64(),
+            "validation_time": pa.float64(),
+            "refine_time": pa.float64(),
+            "translation_time": pa.float64(),
+            "extraction_time": pa.float64(),
+        }
+
+    @classmethod
+    def create_schema(cls, cursor) -> None:
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {cls.WATERMARK_TABLE} (
+            name TEXT PRIMARY KEY,
+            insertion_date TEXT NOT NULL,
+            last_id INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        ''')
+
+    @classmethod
+    def get_watermark(cls, conn, name: str) -> Optional[tuple]:
+        row = conn.execute(
+            f"SELECT insertion_date, last_id FROM {cls.WATERMARK_TABLE} WHERE name = ?",
+            (name,),
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    @classmethod
+    def set_watermark(cls, conn, name: str, watermark: tuple) -> None:
+        conn.execute(
+            f"INSERT OR REPLACE INTO {cls.WATERMARK_TABLE} "
+            f"(name, insertion_date, last_id, updated_at) "
+            f"VALUES (?, ?, ?, ?)",
+            (
+                name,
+                watermark[0],
+                watermark[1],
+                datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+            ),
+        )
+        conn.commit()
+
+    @classmethod
+    def export(
+        cls,
+        conn,
+        sink,
+        columns: Sequence[str],
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        watermark_name: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        safety_lag: Optional[float] = None,
+    ) -> dict:
+        """Write matching rows to ``sink`` (a path or writable file) as Parquet.
+
+        Args:
+            conn: SQLite connection used for the read
+            columns: audio_results columns to export, in order
+            date_from, date_to: insertion_date range ('YYYY-MM-DD HH:MM:SS');
+                date_to is exclusive
+            watermark_name: Export only rows after this watermark and advance it
+                afterwards
+            batch_size: Rows per read batch and Parquet row group
+            safety_lag: Seconds; incremental exports skip rows younger than this
+
+        Returns:
+            dict: Row count, row groups, elapsed seconds and the new watermark
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        batch_size = batch_size or Config.EXPORT_BATCH_SIZE
+        safety_lag = Config.EXPORT_SAFETY_LAG if safety_lag is None else safety_lag
+        start = time.perf_counter()
+
+        conditions, params = [], []
+        if date_from:
+            conditions.append("insertion_date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("insertion_date < ?")
+            params.append(date_to)
+        watermark = None
+        if watermark_name:
+            watermark = cls.get_watermark(conn, watermark_name)
+            if watermark:
+                conditions.append("(insertion_date, id) > (?, ?)")
+                params.extend(watermark)
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=safety_lag)
+            conditions.append("insertion_date < ?")
+            params.append(cutoff.strftime("%Y-%m-%d %H:%M:%S"))
+
+        # id and insertion_date are always read so the watermark can be tracked
+        selected = list(dict.fromkeys(["id", "insertion_date", *columns]))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = conn.execute(
+            f"SELECT {', '.join(selected)} FROM audio_results {where} "
+            f"ORDER BY insertion_date, id",
+            params,
+        )
+
+        types = cls._schema_types()
+        schema = pa.schema(
+            [(column, types.get(column, pa.string())) for column in columns]
+        )
+        rows_written, row_groups, last = 0, 0, watermark
+        with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                rows = ColdStorageService.hydrate(
+                    conn, [dict(zip(selected, row)) for row in rows], columns
+                )
+                arrays = []
+                for column in columns:
+                    values = [row[column] for row in rows]
+                    if column == "insertion_date":
+                        # Drop any fractional seconds so the
+                        # cast to a timestamp never fails
+                        values = [value[:19] if value else None for value in values]
+                        arrays.append(
+                            pa.array(values, pa.string()).cast(pa.timestamp("s"))
+                        )
+                    elif column == "is_conversation":
+                        # SQLite stores booleans as 0/1
+                        arrays.append(
+                            pa.array(
+                                [
+                                    None if value is None else bool(value)
+                                    for value in values
+                                ],
+                                pa.bool_(),
+                            )
+                        )
+                    elif pa.types.is_floating(schema.field(column).type):
+                        # Non-medical results store "error" instead of a timing
+                        arrays.append(
+                            pa.array(
+                                [
+                                    value if isinstance(value, (int, float)) else None
+                                    for value in values
+                                ],
+                                pa.float64(),
+                            )
+                        )
+                    else:
+                        arrays.append(pa.array(values, schema.field(column).type))
+                writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+                rows_written += len(rows)
+                row_groups += 1
+                last = (rows[-1]["insertion_date"], rows[-1]["id"])
+
+        if watermark_name and last and last != watermark:
+            cls.set_watermark(conn, watermark_name, last)
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Exported {rows_written} rows in {row_groups} row groups in {elapsed:.2f}s"
+        )
+        return {
+            "rows": rows_written,
+            "row_groups": row_groups,
+            "seconds": round(elapsed, 3),
+            "watermark": {"insertion_date": last[0], "id": last[1]} if last else None,
+        }
+
+
+def main():
+    """Export audio_results to a Parquet file."""
+    import argparse
+    import sqlite3
+    from .database import DatabaseService
+
+    parser = argparse.ArgumentParser(
+        description="Stream audio_results into a Parquet file"
+    )
+    parser.add_argument("output", help="Parquet file to write")
+    parser.add_argument(
+        "--db", default=DatabaseService.DB_PATH, help="SQLite database path"
+    )
+    parser.add_argument("--columns", help="Comma-separated columns (default: all)")
+    parser.add_argument("--date-from", help="Only rows inserted at or after this date")
+    parser.add_argument("--date-to", help="Only rows inserted before this date")
+    parser.add_argument(
+        "--since-watermark",
+        metavar="NAME",
+        help="Export only rows added since the last export with this name, "
+        "then advance it",
+    )
+    parser.add_argument("--batch-size", type=int, default=Config.EXPORT_BATCH_SIZE,
+                        help="Rows per batch and Parquet row group")
+    parser.add_argument("--safety-lag", type=float, default=Config.EXPORT_SAFETY_LAG,
+                        help="Seconds; incremental exports skip rows younger than this")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    columns = (
+        [c.strip() for c in args.columns.split(",") if c.strip()]
+        if args.columns
+        else list(DatabaseService.AUDIO_RESULT_COLUMNS)
+    )
+    unknown = [c for c in columns if c not in DatabaseService.AUDIO_RESULT_COLUMNS]
+    if unknown:
+        parser.error(f"Unknown columns: {', '.join(unknown)}")
+
+    # Bring older databases up to the current schema (migrated columns, watermarks)
+    DatabaseService.DB_PATH = args.db
+    if not DatabaseService.initialize_db():
+        raise SystemExit(f"Could not initialize the database at {args.db}")
+    conn = sqlite3.connect(args.db)
+    normalize = DatabaseService._normalize_timestamp
+    stats = ExportService.export(
+        conn, args.output, columns,
+        date_from=normalize(args.date_from) if args.date_from else None,
+        date_to=normalize(args.date_to) if args.date_to else None,
+        watermark_name=args.since_watermark,
+        batch_size=args.batch_size,
+        safety_lag=args.safety_lag,
+    )
+    conn.close()
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
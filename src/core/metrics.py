@@ -0,0 +1,176 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+from .admission import AdmissionController
+
+# Latency buckets in seconds, covering both sub-second DB writes and long LLM calls
+DEFAULT_BUCKETS = (
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    20.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+
+class StageTimer:
+    """Handle returned by ``MetricsRegistry.track`` exposing the measured duration."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus sense."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Per-stage latency histograms, in-flight gauges and error counters.
+
+    Metrics live in process memory, so with several server workers each
+    worker reports its own series (distinguished by the ``pid`` label).
+    """
+
+    STAGES = (
+        "preprocess",
+        "diarize",
+        "asr",
+        "validate",
+        "refine",
+        "translate",
+        "extract",
+        "db_write",
+    )
+
+    _lock = threading.Lock()
+    _histograms: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+    _in_flight: Dict[str, int] = {stage: 0 for stage in STAGES}
+    _errors: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+    @classmethod
+    @contextmanager
+    def track(cls, stage: str):
+        """Time a stage, counting it as in flight and recording errors it raises."""
+        timer = StageTimer()
+        with cls._lock:
+            cls._in_flight[stage] += 1
+        try:
+            yield timer
+        except BaseException:
+            with cls._lock:
+                cls._errors[stage] += 1
+            raise
+        finally:
+            timer.elapsed = time.perf_counter() - timer.start
+            with cls._lock:
+                cls._in_flight[stage] -= 1
+                cls._histograms[stage].observe(timer.elapsed)
+
+    @classmethod
+    def record_error(cls, stage: str) -> None:
+        """Count a failure of a stage that reports errors without raising."""
+        with cls._lock:
+            cls._errors[stage] += 1
+
+    @classmethod
+    def render(cls) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        pid = os.getpid()
+        lines: List[str] = []
+        with cls._lock:
+            lines.append(
+                "# HELP pipeline_stage_duration_seconds "
+                "Time spent in each pipeline stage."
+            )
+            lines.append("# TYPE pipeline_stage_duration_seconds histogram")
+            for stage, hist in cls._histograms.items():
+                labels = f'stage="{stage}",pid="{pid}"'
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(
+                        f"pipeline_stage_duration_seconds_bucket"
+                        f'{{{labels},le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f"pipeline_stage_duration_seconds_bucket"
+                    f'{{{labels},le="+Inf"}} {hist.count}'
+                )
+                lines.append(
+                    f"pipeline_stage_duration_seconds_sum{{{labels}}} {hist.sum}"
+                )
+                lines.append(
+                    f"pipeline_stage_duration_seconds_count{{{labels}}} {hist.count}"
+                )
+
+            lines.append(
+                "# HELP pipeline_stage_in_flight "
+                "Requests currently inside each pipeline stage."
+            )
+            lines.append("# TYPE pipeline_stage_in_flight gauge")
+            for stage, value in cls._in_flight.items():
+                lines.append(
+                    f'pipeline_stage_in_flight{{stage="{stage}",pid="{pid}"}} {value}'
+                )
+
+            lines.append(
+                "# HELP pipeline_stage_errors_total "
+                "Errors raised by each pipeline stage."
+            )
+            lines.append("# TYPE pipeline_stage_errors_total counter")
+            for stage, value in cls._errors.items():
+                lines.append(
+                    f"pipeline_stage_errors_total"
+                    f'{{stage="{stage}",pid="{pid}"}} {value}'
+                )
+
+        admission = AdmissionController.snapshot()
+        for name, key, kind, help_text in (
+            (
+                "admission_waiting",
+                "waiting",
+                "gauge",
+                "Requests queued for an admission slot.",
+            ),
+            ("admission_active", "active", "gauge", "Admission slots currently held."),
+            (
+                "admission_rejected_total",
+                "rejected",
+                "counter",
+                "Requests rejected because the queue was full.",
+            ),
+            (
+                "admission_timed_out_total",
+                "timed_out",
+                "counter",
+                "Requests rejected after waiting too long.",
+            ),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for stage, state in admission.items():
+                lines.append(f'{name}{{stage="{stage}",pid="{pid}"}} {state[key]}')
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,170 @@
+import os
+import re
+import io
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import resource
+import threading
+import tracemalloc
+from datetime import datetime
+from typing import List, Optional
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ProfilingService:
+    """Opt-in CPU and memory profiling of a single pipeline run.
+
+    Each profiled run produces two artifacts in ``Config.PROFILE_FOLDER``:
+    ``<id>.prof`` (cProfile stats, loadable with pstats or snakeviz) and
+    ``<id>.json`` (wall time, peak traced memory, RSS and the top functions
+    and allocation sites). tracemalloc is process-wide, so profiled runs are
+    serialized; unprofiled requests never touch this class.
+    """
+
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _rss_mb() -> Optional[float]:
+        """Return the current resident set size in MB, if the platform exposes it."""
+        try:
+            with open("/proc/self/statm") as f:
+                pages = int(f.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+        except (OSError, ValueError, IndexError):
+            return None
+
+    @staticmethod
+    def _peak_rss_mb() -> float:
+        """Return the process lifetime peak RSS in MB (ru_maxrss is KB on Linux)."""
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    @classmethod
+    def run_profiled(cls, label: str, func, *args, **kwargs):
+        """Run ``func`` under cProfile and tracemalloc and store the artifacts.
+
+        Must be called on the thread that does the work, since cProfile only
+        observes the thread it was enabled on.
+
+        Returns:
+            tuple: (func result, profile id)
+        """
+        profile_id = uuid.uuid4().hex
+        os.makedirs(Config.PROFILE_FOLDER, exist_ok=True)
+
+        with cls._lock:
+            profiler = cProfile.Profile()
+            rss_before = cls._rss_mb()
+            tracemalloc.start(10)
+            start = time.perf_counter()
+            error = None
+            profiler.enable()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                profiler.disable()
+                wall_time = time.perf_counter() - start
+                _, traced_peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                cls._write_artifacts(profile_id, label, profiler, snapshot, {
+                    "wall_time_seconds": wall_time,
+                    "traced_peak_mb": traced_peak / (1024 * 1024),
+                    "rss_before_mb": rss_before,
+                    "rss_after_mb": cls._rss_mb(),
+                    "process_peak_rss_mb": cls._peak_rss_mb(),
+                    "error": error,
+                })
+
+        return result, profile_id
+
+    @classmethod
+    def _write_artifacts(cls, profile_id, label, profiler, snapshot, summary) -> None:
+        """Dump the cProfile stats and a JSON summary for a profiled run."""
+        prof_path = os.path.join(Config.PROFILE_FOLDER, f"{profile_id}.prof")
+        profiler.dump_stats(prof_path)
+
+        stats_text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stats_text)
+        stats.sort_stats("cumulative").print_stats(25)
+
+        top_allocations = [
+            {
+                "location": str(stat.traceback[0]),
+                "size_mb": stat.size / (1024 * 1024),
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics("lineno")[:15]
+        ]
+
+        summary.update({
+            "id": profile_id,
+            "label": label,
+            "created_at": datetime.now().isoformat(),
+            "top_functions": stats_text.getvalue(),
+            "top_allocations": top_allocations,
+        })
+        with open(os.path.join(Config.PROFILE_FOLDER, f"{profile_id}.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info(
+            f"Stored profile {profile_id} for {label} "
+            f"({summary['wall_time_seconds']:.2f}s)"
+        )
+
+        cls._enforce_retention()
+
+    @classmethod
+    def _enforce_retention(cls) -> None:
+        """Keep only the newest ``Config.PROFILE_RETENTION`` profiles."""
+        summaries = sorted(
+            (
+                entry
+                for entry in os.scandir(Config.PROFILE_FOLDER)
+                if entry.name.endswith(".json")
+            ),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+        for entry in summaries[Config.PROFILE_RETENTION:]:
+            profile_id = entry.name[:-len(".json")]
+            for suffix in (".json", ".prof"):
+                path = os.path.join(Config.PROFILE_FOLDER, profile_id + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @staticmethod
+    def get_artifact_path(profile_id: str, kind: str) -> Optional[str]:
+        """Return the path of a stored artifact (``json`` or ``prof``), or None."""
+        if not PROFILE_ID_PATTERN.match(profile_id) or kind not in ("json", "prof"):
+            return None
+        path = os.path.join(Config.PROFILE_FOLDER, f"{profile_id}.{kind}")
+        return path if os.path.exists(path) else None
+
+    @staticmethod
+    def list_profiles() -> List[dict]:
+        """List stored profiles, newest first, without the bulky details."""
+        if not os.path.isdir(Config.PROFILE_FOLDER):
+            return []
+        profiles = []
+        for entry in os.scandir(Config.PROFILE_FOLDER):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as f:
+                    summary = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            for key in ("top_functions", "top_allocations"):
+                summary.pop(key, None)
+            profiles.append(summary)
+        return sorted(profiles, key=lambda p: p.get("created_at", ""), reverse=True)
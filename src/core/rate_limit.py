@@ -0,0 +1,85 @@
+import time
+import logging
+import threading
+from typing import Dict, Optional
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens a second, holding up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take ``tokens``, sleeping until they are available; return seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class RateLimiter:
+    """Client-side request rate limits for the external ASR and LLM providers.
+
+    Each provider has a token bucket allowing ``*_RATE_LIMIT`` requests per
+    minute, with bursts of up to one second's worth of requests. Callers
+    block until their request fits; a limit of 0 disables the bucket. Limits
+    apply per process, so a caller running several processes divides the
+    provider's quota between them (see ``configure``).
+    """
+
+    _lock = threading.Lock()
+    _buckets: Optional[Dict[str, Optional[TokenBucket]]] = None
+
+    @staticmethod
+    def _build_bucket(per_minute: float) -> Optional[TokenBucket]:
+        if not per_minute or per_minute <= 0:
+            return None
+        rate = per_minute / 60.0
+        return TokenBucket(rate, rate)
+
+    @classmethod
+    def configure(cls, limits: Dict[str, float]) -> None:
+        """Replace the per-minute limits of the given providers (0 disables)."""
+        with cls._lock:
+            if cls._buckets is None:
+                cls._buckets = cls._default_buckets()
+            for provider, per_minute in limits.items():
+                cls._buckets[provider] = cls._build_bucket(per_minute)
+
+    @classmethod
+    def _default_buckets(cls) -> Dict[str, Optional[TokenBucket]]:
+        return {
+            "asr": cls._build_bucket(Config.ASR_RATE_LIMIT),
+            "llm": cls._build_bucket(Config.LLM_RATE_LIMIT),
+        }
+
+    @classmethod
+    def acquire(cls, provider: str) -> None:
+        """Wait until one more request to ``provider`` is allowed."""
+        with cls._lock:
+            if cls._buckets is None:
+                cls._buckets = cls._default_buckets()
+            bucket = cls._buckets.get(provider)
+        if bucket is None:
+            return
+        waited = bucket.acquire()
+        if waited > 0.5:
+            logger.info(f"Waited {waited:.1f}s for the {provider} rate limit")
@@ -0,0 +1,423 @@
+import json
+import math
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch style).
+
+    Values fall into logarithmic bins ``gamma**(i-1) < x <= gamma**i`` with
+    ``gamma = (1 + alpha) / (1 - alpha)``, so any reported quantile is within
+    ``alpha`` relative error of the exact one. Two sketches merge by adding
+    their bin counts, which is what lets hourly buckets be combined into any
+    coarser range without reading the underlying rows.
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    # Beyond this many bins the lowest ones are
+    # collapsed (keeps the upper quantiles exact)
+    MAX_BINS = 2048
+
+    def __init__(self):
+        self.gamma = (1 + self.RELATIVE_ACCURACY) / (1 - self.RELATIVE_ACCURACY)
+        self.log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float) -> None:
+        value = float(value)
+        if value <= 0:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self.log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + 1
+            if len(self.bins) > self.MAX_BINS:
+                self._collapse()
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: "QuantileSketch") -> None:
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        if len(self.bins) > self.MAX_BINS:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def _collapse(self) -> None:
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - self.MAX_BINS + 1]
+        folded = sum(self.bins.pop(key) for key in excess)
+        target = keys[len(excess)]
+        self.bins[target] = self.bins.get(target, 0) + folded
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Return the estimated ``q`` quantile (0 <= q <= 1), or None when empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                # The bin midpoint can fall slightly outside the observed range
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "zero": self.zero_count,
+            "bins": {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls()
+        sketch.count = data["count"]
+        sketch.total = data["sum"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        sketch.zero_count = data["zero"]
+        sketch.bins = {int(key): count for key, count in data["bins"].items()}
+        return sketch
+
+
+class RollupService:
+    """Hourly rollups of request volume and stage latencies.
+
+    One row per (hour, language, model, doctor) holds the request count and
+    a quantile sketch per latency metric. Rows are updated in the same
+    transaction that inserts the results, so analytics queries only ever read
+    the rollups and their cost depends on the number of buckets requested,
+    not on the size of the history.
+
+    A "built" marker row records that the rollups cover the whole history.
+    ``rebuild`` recomputes them from audio_results whenever it is missing,
+    and a failed update removes it instead of failing the insert. The rebuild
+    runs in short transactions over id ranges: ``rebuild_end`` is the last id
+    it covers and ``rebuild_next`` how far it got. Live inserts inside that
+    range are left to the rebuild, since ids are not committed in order.
+    """
+
+    TABLE = "audio_result_rollups"
+    STATE_TABLE = "audio_result_rollups_state"
+    METRICS = (
+        "preprocessing_time", "voice_processing_time", "llm_processing_time",
+        "validation_time", "refine_time", "translation_time", "extraction_time",
+    )
+    DIMENSIONS = ("language", "model", "doctor_name")
+    GRANULARITIES = {"hour": 13, "day": 10, "month": 7}
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    @classmethod
+    def create_schema(cls, cursor) -> None:
+        """Create the rollup table."""
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {cls.TABLE} (
+            bucket_start TEXT NOT NULL,
+            language TEXT NOT NULL,
+            model TEXT NOT NULL,
+            doctor_name TEXT NOT NULL,
+            request_count INTEGER NOT NULL,
+            sketches TEXT NOT NULL,
+            PRIMARY KEY (bucket_start, language, model, doctor_name)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {cls.STATE_TABLE} (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        ''')
+
+    @staticmethod
+    def bucket_of(insertion_date: str) -> str:
+        """Return the start of the hour an insertion_date falls in."""
+        return f"{str(insertion_date)[:13]}:00:00"
+
+    @classmethod
+    def _key(cls, record: dict) -> tuple:
+        # Missing dimensions are stored as '' so they take part in the primary key
+        return (cls.bucket_of(record["insertion_date"]),
+                *(record.get(dimension) or "" for dimension in cls.DIMENSIONS))
+
+    @classmethod
+    def apply_inserts(cls, conn, records: Iterable[dict]) -> None:
+        """Fold newly inserted results into their hourly buckets.
+
+        Must run inside the transaction that inserted the rows, after the
+        insert, so the write lock is already held for the read-modify-write.
+        Never fails the insert: on error the rollup changes are rolled back to
+        a savepoint and the rollups are marked for a rebuild.
+        """
+        records = list(records)
+        try:
+            conn.execute("SAVEPOINT rollups")
+            try:
+                state = cls._state(conn)
+                if "rebuild_end" in state:
+                    # The rebuild folds these itself when it reaches them
+                    start = int(state["rebuild_next"])
+                    end = int(state["rebuild_end"])
+                    records = [r for r in records if not start < r["id"] <= end]
+                cls._fold(conn, records)
+            except Exception:
+                conn.execute("ROLLBACK TO rollups")
+                raise
+            finally:
+                conn.execute("RELEASE rollups")
+        except Exception as e:
+            logger.error(f"Rollups not updated for {len(records)} results, "
+                         f"they will be rebuilt: {str(e)}", exc_info=True)
+            try:
+                # Also restarts a rebuild in progress, which would not cover them
+                conn.execute(f"DELETE FROM {cls.STATE_TABLE}")
+            except Exception as e:
+                logger.error(f"Could not mark the rollups for a rebuild: {str(e)}")
+
+    @classmethod
+    def _state(cls, conn) -> Dict[str, str]:
+        return {
+            row[0]: row[1]
+            for row in conn.execute(f"SELECT name, value FROM {cls.STATE_TABLE}")
+        }
+
+    @classmethod
+    def is_built(cls, conn) -> bool:
+        """Whether the rollups cover the whole history."""
+        return "built" in cls._state(conn)
+
+    @classmethod
+    def _fold(cls, conn, records: Sequence[dict]) -> None:
+        groups = defaultdict(list)
+        for record in records:
+            groups[cls._key(record)].append(record)
+
+        for key, group in groups.items():
+            row = conn.execute(
+                f"SELECT request_count, sketches FROM {cls.TABLE} "
+                "WHERE bucket_start = ? AND language = ? AND model = ? "
+                "AND doctor_name = ?",
+                key,
+            ).fetchone()
+            if row:
+                request_count = row[0]
+                sketches = {
+                    name: QuantileSketch.from_dict(data)
+                    for name, data in json.loads(row[1]).items()
+                }
+            else:
+                request_count, sketches = 0, {}
+
+            for record in group:
+                request_count += 1
+                for metric in cls.METRICS:
+                    value = record.get(metric)
+                    # Non-medical results carry "error" instead of a timing
+                    if isinstance(value, (int, float)):
+                        sketches.setdefault(metric, QuantileSketch()).add(value)
+
+            conn.execute(
+                f"INSERT OR REPLACE INTO {cls.TABLE} "
+                "(bucket_start, language, model, doctor_name, request_count, "
+                "sketches) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    *key,
+                    request_count,
+                    json.dumps(
+                        {name: sketch.to_dict() for name, sketch in sketches.items()}
+                    ),
+                ),
+            )
+
+    @classmethod
+    def rebuild(cls, conn, batch_size: int = 1000) -> int:
+        """Build the rollups from audio_results unless the "built" marker is set.
+
+        Buckets written by live inserts before the marker existed are
+        discarded and recomputed. Each batch is folded in its own immediate
+        transaction, so writers wait for one batch at most, and concurrent
+        workers share the work instead of double counting. An interrupted
+        rebuild resumes where it stopped.
+
+        Returns:
+            int: Number of results folded in (0 when nothing needed rebuilding)
+        """
+        columns = ", ".join(("id", "insertion_date") + cls.DIMENSIONS + cls.METRICS)
+        total = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = cls._state(conn)
+                if "built" in state:
+                    conn.commit()
+                    break
+                if "rebuild_end" not in state:
+                    conn.execute(f"DELETE FROM {cls.TABLE}")
+                    last_id = conn.execute(
+                        "SELECT COALESCE(MAX(id), 0) FROM audio_results"
+                    ).fetchone()[0]
+                    conn.executemany(
+                        f"INSERT OR REPLACE INTO {cls.STATE_TABLE} (name, value) "
+                        "VALUES (?, ?)",
+                        (("rebuild_end", str(last_id)), ("rebuild_next", "0")),
+                    )
+                    conn.commit()
+                    continue
+                start, end = int(state["rebuild_next"]), int(state["rebuild_end"])
+                rows = conn.execute(
+                    f"SELECT {columns} FROM audio_results "
+                    "WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                    (start, end, batch_size),
+                ).fetchall()
+                if rows:
+                    records = [dict(row) for row in rows]
+                    cls._fold(conn, records)
+                    total += len(records)
+                    conn.execute(
+                        f"UPDATE {cls.STATE_TABLE} SET value = ? "
+                        "WHERE name = 'rebuild_next'",
+                        (str(records[-1]["id"]),),
+                    )
+                else:
+                    conn.execute(
+                        f"DELETE FROM {cls.STATE_TABLE} "
+                        "WHERE name IN ('rebuild_end', 'rebuild_next')"
+                    )
+                    conn.execute(
+                        f"INSERT INTO {cls.STATE_TABLE} (name, value) "
+                        "VALUES ('built', ?)",
+                        (datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if total:
+            logger.info(f"Built rollups from {total} existing results")
+        return total
+
+    @classmethod
+    def query(
+        cls,
+        conn,
+        metrics: Optional[Sequence[str]] = None,
+        group_by: Sequence[str] = (),
+        granularity: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        language: Optional[str] = None,
+        model: Optional[str] = None,
+        doctor_name: Optional[str] = None,
+    ) -> List[dict]:
+        """Aggregate rollup buckets into volume and latency quantiles.
+
+        Args:
+            metrics: Latency metrics to report (defaults to all)
+            group_by: Dimensions to break the results down by
+            granularity: 'hour', 'day' or 'month' to add a time series, or None
+                for totals
+            date_from, date_to: Bucket range; date_to is exclusive
+            language, model, doctor_name: Optional filters
+
+        Raises:
+            ValueError: On an unknown metric, dimension or granularity
+        """
+        metrics = list(metrics or cls.METRICS)
+        unknown = [name for name in metrics if name not in cls.METRICS]
+        unknown += [name for name in group_by if name not in cls.DIMENSIONS]
+        if granularity is not None and granularity not in cls.GRANULARITIES:
+            unknown.append(granularity)
+        if unknown:
+            raise ValueError(f"Unknown analytics parameters: {', '.join(unknown)}")
+
+        conditions, params = [], []
+        if date_from:
+            conditions.append("bucket_start >= ?")
+            params.append(cls.bucket_of(cls._normalize_timestamp(date_from)))
+        if date_to:
+            conditions.append("bucket_start < ?")
+            params.append(cls._normalize_timestamp(date_to))
+        for dimension, value in (
+            ("language", language),
+            ("model", model),
+            ("doctor_name", doctor_name),
+        ):
+            if value is not None:
+                conditions.append(f"{dimension} = ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        groups: Dict[tuple, dict] = {}
+        rows = conn.execute(
+            "SELECT bucket_start, language, model, doctor_name, request_count, "
+            f"sketches FROM {cls.TABLE} {where} ORDER BY bucket_start",
+            params,
+        )
+        for row in rows:
+            key = tuple(row[dimension] for dimension in group_by)
+            if granularity:
+                key = (row["bucket_start"][:cls.GRANULARITIES[granularity]],) + key
+            group = groups.setdefault(key, {"request_count": 0, "sketches": {}})
+            group["request_count"] += row["request_count"]
+            for name, data in json.loads(row["sketches"]).items():
+                if name in metrics:
+                    sketch = QuantileSketch.from_dict(data)
+                    if name in group["sketches"]:
+                        group["sketches"][name].merge(sketch)
+                    else:
+                        group["sketches"][name] = sketch
+
+        results = []
+        for key, group in groups.items():
+            entry = {}
+            if granularity:
+                entry["period"], key = key[0], key[1:]
+            entry.update(zip(group_by, key))
+            entry["request_count"] = group["request_count"]
+            entry["metrics"] = {
+                name: cls._summarize(group["sketches"].get(name)) for name in metrics
+            }
+            results.append(entry)
+        return results
+
+    @classmethod
+    def _summarize(cls, sketch: Optional[QuantileSketch]) -> dict:
+        if sketch is None or sketch.count == 0:
+            return {"count": 0}
+        summary = {
+            "count": sketch.count,
+            "mean": round(sketch.total / sketch.count, 4),
+            "min": round(sketch.min, 4),
+            "max": round(sketch.max, 4),
+        }
+        for q in cls.QUANTILES:
+            summary[f"p{int(q * 100)}"] = round(sketch.quantile(q), 4)
+        return summary
+
+    @staticmethod
+    def _normalize_timestamp(value: str) -> str:
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,239 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+class ScratchQuotaExceeded(Exception):
+    """Raised when no scratch root has room for another workspace."""
+
+    def __init__(self, requested: int):
+        self.requested = requested
+        super().__init__(
+            f"No scratch space left for a {requested / MB:.1f} MB workspace"
+        )
+
+
+class Workspace:
+    """A request's scratch directory; ``cleanup`` removes it and may be called twice."""
+
+    def __init__(self, path: str, root: str, reserved: int):
+        self.path = path
+        self.root = root
+        self.reserved = reserved
+        self._removed = False
+
+    def file_path(self, filename: str) -> str:
+        """A unique path in the workspace, keeping ``filename``'s extension."""
+        return os.path.join(
+            self.path, f"{uuid.uuid4().hex}{os.path.splitext(filename)[1]}"
+        )
+
+    def cleanup(self) -> None:
+        if self._removed:
+            return
+        self._removed = True
+        shutil.rmtree(self.path, ignore_errors=True)
+        ScratchManager._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+class ScratchManager:
+    """Per-request scratch workspaces, on tmpfs when possible.
+
+    Workspaces are created under ``SCRATCH_MEMORY_DIR`` (``/dev/shm`` by
+    default) while this process's reservations there stay within
+    ``SCRATCH_MEMORY_QUOTA_MB`` and the filesystem has room. Beyond that
+    they spill to ``UPLOAD_FOLDER`` on disk, which has its own quota
+    (``SCRATCH_DISK_QUOTA_MB``, 0 for none). A workspace reserves an
+    estimate of what it will hold, usually a multiple of the upload size.
+    ``ScratchQuotaExceeded`` is raised when neither root can take it.
+
+    The quotas count reservations only. What a workspace actually writes is
+    not measured, so ``SCRATCH_SIZE_FACTOR`` must cover the largest
+    intermediate files the pipeline produces. The free-space check keeps a
+    headroom on the tmpfs for the same reason.
+
+    Directories are named ``<pid>-<uuid>``. A workspace is removed when its
+    ``with`` block exits, whether it succeeded, raised or was cancelled.
+    The ones still open at shutdown are removed by ``cleanup_all``.
+    ``sweep_stale`` runs at startup and removes directories left by
+    processes that died.
+    """
+
+    # Free space kept on the tmpfs for everything else that uses it
+    MEMORY_HEADROOM = 64 * MB
+
+    _lock = threading.Lock()
+    _reserved: Dict[str, int] = {}
+    _active: Dict[str, Workspace] = {}
+
+    @staticmethod
+    def _memory_root() -> Optional[str]:
+        base = Config.SCRATCH_MEMORY_DIR
+        if not base or not os.path.isdir(base) or not os.access(base, os.W_OK):
+            return None
+        return os.path.join(base, "medical_voice_scratch")
+
+    @classmethod
+    def _roots(cls, on_disk: bool) -> List[tuple]:
+        """``(root, quota in bytes or 0)`` in order of preference."""
+        roots = []
+        memory_root = None if on_disk else cls._memory_root()
+        if memory_root:
+            roots.append((memory_root, int(Config.SCRATCH_MEMORY_QUOTA_MB * MB)))
+        roots.append((Config.UPLOAD_FOLDER, int(Config.SCRATCH_DISK_QUOTA_MB * MB)))
+        return roots
+
+    @classmethod
+    def _has_room(cls, root: str, quota: int, size: int) -> bool:
+        if quota and cls._reserved.get(root, 0) + size > quota:
+            return False
+        if root == cls._memory_root():
+            os.makedirs(root, exist_ok=True)
+            return shutil.disk_usage(root).free >= size + cls.MEMORY_HEADROOM
+        return True
+
+    @classmethod
+    def create(cls, expected_bytes: int = 0, on_disk: bool = False) -> Workspace:
+        """Create a workspace with room for ``expected_bytes``.
+
+        The caller must ``cleanup`` it.
+
+        Args:
+            expected_bytes: Space reserved against the quota
+            on_disk: Skip tmpfs, for outputs that may be large (exports)
+        """
+        size = max(0, int(expected_bytes))
+        with cls._lock:
+            for root, quota in cls._roots(on_disk):
+                if cls._has_room(root, quota, size):
+                    cls._reserved[root] = cls._reserved.get(root, 0) + size
+                    break
+            else:
+                raise ScratchQuotaExceeded(size)
+        path = os.path.join(root, f"{os.getpid()}-{uuid.uuid4().hex}")
+        try:
+            os.makedirs(path)
+        except Exception:
+            with cls._lock:
+                cls._reserved[root] -= size
+            raise
+        workspace = Workspace(path, root, size)
+        with cls._lock:
+            cls._active[path] = workspace
+        return workspace
+
+    @classmethod
+    @contextmanager
+    def workspace(cls, expected_bytes: int = 0, on_disk: bool = False):
+        """Context manager around ``create`` that always removes the workspace."""
+        workspace = cls.create(expected_bytes, on_disk)
+        try:
+            yield workspace
+        finally:
+            workspace.cleanup()
+
+    @classmethod
+    def _release(cls, workspace: Workspace) -> None:
+        with cls._lock:
+            if cls._active.pop(workspace.path, None) is not None:
+                cls._reserved[workspace.root] = (
+                    cls._reserved.get(workspace.root, 0) - workspace.reserved
+                )
+
+    @classmethod
+    def cleanup_all(cls) -> None:
+        """Remove every workspace this process still holds (shutdown)."""
+        with cls._lock:
+            workspaces = list(cls._active.values())
+        for workspace in workspaces:
+            workspace.cleanup()
+        if workspaces:
+            logger.info(f"Removed {len(workspaces)} open scratch workspaces")
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        except OSError:
+            return False
+        return True
+
+    @classmethod
+    def sweep_stale(cls) -> int:
+        """Remove workspaces left by dead processes; returns how many were removed.
+
+        A ``<pid>-<uuid>`` directory is stale when its process is gone or it is
+        older than ``SCRATCH_MAX_AGE`` (pids get reused). Bare uuid
+        directories from older versions only go by age.
+        """
+        now = time.time()
+        removed = 0
+        roots = {Config.UPLOAD_FOLDER}
+        memory_root = cls._memory_root()
+        if memory_root:
+            roots.add(memory_root)
+        for root in roots:
+            try:
+                entries = list(os.scandir(root))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                owner, _, suffix = entry.name.partition("-")
+                if suffix and owner.isdigit() and len(suffix) == 32:
+                    pid = int(owner)
+                    if pid == os.getpid():
+                        continue
+                    stale = not cls._pid_alive(pid)
+                elif len(entry.name) == 32 and all(
+                    c in "0123456789abcdef" for c in entry.name
+                ):
+                    stale = False
+                else:
+                    continue
+                try:
+                    stale = (
+                        stale
+                        or now - entry.stat(follow_symlinks=False).st_mtime
+                        > Config.SCRATCH_MAX_AGE
+                    )
+                except FileNotFoundError:
+                    continue
+                if stale:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+        if removed:
+            logger.info(f"Removed {removed} stale scratch workspaces")
+        return removed
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """Open workspaces and reserved megabytes per root."""
+        with cls._lock:
+            return {
+                "open_workspaces": len(cls._active),
+                "reserved_mb": {
+                    root: round(size / MB, 1) for root, size in cls._reserved.items()
+                },
+            }
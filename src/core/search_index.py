@@ -0,0 +1,269 @@
+import re
+import logging
+import unicodedata
+from typing import Iterable, List, Sequence
+from .cold_storage import ColdStorageService
+
+logger = logging.getLogger(__name__)
+
+
+class SearchIndexService:
+    """FTS5 full-text index over the transcripts stored in audio_results.
+
+    The index covers ``raw_text``, ``arabic_text`` and ``translation_text``
+    keyed by the result id. It is contentless (``content=''``): only the
+    inverted index is stored, not another copy of the text, which would
+    undo the savings of cold storage. Snippets are therefore cut from the
+    result rows themselves. Rows are indexed in the transaction that writes
+    them; transcripts are never updated or deleted afterwards, so nothing
+    else has to keep the index in step. Arabic is normalized before
+    indexing and before querying (diacritics and tatweel removed, alef/yaa/
+    taa marbuta variants folded, Arabic-Indic digits mapped to ASCII), so a
+    search matches regardless of how the transcript spelled those letters.
+    Latin text relies on FTS5's unicode61 tokenizer with diacritic removal.
+    """
+
+    TABLE = "audio_results_fts"
+    # Rows up to backfill_end were stored before the index; backfilled is how
+    # far they have been indexed
+    STATE_TABLE = "audio_results_fts_state"
+    COLUMNS = ("raw_text", "arabic_text", "translation_text")
+    RESULT_COLUMNS = (
+        "id", "filename", "language", "model", "doctor_name", "insertion_date",
+    )
+    # bm25 column weights: the refined and translated
+    # texts are cleaner than raw ASR output
+    COLUMN_WEIGHTS = (1.0, 1.5, 1.5)
+    SNIPPET_OPEN = "["
+    SNIPPET_CLOSE = "]"
+    SNIPPET_TOKENS = 12
+
+    # Harakat, Quranic annotation marks, superscript alef and tatweel
+    ARABIC_MARKS = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+    ARABIC_FOLDING = str.maketrans({
+        "\u0623": "\u0627",  # alef with hamza above -> alef
+        "\u0625": "\u0627",  # alef with hamza below -> alef
+        "\u0622": "\u0627",  # alef with madda -> alef
+        "\u0671": "\u0627",  # alef wasla -> alef
+        "\u0649": "\u064A",  # alef maksura -> yaa
+        "\u0629": "\u0647",  # taa marbuta -> haa
+        **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+        **{chr(0x06F0 + digit): str(digit) for digit in range(10)},
+    })
+    TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+    @classmethod
+    def normalize(cls, text):
+        """Normalize text for indexing and querying."""
+        if not text:
+            return ""
+        return cls.ARABIC_MARKS.sub("", str(text)).translate(cls.ARABIC_FOLDING)
+
+    @classmethod
+    def fold(cls, text: str) -> str:
+        """Normalize a term the way the FTS5 tokenizer does (case, Latin accents)."""
+        decomposed = unicodedata.normalize("NFKD", cls.normalize(text).lower())
+        return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+    @classmethod
+    def create_schema(cls, cursor) -> None:
+        """Create the FTS5 table, replacing one that stored its own copy of the text."""
+        row = cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE name = ?", (cls.TABLE,)
+        ).fetchone()
+        stored_content = row is not None and not re.search(r"content\s*=\s*''", row[0])
+        if stored_content:
+            cursor.execute(f"DROP TABLE {cls.TABLE}")
+            logger.info(f"Rebuilding {cls.TABLE} as a contentless index")
+        cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {cls.TABLE} USING fts5(
+            {", ".join(cls.COLUMNS)},
+            content = '',
+            tokenize = "unicode61 remove_diacritics 2"
+        )
+        ''')
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {cls.STATE_TABLE} (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        ''')
+        if row is None or stored_content:
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {cls.STATE_TABLE} (name, value) "
+                "SELECT 'backfill_end', COALESCE(MAX(id), 0) FROM audio_results"
+            )
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {cls.STATE_TABLE} (name, value) "
+                "VALUES ('backfilled', 0)"
+            )
+
+    @classmethod
+    def index_rows(cls, conn, records: Iterable[dict]) -> None:
+        """Add index entries for new audio_results rows.
+
+        A contentless table cannot replace an entry, so each row must be
+        indexed once.
+        """
+        conn.executemany(
+            f"INSERT INTO {cls.TABLE} (rowid, {', '.join(cls.COLUMNS)}) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (
+                    record["id"],
+                    *(cls.normalize(record.get(column)) for column in cls.COLUMNS),
+                )
+                for record in records
+            ],
+        )
+
+    @classmethod
+    def _state(cls, conn) -> dict:
+        return {
+            row[0]: row[1]
+            for row in conn.execute(f"SELECT name, value FROM {cls.STATE_TABLE}")
+        }
+
+    @classmethod
+    def backfill(cls, conn, batch_size: int = 1000) -> int:
+        """Index the rows stored before the index existed, in batches.
+
+        Each batch runs under ``BEGIN IMMEDIATE`` and advances the
+        ``backfilled`` watermark, so a restart resumes where it stopped and
+        concurrent workers take turns instead of indexing a row twice. Rows
+        in the range that were already indexed when written are skipped.
+
+        Returns:
+            int: Number of rows indexed
+        """
+        state = cls._state(conn)
+        if state.get("backfilled", 0) >= state.get("backfill_end", 0):
+            return 0
+        total = 0
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = cls._state(conn)
+                last_id, end = state.get("backfilled", 0), state.get("backfill_end", 0)
+                rows = []
+                if last_id < end:
+                    rows = [
+                        dict(row)
+                        for row in conn.execute(
+                            f"SELECT id, {', '.join(cls.COLUMNS)} FROM audio_results "
+                            "WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                            (last_id, end, batch_size),
+                        )
+                    ]
+                if rows:
+                    indexed = {
+                        row[0]
+                        for row in conn.execute(
+                            f"SELECT rowid FROM {cls.TABLE} "
+                            "WHERE rowid BETWEEN ? AND ?",
+                            (rows[0]["id"], rows[-1]["id"]),
+                        )
+                    }
+                    missing = [row for row in rows if row["id"] not in indexed]
+                    cls.index_rows(conn, ColdStorageService.hydrate(conn, missing))
+                    total += len(missing)
+                    last_id = rows[-1]["id"]
+                else:
+                    last_id = end
+                conn.execute(
+                    f"UPDATE {cls.STATE_TABLE} SET value = ? WHERE name = 'backfilled'",
+                    (last_id,),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if not rows:
+                break
+        if total:
+            logger.info(f"Indexed {total} existing results for full-text search")
+        return total
+
+    @classmethod
+    def build_match_query(cls, query: str) -> str:
+        """Turn free text into a safe FTS5 query: every term must match, as a prefix."""
+        terms = cls.TERM_PATTERN.findall(cls.normalize(query).lower())
+        # Quoting each term keeps user input from being parsed as FTS5 syntax
+        return " ".join(f'"{term}"*' for term in terms)
+
+    @classmethod
+    def snippet(cls, record: dict, terms: Sequence[str]) -> str:
+        """Cut a snippet like FTS5's ``snippet()`` from a result's own text.
+
+        The column with the most distinct matching terms is used, showing
+        ``SNIPPET_TOKENS`` words from just before the first match, with the
+        matching words bracketed.
+        """
+        best = None
+        for column in cls.COLUMNS:
+            text = record.get(column) or ""
+            words = list(cls.TERM_PATTERN.finditer(text))
+            folded = [cls.fold(word.group(0)) for word in words]
+            hits = [
+                next((term for term in terms if key.startswith(term)), None)
+                for key in folded
+            ]
+            matched = len({hit for hit in hits if hit})
+            if matched and (best is None or matched > best[0]):
+                best = (matched, text, words, hits)
+        if best is None:
+            return ""
+        _, text, words, hits = best
+        first = next(i for i, hit in enumerate(hits) if hit)
+        start = max(0, min(first - 2, len(words) - cls.SNIPPET_TOKENS))
+        end = min(len(words), start + cls.SNIPPET_TOKENS)
+        pieces = ["..." if start else ""]
+        position = words[start].start()
+        for word, hit in zip(words[start:end], hits[start:end]):
+            pieces.append(text[position:word.start()])
+            pieces.append(
+                f"{cls.SNIPPET_OPEN}{word.group(0)}{cls.SNIPPET_CLOSE}"
+                if hit
+                else word.group(0)
+            )
+            position = word.end()
+        pieces.append("..." if end < len(words) else text[position:])
+        return "".join(pieces)
+
+    @classmethod
+    def search(cls, conn, query: str, limit: int = 20, offset: int = 0) -> List[dict]:
+        """Return ranked matches with a highlighted snippet, best first.
+
+        Fetches ``limit + 1`` rows so callers can tell whether more exist.
+        """
+        match = cls.build_match_query(query)
+        if not match:
+            return []
+        weights = ", ".join(str(weight) for weight in cls.COLUMN_WEIGHTS)
+        ranked = conn.execute(
+            f"SELECT rowid, bm25({cls.TABLE}, {weights}) FROM {cls.TABLE} "
+            f"WHERE {cls.TABLE} MATCH ? ORDER BY 2 LIMIT ? OFFSET ?",
+            (match, limit + 1, offset),
+        ).fetchall()
+        if not ranked:
+            return []
+        ids = [row[0] for row in ranked]
+        records = {
+            row["id"]: dict(row)
+            for row in conn.execute(
+                f"SELECT {', '.join(cls.RESULT_COLUMNS + cls.COLUMNS)} "
+                f"FROM audio_results WHERE id IN ({', '.join('?' * len(ids))})",
+                ids,
+            )
+        }
+        ColdStorageService.hydrate(conn, list(records.values()), cls.COLUMNS)
+        terms = [cls.fold(term) for term in cls.TERM_PATTERN.findall(query)]
+        results = []
+        for result_id, score in ranked:
+            record = records.get(result_id)
+            if record is None:
+                continue
+            snippet = cls.snippet(record, terms)
+            result = {column: record[column] for column in cls.RESULT_COLUMNS}
+            results.append({**result, "score": score, "snippet": snippet})
+        return results
@@ -0,0 +1,77 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupState:
+    """Startup phase timings and the readiness flag served by /ready.
+
+    The server is live as soon as it accepts connections; it becomes ready
+    once the optional background warm-up has loaded the heavy dependencies.
+    """
+
+    _lock = threading.Lock()
+    _phases: Dict[str, float] = {}
+    _errors: Dict[str, str] = {}
+    _ready = threading.Event()
+
+    @classmethod
+    def record(cls, name: str, seconds: float) -> None:
+        """Store the duration of a startup phase."""
+        with cls._lock:
+            cls._phases[name] = round(seconds, 4)
+        logger.info(f"Startup phase '{name}' took {seconds:.3f}s")
+
+    @classmethod
+    @contextmanager
+    def phase(cls, name: str):
+        """Time a startup phase, remembering its error instead of crashing startup."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with cls._lock:
+                cls._errors[name] = str(e)
+            logger.error(f"Startup phase '{name}' failed: {str(e)}", exc_info=True)
+        finally:
+            cls.record(name, time.perf_counter() - start)
+
+    @classmethod
+    def warm_up(cls, steps: List[Tuple[str, Callable[[], object]]]) -> None:
+        """Run warm-up steps in order, then mark the server ready."""
+        start = time.perf_counter()
+        for name, step in steps:
+            with cls.phase(f"warmup_{name}"):
+                step()
+        cls.record("warmup_total", time.perf_counter() - start)
+        cls.mark_ready()
+
+    @classmethod
+    def start_warm_up(cls, steps: List[Tuple[str, Callable[[], object]]]) -> None:
+        """Run the warm-up steps on a daemon thread so startup is not delayed."""
+        threading.Thread(
+            target=cls.warm_up, args=(steps,), name="warm-up", daemon=True
+        ).start()
+
+    @classmethod
+    def mark_ready(cls) -> None:
+        cls._ready.set()
+        logger.info("Application is ready")
+
+    @classmethod
+    def is_ready(cls) -> bool:
+        return cls._ready.is_set()
+
+    @classmethod
+    def report(cls) -> dict:
+        """Return readiness, phase timings and any warm-up errors."""
+        with cls._lock:
+            return {
+                "ready": cls.is_ready(),
+                "phases": dict(cls._phases),
+                "errors": dict(cls._errors),
+            }
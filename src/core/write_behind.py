@@ -0,0 +1,258 @@
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+from .db_connection import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+# A queued write: (operation name, payload)
+WriteOp = Tuple[str, dict]
+
+
+class WriteBehindQueue:
+    """Background writer that applies queued writes in batched transactions.
+
+    Callers enqueue operations and return immediately; a single writer thread
+    groups them into one transaction per batch, flushed when ``batch_size``
+    operations are pending or ``flush_interval`` seconds have passed since the
+    first one. ``stop()`` (called on shutdown and at interpreter exit) drains
+    everything still queued, so graceful shutdowns lose nothing. A hard crash
+    can lose at most the writes of the last interval.
+
+    A write that fails is kept and retried with exponential backoff, and
+    later writes for the same id wait behind it. Lock timeouts (a long
+    VACUUM, for example) are retried for as long as they last. Any other
+    error ends the retries after ``max_attempts``. The write is then
+    appended to the ``dead_letter_path`` JSON lines file, so it can be
+    replayed by hand, and is never silently lost.
+    """
+
+    # Delay before the first retry, doubled on every failed round up to the maximum
+    RETRY_DELAY = 0.5
+    MAX_RETRY_DELAY = 30.0
+
+    def __init__(
+        self,
+        db_path: str,
+        apply_batch: Callable[[object, List[WriteOp]], None],
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+        on_done: Optional[Callable[[List[WriteOp]], None]] = None,
+        max_attempts: int = 10,
+        dead_letter_path: Optional[str] = None,
+    ):
+        self.db_path = db_path
+        self.apply_batch = apply_batch
+        # Called with every write once it is committed or moved to the dead-letter file
+        self.on_done = on_done
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path or f"{db_path}.failed.jsonl"
+        # Failed writes waiting for their next
+        # attempt, in order: [op, payload, attempts]
+        self._retries: List[list] = []
+        self._retry_at = 0.0
+        self._retry_round = 0
+        # Writes taken off _retries for the attempt in progress
+        self._retrying = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="db-write-behind", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def enqueue(self, op: str, payload: dict) -> None:
+        """Queue a write; blocks only if ``max_pending`` writes are already waiting."""
+        if self._stopping.is_set():
+            raise RuntimeError("Write-behind queue is stopped")
+        self._queue.put((op, payload))
+
+    def pending(self) -> int:
+        """Return the number of writes not committed yet, including retries."""
+        return self._queue.qsize() + len(self._retries) + self._retrying
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Block until every write queued so far is committed (or dead-lettered)."""
+        done = threading.Event()
+        self._queue.put(("_barrier", {"event": done}))
+        return done.wait(timeout)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Drain the queue and stop the writer thread."""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Write-behind writer did not stop within {timeout}s, "
+                         f"{self.pending()} writes may be lost")
+        else:
+            logger.info("Write-behind queue drained and stopped")
+
+    def _next_batch(self) -> List[WriteOp]:
+        """Collect up to batch_size writes, waiting flush_interval at most."""
+        try:
+            batch = [self._queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            # When stopping, take whatever is already queued without waiting
+            if self._stopping.is_set():
+                remaining = 0
+            try:
+                batch.append(
+                    self._queue.get(timeout=remaining)
+                    if remaining > 0
+                    else self._queue.get_nowait()
+                )
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        barriers = []
+        while True:
+            batch = self._next_batch()
+            barriers += [payload["event"] for op, payload in batch if op == "_barrier"]
+            writes = [item for item in batch if item[0] != "_barrier"]
+            if writes:
+                self._write(writes)
+
+            if self._retries:
+                now = time.monotonic()
+                if not self._retry_at:
+                    self._retry_at = now + self.RETRY_DELAY
+                elif now >= self._retry_at or self._stopping.is_set():
+                    self._retry()
+            if not self._retries:
+                self._retry_at, self._retry_round = 0.0, 0
+                # Barriers wait for the writes being retried as well
+                for event in barriers:
+                    event.set()
+                barriers = []
+                if not batch and self._stopping.is_set():
+                    break
+
+        ConnectionManager.close_thread_connections()
+
+    def _write(self, writes: List[WriteOp]) -> None:
+        """Commit new writes, except those behind a failed write for the same id."""
+        blocked = {payload.get("id") for _, payload, _ in self._retries} - {None}
+        ready = []
+        for op, payload in writes:
+            if payload.get("id") in blocked:
+                self._retries.append([op, payload, 0])
+            else:
+                ready.append([op, payload, 0])
+        if ready:
+            self._commit(ready)
+
+    def _retry(self) -> None:
+        self._retrying = len(self._retries)
+        items, self._retries = self._retries, []
+        logger.info(f"Retrying {len(items)} failed write-behind writes")
+        # On shutdown this is the last attempt
+        self._commit(items, final=self._stopping.is_set())
+        self._retrying = 0
+        if self._retries:
+            self._retry_round += 1
+            delay = min(self.MAX_RETRY_DELAY, self.RETRY_DELAY * 2 ** self._retry_round)
+            self._retry_at = time.monotonic() + delay
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        """Lock contention clears by itself; anything else counts to max_attempts."""
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and (
+            "locked" in message or "busy" in message
+        )
+
+    def _commit(self, items: List[list], final: bool = False) -> None:
+        """Commit writes in one transaction, falling back to one write at a time.
+
+        Writes that still fail go back to ``_retries``; with ``final`` (or
+        once they are out of attempts) they go to the dead-letter file.
+        """
+        start = time.perf_counter()
+        if len(items) > 1:
+            try:
+                with ConnectionManager.transaction(self.db_path) as conn:
+                    self.apply_batch(conn, [(op, payload) for op, payload, _ in items])
+                logger.info(f"Write-behind committed {len(items)} writes in "
+                            f"{(time.perf_counter() - start) * 1000:.1f} ms")
+                self._done([(op, payload) for op, payload, _ in items])
+                return
+            except Exception as e:
+                logger.error(f"Write-behind batch of {len(items)} failed, "
+                             f"retrying individually: {str(e)}")
+
+        # Isolate the failing writes so the rest of the batch is still persisted
+        done = []
+        failed_ids, dead_ids = set(), set()
+        for item in items:
+            op, payload, attempts = item
+            write_id = payload.get("id")
+            if write_id is not None and write_id in dead_ids:
+                self._dead_letter(
+                    op, payload, "an earlier write for this id failed permanently"
+                )
+                done.append((op, payload))
+                continue
+            if write_id is not None and write_id in failed_ids:
+                self._retries.append(item)
+                continue
+            try:
+                with ConnectionManager.transaction(self.db_path) as conn:
+                    self.apply_batch(conn, [(op, payload)])
+                done.append((op, payload))
+            except Exception as e:
+                item[2] = attempts + 1
+                if final or (
+                    item[2] >= self.max_attempts and not self._is_transient(e)
+                ):
+                    self._dead_letter(op, payload, str(e))
+                    dead_ids.add(write_id)
+                    done.append((op, payload))
+                else:
+                    logger.warning(f"Write-behind {op} for id {write_id} failed "
+                                   f"(attempt {item[2]}), will retry: {str(e)}")
+                    self._retries.append(item)
+                    failed_ids.add(write_id)
+        self._done(done)
+
+    def _done(self, writes: List[WriteOp]) -> None:
+        if writes and self.on_done:
+            self.on_done(writes)
+
+    def _dead_letter(self, op: str, payload: dict, error: str) -> None:
+        """Keep a write that cannot be applied, so it can be replayed by hand."""
+        entry = {
+            "op": op,
+            "payload": payload,
+            "error": error,
+            "failed_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+            logger.error(
+                f"Write-behind {op} for id {payload.get('id')} failed permanently "
+                f"({error}); saved to {self.dead_letter_path}"
+            )
+        except Exception as e:
+            logger.critical(
+                f"Write-behind {op} failed permanently ({error}) and could not be "
+                f"saved ({str(e)}): {json.dumps(entry, default=str)}"
+            )
@@ -1,37 +1,230 @@
 import os
-import tempfile
-import numpy as np
-import librosa
-import soundfile as sf
-from pydub import AudioSegment
-from scipy import signal
+import time
+import logging
+from ..core.config import Config
+from ..core.scratch import ScratchManager
+
+logger = logging.getLogger(__name__)
+
+# numpy, librosa, soundfile, pydub and scipy are imported where they are used:
+# together they take over a second to import and the API server should not
+# pay that before it can accept connections.
 
 class AudioPreprocessingService:
     """Service for audio preprocessing and enhancement."""
     
+    # Signal analysis used to choose the preprocessing steps (see plan_steps)
+    ANALYSIS_FRAME = 0.02
+    SPECTRUM_FFT = 2048
+    SPECTRUM_FRAMES = 64
+    # Leading plus trailing silence, in seconds, worth trimming
+    MIN_EDGE_SILENCE = 0.3
+    # Share of power below RUMBLE_CUTOFF Hz that calls for the high-pass filter
+    RUMBLE_CUTOFF = 80
+    MAX_RUMBLE_RATIO = 0.005
+    HIGHPASS_CUTOFF = 300
+    LOWPASS_CUTOFF = 8000
+    # With fewer pauses than this the noise floor
+    # cannot be measured, so noise is assumed
+    MIN_PAUSE_RATIO = 0.05
+    CLIP_LEVEL = 0.999
+    # Silence threshold for trimming, in dB below the loudest frame
+    TRIM_TOP_DB = 20
+    # STFT shared by trimming, the noise estimate and spectral gating
+    N_FFT = 2048
+    HOP_LENGTH = 512
+    # -1 dBFS: louder recordings are not normalized unless a filter changed their level
+    FULL_SCALE_PEAK = 0.89
+    
+    @classmethod
+    def analyze_signal(cls, y, sr):
+        """Cheap signal statistics used to decide which preprocessing steps help.
+        
+        Frame energies over 20 ms frames give the SNR (95th percentile frame
+        against the 10th) and the silence ratio. The spectrum is averaged over
+        ``SPECTRUM_FRAMES`` windows spread over the recording rather than over
+        every frame, which keeps the pass at a few milliseconds.
+        
+        Returns:
+            dict: snr_db, silence_ratio, edge_silence (seconds), rolloff_hz
+            (99% of the power lies below it), rumble_ratio, clipping_ratio, peak
+        """
+        import numpy as np
+        
+        frame = max(1, int(cls.ANALYSIS_FRAME * sr))
+        count = len(y) // frame
+        if count < 2:
+            return {
+                "snr_db": 0.0,
+                "silence_ratio": 0.0,
+                "edge_silence": 0.0,
+                "rolloff_hz": sr / 2,
+                "rumble_ratio": 0.0,
+                "clipping_ratio": 0.0,
+                "peak": float(np.max(np.abs(y), initial=0.0)),
+            }
+        frames = y[:count * frame].reshape(count, frame)
+        db = 10 * np.log10(np.einsum("ij,ij->i", frames, frames) / frame + 1e-12)
+        noise_floor, speech_level = np.percentile(db, [10, 95])
+        # Halfway (in dB) between the noise floor and the speech level
+        silent = db < (noise_floor + speech_level) / 2
+        voiced = np.flatnonzero(~silent)
+        edge_frames = voiced[0] + (count - 1 - voiced[-1]) if len(voiced) else count
+        
+        n_fft = min(cls.SPECTRUM_FFT, len(y))
+        starts = np.linspace(
+            0, len(y) - n_fft, min(cls.SPECTRUM_FRAMES, max(1, len(y) // n_fft))
+        ).astype(int)
+        windows = y[starts[:, None] + np.arange(n_fft)] * np.hanning(n_fft).astype(
+            y.dtype
+        )
+        power = np.mean(np.abs(np.fft.rfft(windows, axis=1)) ** 2, axis=0)
+        freqs = np.fft.rfftfreq(n_fft, 1 / sr)
+        total = power.sum() + 1e-20
+        cumulative = np.cumsum(power) / total
+        
+        peak = float(np.max(np.abs(y)))
+        return {
+            "snr_db": float(speech_level - noise_floor),
+            "silence_ratio": float(silent.mean()),
+            "edge_silence": float(edge_frames * frame / sr),
+            "rolloff_hz": float(
+                freqs[min(len(freqs) - 1, np.searchsorted(cumulative, 0.99))]
+            ),
+            "rumble_ratio": float(power[freqs < cls.RUMBLE_CUTOFF].sum() / total),
+            "clipping_ratio": float(np.mean(np.abs(y) >= cls.CLIP_LEVEL)),
+            "peak": peak,
+        }
+    
+    @classmethod
+    def plan_steps(cls, analysis, sr):
+        """Decide which steps to run from ``analyze_signal`` output.
+        
+        Returns:
+            dict: Step name to ``(run, reason)``
+        """
+        plan = {}
+        edge = analysis["edge_silence"]
+        plan["trim"] = (
+            edge >= cls.MIN_EDGE_SILENCE,
+            f"{edge:.2f}s of leading/trailing silence",
+        )
+        
+        rumble = analysis["rumble_ratio"]
+        plan["highpass"] = (rumble > cls.MAX_RUMBLE_RATIO,
+                            f"{rumble:.2%} of the power below {cls.RUMBLE_CUTOFF} Hz")
+        
+        if sr / 2 <= cls.LOWPASS_CUTOFF:
+            plan["lowpass"] = (
+                False,
+                f"no content above {cls.LOWPASS_CUTOFF} Hz at {sr} Hz sampling",
+            )
+        else:
+            rolloff = analysis["rolloff_hz"]
+            plan["lowpass"] = (
+                rolloff > cls.LOWPASS_CUTOFF,
+                f"99% spectral rolloff at {rolloff:.0f} Hz",
+            )
+        
+        snr, pauses = analysis["snr_db"], analysis["silence_ratio"]
+        if pauses < cls.MIN_PAUSE_RATIO:
+            plan["denoise"] = (True, f"only {pauses:.0%} pauses, noise floor unknown")
+        else:
+            plan["denoise"] = (snr < Config.DENOISE_SNR_DB, f"SNR {snr:.1f} dB")
+        
+        filtered = any(run for step, (run, _) in plan.items() if step != "trim")
+        peak = analysis["peak"]
+        if filtered:
+            plan["normalize"] = (True, "filtering changed the level")
+        else:
+            plan["normalize"] = (peak < cls.FULL_SCALE_PEAK, f"peak {peak:.2f}")
+        if analysis["clipping_ratio"] > 0.001:
+            logger.warning(
+                f"{analysis['clipping_ratio']:.2%} of the samples are clipped"
+            )
+        return plan
+    
+    @staticmethod
+    def warm_up():
+        """Import the DSP stack and run it once on a short synthetic clip.
+        
+        librosa compiles several numba kernels on first use, so the first real
+        request would otherwise pay for that compilation.
+        """
+        import numpy as np
+        import soundfile as sf
+        
+        with ScratchManager.workspace(1024 * 1024) as workspace:
+            sr = 22050
+            t = np.arange(sr, dtype=np.float32) / sr
+            y = 0.1 * np.sin(2 * np.pi * 220 * t) + 0.01 * np.random.randn(sr).astype(
+                np.float32
+            )
+            input_path = os.path.join(workspace.path, "warm_up.wav")
+            sf.write(input_path, y, sr)
+            # Every step, whatever the adaptive plan would pick for this clip, then
+            # trimming without denoising, which takes a different code path
+            output_path = os.path.join(workspace.path, "warm_up_out.wav")
+            AudioPreprocessingService.preprocess_audio(
+                input_path, output_path, adaptive=False
+            )
+            AudioPreprocessingService.preprocess_audio(
+                input_path, output_path, adaptive=False, remove_noise=False
+            )
+    
     @staticmethod
-    def preprocess_audio(input_file_path, output_file_path=None, 
-                        normalize=True, remove_noise=True, trim_silence=True,
-                        apply_highpass=True, apply_lowpass=True):
+    def preprocess_audio(
+        input_file_path,
+        output_file_path=None,
+        normalize=True,
+        remove_noise=True,
+        trim_silence=True,
+        apply_highpass=True,
+        apply_lowpass=True,
+        timings=None,
+        adaptive=None,
+    ):
         """
         Preprocess audio file to improve quality for transcription.
         
         Args:
             input_file_path: Path to the input audio file
-            output_file_path: Path to save the processed audio file (if None, a temp file is created)
+            output_file_path: Path to save the processed audio file (if None, it
+                is written next to the input as ``<input>_processed.wav``, inside
+                the caller's workspace)
             normalize: Whether to normalize audio volume
             remove_noise: Whether to apply noise reduction
             trim_silence: Whether to trim silence from the beginning and end
             apply_highpass: Whether to apply high-pass filter (remove low frequencies)
             apply_lowpass: Whether to apply low-pass filter (remove high frequencies)
+            timings: Optional dict that receives the seconds spent in each step
+            adaptive: Run only the enabled steps the signal analysis calls for
+                (see plan_steps); defaults to Config.ADAPTIVE_PREPROCESSING
             
         Returns:
             Path to the processed audio file
         """
-        # Create temp file if output path not provided
+        import numpy as np
+        import librosa
+        import soundfile as sf
+        from pydub import AudioSegment
+        from scipy import signal
+        
+        # Default to a file next to the input, so
+        # it is removed with the caller's workspace
         if not output_file_path:
-            temp_dir = tempfile.mkdtemp()
-            output_file_path = os.path.join(temp_dir, "processed_audio.wav")
+            output_file_path = (
+                os.path.splitext(input_file_path or "")[0] + "_processed.wav"
+            )
+        
+        # Step durations, recorded only when the caller asks for them
+        step_start = [time.perf_counter()]
+
+        def mark(step):
+            if timings is not None:
+                now = time.perf_counter()
+                timings[step] = now - step_start[0]
+                step_start[0] = now
         
         # Load audio file using librosa
         try:
@@ -42,58 +235,87 @@ class AudioPreprocessingService:
             # Use pydub to convert any format to WAV first if needed
             if not input_file_path.lower().endswith('.wav'):
                 audio = AudioSegment.from_file(input_file_path)
-                temp_wav = os.path.join(os.path.dirname(input_file_path), "temp_conversion.wav")
+                # Derive the name from the input so concurrent requests never share it
+                temp_wav = os.path.splitext(input_file_path)[0] + "_temp_conversion.wav"
                 audio.export(temp_wav, format="wav")
                 input_file_path = temp_wav
                 
             # Load the audio with librosa
             y, sr = librosa.load(input_file_path, sr=None)
+            mark("load")
             
-            # Apply preprocessing steps
-            if trim_silence:
-                # Trim leading and trailing silence
-                y, _ = librosa.effects.trim(y, top_db=20)
+            # Pick the steps this recording needs; the low-pass filter is a no-op
+            # (and an invalid filter) when the Nyquist frequency is below its cutoff
+            adaptive = Config.ADAPTIVE_PREPROCESSING if adaptive is None else adaptive
+            if adaptive:
+                plan = AudioPreprocessingService.plan_steps(
+                    AudioPreprocessingService.analyze_signal(y, sr), sr
+                )
+                mark("analyze")
+                trim_silence = trim_silence and plan["trim"][0]
+                apply_highpass = apply_highpass and plan["highpass"][0]
+                apply_lowpass = apply_lowpass and plan["lowpass"][0]
+                remove_noise = remove_noise and plan["denoise"][0]
+                normalize = normalize and plan["normalize"][0]
+                logger.info(
+                    "Preprocessing plan: "
+                    + ", ".join(
+                        f"{'run' if run else 'skip'} {step} ({reason})"
+                        for step, (run, reason) in plan.items()
+                    )
+                )
+            elif sr / 2 <= AudioPreprocessingService.LOWPASS_CUTOFF:
+                apply_lowpass = False
+            
+            # Everything below stays float32: librosa loads float32, the filters
+            # use float32 second-order sections and the STFT is complex64
+            y = np.ascontiguousarray(y, dtype=np.float32)
             
             if apply_highpass:
                 # Apply high-pass filter (300Hz cutoff to keep speech but remove some low rumble)
-                b, a = signal.butter(5, 300/(sr/2), 'highpass')
-                y = signal.filtfilt(b, a, y)
+                sos = signal.butter(
+                    5,
+                    AudioPreprocessingService.HIGHPASS_CUTOFF / (sr / 2),
+                    'highpass',
+                    output='sos',
+                )
+                y = signal.sosfiltfilt(sos.astype(np.float32), y)
+                mark("highpass")
             
             if apply_lowpass:
                 # Apply low-pass filter (8000Hz cutoff, most speech content is below this)
-                b, a = signal.butter(5, 8000/(sr/2), 'lowpass')
-                y = signal.filtfilt(b, a, y)
+                sos = signal.butter(
+                    5,
+                    AudioPreprocessingService.LOWPASS_CUTOFF / (sr / 2),
+                    'lowpass',
+                    output='sos',
+                )
+                y = signal.sosfiltfilt(sos.astype(np.float32), y)
+                mark("lowpass")
             
             if remove_noise:
-                # Simple noise reduction using spectral gating
-                # This is a simplified approach - for more advanced noise reduction, consider using librosa.decompose.nn_filter
-                # or a dedicated library like noisereduce
-                
-                # Estimate noise from a small segment (assuming first 0.5 seconds might be noise/silence)
-                noise_sample = y[:int(sr * 0.5)] if len(y) > sr * 0.5 else y[:int(len(y) * 0.1)]
-                
-                # Compute noise profile
-                noise_stft = librosa.stft(noise_sample)
-                noise_power = np.mean(np.abs(noise_stft)**2, axis=1)
-                
-                # Compute STFT of the signal
-                speech_stft = librosa.stft(y)
-                speech_power = np.abs(speech_stft)**2
-                
-                # Apply simple spectral subtraction with a floor
-                mask = (speech_power - 2 * noise_power.reshape(-1, 1)) / speech_power
-                mask = np.maximum(mask, 0.1)  # Apply floor to avoid extreme attenuation
-                
-                # Apply the mask and reconstruct the signal
-                speech_stft_denoised = speech_stft * mask
-                y = librosa.istft(speech_stft_denoised)
+                # One STFT serves trimming, the noise estimate and the spectral gating
+                y = AudioPreprocessingService._trim_and_denoise(
+                    y, sr, trim_silence, mark
+                )
+            elif trim_silence:
+                # Trim leading and trailing silence
+                y, _ = librosa.effects.trim(
+                    y, top_db=AudioPreprocessingService.TRIM_TOP_DB
+                )
+                mark("trim")
             
             if normalize:
-                # Normalize audio to have consistent volume
-                y = librosa.util.normalize(y)
+                # Normalize audio to have consistent
+                # volume (peak at full scale), in place
+                peak = np.max(np.abs(y)) if len(y) else 0.0
+                if peak > 0:
+                    y *= 1.0 / peak
+                mark("normalize")
             
             # Save the processed audio
             sf.write(output_file_path, y, sr)
+            mark("write")
             
             # Clean up temporary conversion file if created
             if input_file_path.endswith("temp_conversion.wav"):
@@ -104,6 +326,62 @@ class AudioPreprocessingService:
         except Exception as e:
             raise Exception(f"Audio preprocessing failed: {str(e)}")
     
+    @staticmethod
+    def _trim_and_denoise(y, sr, trim_silence, mark):
+        """Trim and spectral-gate ``y`` from a single STFT.
+        
+        Frame energies of the STFT give the trim points (frames within
+        ``TRIM_TOP_DB`` of the loudest, as librosa.effects.trim does). The noise
+        profile is the mean power of the first 0.5 s of the trimmed frames (or
+        of the first 10% for shorter clips). The gain ``max(1 - 2 * noise /
+        power, 0.1)`` is then computed in the power array and applied to the
+        STFT in place, so the only full-size arrays are the STFT and its power.
+        """
+        import numpy as np
+        import librosa
+        
+        n_fft, hop = (
+            AudioPreprocessingService.N_FFT,
+            AudioPreprocessingService.HOP_LENGTH,
+        )
+        stft = librosa.stft(y, n_fft=n_fft, hop_length=hop)
+        power = np.abs(stft)
+        np.square(power, out=power)
+        mark("stft")
+        
+        start, end = 0, len(y)
+        if trim_silence:
+            energy = power.sum(axis=0)
+            loud = np.flatnonzero(
+                energy
+                > energy.max() * 10 ** (-AudioPreprocessingService.TRIM_TOP_DB / 10)
+            )
+            if len(loud):
+                first, last = int(loud[0]), int(loud[-1]) + 1
+                start, end = first * hop, min(len(y), last * hop)
+                # Views: trimming copies nothing
+                stft, power = stft[:, first:last], power[:, first:last]
+            mark("trim")
+        
+        frames = stft.shape[1]
+        noise_frames = (
+            int(sr * 0.5 / hop) if end - start > sr * 0.5 else int(frames * 0.1)
+        )
+        noise_power = power[:, : max(1, min(frames, noise_frames))].mean(
+            axis=1, keepdims=True
+        )
+        
+        # Spectral subtraction with a floor, reusing the power array for the gain
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.divide(2 * noise_power, power, out=power)
+        np.subtract(1, power, out=power)
+        # fmax also replaces the NaN of silent bins (0/0) by the floor
+        np.fmax(power, 0.1, out=power)
+        stft *= power
+        y = librosa.istft(stft, hop_length=hop, n_fft=n_fft, length=end - start)
+        mark("denoise")
+        return y
+    
     @staticmethod
     def convert_to_optimal_format(input_file_path, target_sr=16000):
         """
@@ -114,10 +392,12 @@ class AudioPreprocessingService:
             target_sr: Target sample rate (Whisper works best with 16kHz)
             
         Returns:
-            Path to the converted audio file
+            Path to the converted audio file, ``<input>_16k.wav`` next to the input
         """
-        temp_dir = tempfile.mkdtemp()
-        output_file_path = os.path.join(temp_dir, "whisper_optimized.wav")
+        import librosa
+        import soundfile as sf
+        
+        output_file_path = os.path.splitext(input_file_path)[0] + "_16k.wav"
         
         try:
             # Load audio
@@ -133,4 +413,4 @@ class AudioPreprocessingService:
             return output_file_path
             
         except Exception as e:
-            raise Exception(f"Audio format conversion failed: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Audio format conversion failed: {str(e)}")
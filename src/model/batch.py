@@ -0,0 +1,717 @@
+import os
+import json
+import time
+import queue
+import shutil
+import signal
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+from ..core.config import Config
+from ..core.database import DatabaseService
+from ..core.rate_limit import RateLimiter
+from ..core.scratch import ScratchManager
+
+logger = logging.getLogger(__name__)
+
+
+class BatchCheckpoint:
+    """Progress of a batch run, kept in a small SQLite file next to its output.
+
+    Every file is keyed by its path relative to the scanned directory, with
+    its size and modification time, so a file that changed since it was
+    processed is processed again. Statuses:
+
+    - ``processed``: the pipeline ran and its result is kept in ``record``
+      but not stored yet; on resume only the store is retried
+    - ``saving``: the result is being written to audio_results under
+      ``result_id``; on resume the row is looked up to decide
+    - ``done``: the result is stored (in audio_results, or in Parquet part ``part``)
+    - ``failed``: the last attempt raised; retried until ``attempts`` reaches the limit
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS batch_files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            result_id INTEGER,
+            part TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at TEXT NOT NULL,
+            record TEXT
+        )
+        ''')
+        # Checkpoints written before results were kept
+        columns = {
+            row[1] for row in self.conn.execute("PRAGMA table_info(batch_files)")
+        }
+        if "record" not in columns:
+            self.conn.execute("ALTER TABLE batch_files ADD COLUMN record TEXT")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS batch_parts (
+            name TEXT PRIMARY KEY,
+            rows INTEGER NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        ''')
+        self.conn.commit()
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    def files(self) -> Dict[str, dict]:
+        self.conn.row_factory = sqlite3.Row
+        try:
+            return {
+                row["path"]: dict(row)
+                for row in self.conn.execute("SELECT * FROM batch_files")
+            }
+        finally:
+            self.conn.row_factory = None
+
+    def parts(self) -> set:
+        return {row[0] for row in self.conn.execute("SELECT name FROM batch_parts")}
+
+    def _upsert(self, item: dict, status: str, **fields) -> None:
+        values = {
+            "result_id": None,
+            "part": None,
+            "error": None,
+            "record": None,
+            **fields,
+        }
+        record = json.dumps(values["record"]) if values["record"] is not None else None
+        self.conn.execute(
+            "INSERT INTO batch_files (path, size, mtime_ns, status, result_id, part, "
+            "attempts, error, updated_at, record) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET size = excluded.size, "
+            "mtime_ns = excluded.mtime_ns, status = excluded.status, "
+            "result_id = excluded.result_id, part = excluded.part, "
+            "attempts = excluded.attempts, error = excluded.error, "
+            "updated_at = excluded.updated_at, record = excluded.record",
+            (
+                item["path"],
+                item["size"],
+                item["mtime_ns"],
+                status,
+                values["result_id"],
+                values["part"],
+                item.get("attempts", 0),
+                values["error"],
+                self._now(),
+                record,
+            ),
+        )
+
+    def mark_processed(
+        self, item: dict, record: dict, error: Optional[str] = None
+    ) -> None:
+        """Keep a pipeline result until it is stored, so storing can be retried."""
+        self._upsert(
+            item, "processed", record=record, error=error[:1000] if error else None
+        )
+        self.conn.commit()
+
+    def mark_saving(self, item: dict, result_id: int, record: dict) -> None:
+        self._upsert(item, "saving", result_id=result_id, record=record)
+        self.conn.commit()
+
+    def mark_done(self, items: Sequence[dict], part: Optional[str] = None) -> None:
+        """Mark files done in one transaction, with the Parquet part holding them."""
+        with self.conn:
+            if part:
+                self.conn.execute(
+                    "INSERT INTO batch_parts (name, rows, created_at) VALUES (?, ?, ?)",
+                    (part, len(items), self._now()),
+                )
+            for item in items:
+                self._upsert(item, "done", result_id=item.get("result_id"), part=part)
+
+    def mark_failed(self, item: dict, error: str) -> None:
+        self._upsert(item, "failed", error=error[:1000])
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+# Worker side. These run in the worker processes (or threads) and must stay
+# importable at module level so they can be started with "spawn".
+
+def _process_file(directory: str, item: dict, options: dict) -> dict:
+    """Run one recording through the pipeline in its own workspace."""
+    from .pipeline import DataPipeline
+
+    start = time.perf_counter()
+    source = os.path.join(directory, item["path"])
+    try:
+        # The pipeline writes intermediate files next
+        # to its input; keep them out of the archive
+        with ScratchManager.workspace(
+            os.path.getsize(source) * Config.SCRATCH_SIZE_FACTOR
+        ) as workspace:
+            file_path = workspace.file_path(item["path"])
+            shutil.copyfile(source, file_path)
+            response = DataPipeline.process_batch(
+                file_path,
+                options["language"],
+                options["model"],
+                options["conversational"],
+                options["form_name"],
+                options["refine_mode"],
+            )
+        return {
+            "item": item,
+            "response": response,
+            "seconds": time.perf_counter() - start,
+        }
+    except Exception as e:
+        return {
+            "item": item,
+            "error": f"{type(e).__name__}: {e}",
+            "seconds": time.perf_counter() - start,
+        }
+
+
+def _serve(tasks, results, threads: int, directory: str, options: dict) -> None:
+    """Take files from ``tasks`` with ``threads`` threads until each gets a None."""
+    def loop():
+        while True:
+            item = tasks.get()
+            if item is None:
+                return
+            results.put(_process_file(directory, item, options))
+
+    workers = [threading.Thread(target=loop, daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def _worker_main(
+    tasks, results, threads: int, directory: str, options: dict, limits: dict
+) -> None:
+    # The parent handles Ctrl-C: it stops handing out files and lets these finish theirs
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.WARNING)
+    RateLimiter.configure(limits)
+    _serve(tasks, results, threads, directory, options)
+
+
+class BatchRunner:
+    """Processes a directory of recordings with DataPipeline, resumably.
+
+    Files are handed to ``processes`` worker processes, each running
+    ``threads`` pipelines at once. Processes spread the CPU-bound
+    preprocessing across cores, and threads overlap the ASR and LLM calls.
+    With ``processes=0`` everything runs in this process. The ASR and LLM
+    request rates are capped with the token buckets of ``RateLimiter``; the
+    given per-minute limits are divided between the processes.
+
+    Results are written by this process only, to audio_results or to
+    Parquet part files. Progress goes to a ``BatchCheckpoint``, so a run
+    that stops for any reason resumes with the files that were not stored
+    yet. A result is never stored twice: a database row's id is
+    checkpointed before the row is written, and a Parquet part is only
+    recorded after it is complete (unrecorded parts are deleted on resume).
+    """
+
+    PARQUET_COLUMNS = (
+        "source_path",
+        "filename",
+        "language",
+        "model",
+        "is_conversation",
+        "raw_text",
+        "arabic_text",
+        "translation_text",
+        "json_data",
+        "reasoning",
+        "preprocessing_time",
+        "voice_processing_time",
+        "llm_processing_time",
+        "doctor_name",
+        "insertion_date",
+        "validation_time",
+        "refine_time",
+        "translation_time",
+        "extraction_time",
+        "form_name",
+    )
+    TIME_COLUMNS = (
+        "preprocessing_time",
+        "voice_processing_time",
+        "llm_processing_time",
+        "validation_time",
+        "refine_time",
+        "translation_time",
+        "extraction_time",
+    )
+
+    def __init__(
+        self,
+        directory: str,
+        output: str = "db",
+        parquet_dir: Optional[str] = None,
+        checkpoint_path: Optional[str] = None,
+        processes: int = 1,
+        threads: int = 2,
+        language: str = "en",
+        model: str = "deepseek",
+        conversational: bool = False,
+        form_name: Optional[str] = None,
+        refine_mode: Optional[str] = None,
+        doctor_name: Optional[str] = None,
+        asr_rate: Optional[float] = None,
+        llm_rate: Optional[float] = None,
+        max_attempts: int = 3,
+        part_size: int = 500,
+        extensions: Optional[Sequence[str]] = None,
+    ):
+        if output not in ("db", "parquet"):
+            raise ValueError(f"Unknown output: {output}")
+        if output == "parquet" and not parquet_dir:
+            raise ValueError("Parquet output needs a directory for the part files")
+        self.directory = os.path.abspath(directory)
+        self.output = output
+        self.parquet_dir = parquet_dir
+        self.checkpoint_path = checkpoint_path or os.path.join(
+            parquet_dir if output == "parquet" else self.directory,
+            ".batch_checkpoint.db",
+        )
+        self.processes = max(0, processes)
+        self.threads = max(1, threads)
+        self.options = {
+            "language": language, "model": model, "conversational": conversational,
+            "form_name": form_name, "refine_mode": refine_mode,
+        }
+        self.doctor_name = doctor_name
+        self.limits = {
+            "asr": Config.ASR_RATE_LIMIT if asr_rate is None else asr_rate,
+            "llm": Config.LLM_RATE_LIMIT if llm_rate is None else llm_rate,
+        }
+        self.max_attempts = max_attempts
+        self.part_size = part_size
+        self.extensions = {
+            ext.lower().lstrip(".") for ext in (extensions or Config.ALLOWED_EXTENSIONS)
+        }
+        self._buffer: List[tuple] = []
+
+    def scan(self) -> List[dict]:
+        """Every recording under the directory, in path order."""
+        items = []
+        for root, dirs, names in os.walk(self.directory):
+            dirs.sort()
+            for name in sorted(names):
+                if os.path.splitext(name)[1].lower().lstrip(".") not in self.extensions:
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                items.append({"path": os.path.relpath(path, self.directory),
+                              "size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+        return items
+
+    def _pending(self, checkpoint: BatchCheckpoint, items: List[dict]) -> tuple:
+        """Files still to process, and processed results still to store.
+
+        Settles rows left in "saving" by an interrupted run: stored rows are
+        marked done, the others are stored again from their kept result.
+        """
+        known = checkpoint.files()
+        pending, unsaved = [], []
+        for item in items:
+            state = known.get(item["path"])
+            unchanged = state and (
+                (state["size"], state["mtime_ns"]) == (item["size"], item["mtime_ns"])
+            )
+            if not unchanged:
+                pending.append(item)
+                continue
+            item["attempts"] = state["attempts"]
+            record = json.loads(state["record"]) if state["record"] else None
+            if (
+                state["status"] == "saving"
+                and self.output == "db"
+                and DatabaseService._result_exists(state["result_id"], wait=False)
+            ):
+                checkpoint.mark_done([dict(item, result_id=state["result_id"])])
+            elif state["status"] in ("saving", "processed"):
+                if record is not None:
+                    unsaved.append((item, record))
+                else:
+                    pending.append(item)
+            elif state["status"] == "failed" and state["attempts"] < self.max_attempts:
+                pending.append(item)
+        return pending, unsaved
+
+    def _remove_unrecorded_parts(self, checkpoint: BatchCheckpoint) -> None:
+        recorded = checkpoint.parts()
+        for name in os.listdir(self.parquet_dir):
+            if name.startswith("part-") and name not in recorded:
+                logger.info(
+                    f"Removing unrecorded part {name} left by an interrupted run"
+                )
+                os.remove(os.path.join(self.parquet_dir, name))
+
+    def _record(self, item: dict, response: dict) -> dict:
+        """The audio_results fields of a processed file, as /upload stores them.
+
+        Timings that are not numbers (non-medical results carry "error") are
+        stored as None in both outputs.
+        """
+        stage_timings = response.get("stage_timings", {})
+        json_data = response["json_data"]
+        record = {
+            "filename": item["path"],
+            "language": self.options["language"],
+            "model": self.options["model"],
+            "is_conversation": self.options["conversational"],
+            "raw_text": response["raw_text"],
+            "arabic_text": response["arabic_text"],
+            "translation_text": response["translation_text"],
+            "json_data": (
+                json.dumps(json_data)
+                if isinstance(json_data, (dict, list))
+                else json_data
+            ),
+            "reasoning": response["reasoning"],
+            "preprocessing_time": response["preprocessing_time"],
+            "voice_processing_time": response["voice_processing_time"],
+            "llm_processing_time": response["llm_processing_time"],
+            "doctor_name": self.doctor_name,
+            "validation_time": stage_timings.get("validate"),
+            "refine_time": stage_timings.get("refine"),
+            "translation_time": stage_timings.get("translate"),
+            "extraction_time": stage_timings.get("extract"),
+            "form_name": self.options["form_name"],
+        }
+        for column in self.TIME_COLUMNS:
+            if not isinstance(record[column], (int, float)):
+                record[column] = None
+        return record
+
+    def _store(self, checkpoint: BatchCheckpoint, item: dict, record: dict) -> None:
+        """Store a processed result; a failure keeps it for the next run."""
+        if self.output == "db":
+            result_id = DatabaseService.reserve_result_id()
+            checkpoint.mark_saving(item, result_id, record)
+            saved = DatabaseService.save_audio_result(
+                feedback="", result_id=result_id, **record
+            )
+            if saved is None:
+                checkpoint.mark_processed(
+                    item, record, "could not save to audio_results"
+                )
+                raise RuntimeError(f"Could not save the result of {item['path']}")
+            checkpoint.mark_done([dict(item, result_id=result_id)])
+        else:
+            record = dict(record, source_path=item["path"])
+            record["insertion_date"] = datetime.now(timezone.utc).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+            self._buffer.append((item, record))
+            if len(self._buffer) >= self.part_size:
+                self._write_part(checkpoint)
+
+    def _write_part(self, checkpoint: BatchCheckpoint) -> None:
+        """Write buffered results as the next Parquet part, then checkpoint them."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from ..core.export import ExportService
+
+        if not self._buffer:
+            return
+        types = ExportService._schema_types()
+        schema = pa.schema(
+            [
+                (column, types.get(column, pa.string()))
+                for column in self.PARQUET_COLUMNS
+            ]
+        )
+        rows = [record for _, record in self._buffer]
+        arrays = []
+        for column in self.PARQUET_COLUMNS:
+            values = [row[column] for row in rows]
+            if column == "insertion_date":
+                arrays.append(pa.array(values, pa.string()).cast(pa.timestamp("s")))
+            else:
+                arrays.append(pa.array(values, schema.field(column).type))
+
+        name = f"part-{len(checkpoint.parts()):05d}.parquet"
+        path = os.path.join(self.parquet_dir, name)
+        pq.write_table(
+            pa.Table.from_arrays(arrays, schema=schema),
+            path + ".tmp",
+            compression="zstd",
+        )
+        os.replace(path + ".tmp", path)
+        checkpoint.mark_done([item for item, _ in self._buffer], part=name)
+        logger.info(f"Wrote {len(rows)} results to {name}")
+        self._buffer = []
+
+    def _start_workers(self, tasks, results) -> list:
+        if self.processes == 0:
+            RateLimiter.configure(self.limits)
+            worker = threading.Thread(
+                target=_serve,
+                daemon=True,
+                args=(tasks, results, self.threads, self.directory, self.options),
+            )
+            worker.start()
+            return [worker]
+
+        import multiprocessing
+
+        context = multiprocessing.get_context("spawn")
+        limits = {
+            provider: limit / self.processes for provider, limit in self.limits.items()
+        }
+        workers = [
+            context.Process(
+                target=_worker_main,
+                daemon=True,
+                args=(
+                    tasks,
+                    results,
+                    self.threads,
+                    self.directory,
+                    self.options,
+                    limits,
+                ),
+            )
+            for _ in range(self.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        return workers
+
+    def run(self) -> dict:
+        """Process every file not stored yet and return counts and timings."""
+        start = time.perf_counter()
+        ScratchManager.sweep_stale()
+        if self.output == "db":
+            DatabaseService.initialize_db()
+        else:
+            os.makedirs(self.parquet_dir, exist_ok=True)
+        checkpoint = BatchCheckpoint(self.checkpoint_path)
+        if self.output == "parquet":
+            self._remove_unrecorded_parts(checkpoint)
+
+        items = self.scan()
+        pending, unsaved = self._pending(checkpoint, items)
+        stats = {
+            "files": len(items),
+            "pending": len(pending),
+            "processed": 0,
+            "failed": 0,
+            "resaved": 0,
+            "interrupted": False,
+        }
+        logger.info(f"{len(items)} recordings found, {len(pending)} to process, "
+                    f"{len(unsaved)} processed results to store")
+        # Results whose pipeline run succeeded earlier only need storing again
+        for item, record in unsaved:
+            try:
+                self._store(checkpoint, item, record)
+                stats["resaved"] += 1
+            except Exception as e:
+                logger.error(f"{item['path']} could not be stored: {e}")
+        if not pending:
+            if self.output == "parquet":
+                self._write_part(checkpoint)
+            checkpoint.close()
+            return dict(stats, seconds=round(time.perf_counter() - start, 2))
+
+        if self.processes == 0:
+            tasks, results = queue.Queue(), queue.Queue()
+        else:
+            import multiprocessing
+
+            context = multiprocessing.get_context("spawn")
+            tasks, results = context.Queue(), context.Queue()
+        workers = self._start_workers(tasks, results)
+        slots = max(1, self.processes) * self.threads
+
+        # Keep a small backlog queued so an interrupted run leaves most files untouched
+        backlog = iter(pending)
+        outstanding = 0
+        feeding = True
+        try:
+            while True:
+                while feeding and outstanding < 2 * slots:
+                    item = next(backlog, None)
+                    if item is None:
+                        feeding = False
+                        break
+                    tasks.put(item)
+                    outstanding += 1
+                if outstanding == 0:
+                    break
+                try:
+                    result = results.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError("All batch workers exited")
+                    continue
+                except KeyboardInterrupt:
+                    if not feeding:
+                        raise
+                    logger.warning(
+                        f"Interrupted; finishing {outstanding} files already handed out"
+                    )
+                    stats["interrupted"] = True
+                    feeding = False
+                    continue
+                outstanding -= 1
+                self._handle(checkpoint, result, stats)
+        finally:
+            if self.output == "parquet":
+                self._write_part(checkpoint)
+            # One stop marker per worker thread
+            for _ in range(max(1, self.processes) * self.threads):
+                tasks.put(None)
+            for worker in workers:
+                worker.join(timeout=5)
+                if hasattr(worker, "terminate") and worker.is_alive():
+                    worker.terminate()
+            checkpoint.close()
+
+        elapsed = time.perf_counter() - start
+        stats["seconds"] = round(elapsed, 2)
+        stats["files_per_minute"] = round(stats["processed"] / elapsed * 60, 2)
+        return stats
+
+    def _handle(self, checkpoint: BatchCheckpoint, result: dict, stats: dict) -> None:
+        item = result["item"]
+        done = stats["processed"] + stats["failed"] + 1
+        if "error" in result:
+            stats["failed"] += 1
+            checkpoint.mark_failed(
+                dict(item, attempts=item.get("attempts", 0) + 1), result["error"]
+            )
+            logger.warning(
+                f"[{done}/{stats['pending']}] {item['path']} failed: {result['error']}"
+            )
+            return
+        record = self._record(item, result["response"])
+        # Kept first, so a failed store is retried without running the pipeline again
+        checkpoint.mark_processed(item, record)
+        try:
+            self._store(checkpoint, item, record)
+        except Exception as e:
+            stats["failed"] += 1
+            logger.error(
+                f"[{done}/{stats['pending']}] {item['path']} could not be stored: {e}"
+            )
+            return
+        stats["processed"] += 1
+        logger.info(
+            f"[{done}/{stats['pending']}] {item['path']} "
+            f"processed in {result['seconds']:.1f}s"
+        )
+
+
+def main():
+    """Process a directory of recordings into audio_results or Parquet."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Process a directory of recordings with the pipeline"
+    )
+    parser.add_argument(
+        "directory", help="Directory scanned (recursively) for recordings"
+    )
+    parser.add_argument("--output", choices=("db", "parquet"), default="db",
+                        help="Store results in audio_results or as Parquet part files")
+    parser.add_argument(
+        "--parquet-dir", help="Directory for the Parquet part files (--output parquet)"
+    )
+    parser.add_argument(
+        "--db",
+        default=DatabaseService.DB_PATH,
+        help="SQLite database path (--output db)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="Progress file (default: .batch_checkpoint.db in the directory or "
+        "the Parquet directory)",
+    )
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes; 0 runs everything in this process")
+    parser.add_argument(
+        "--threads", type=int, default=4, help="Files processed at once per process"
+    )
+    parser.add_argument(
+        "--asr-rate", type=float, help="ASR requests per minute, all processes together"
+    )
+    parser.add_argument(
+        "--llm-rate", type=float, help="LLM requests per minute, all processes together"
+    )
+    parser.add_argument("--language", default="en", help="Language of the recordings")
+    parser.add_argument("--model", default="deepseek", help="LLM used for refinement")
+    parser.add_argument(
+        "--conversation", action="store_true", help="Recordings are conversations"
+    )
+    parser.add_argument(
+        "--clinical-sheet", help="Clinical form to extract into (see /get_forms)"
+    )
+    parser.add_argument(
+        "--refine-mode", choices=("llm", "lexicon"), help="Default: REFINE_MODE"
+    )
+    parser.add_argument("--doctor", help="Doctor name stored with every result")
+    parser.add_argument(
+        "--max-attempts", type=int, default=3, help="Attempts per file across runs"
+    )
+    parser.add_argument(
+        "--part-size", type=int, default=500, help="Results per Parquet part file"
+    )
+    parser.add_argument(
+        "--extensions",
+        help="Comma-separated file extensions (default: ALLOWED_EXTENSIONS)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.output == "parquet" and not args.parquet_dir:
+        parser.error("--output parquet needs --parquet-dir")
+    DatabaseService.DB_PATH = args.db
+    # One synchronous transaction per result, so
+    # the checkpoint always knows what is stored
+    Config.WRITE_BEHIND = False
+
+    runner = BatchRunner(
+        args.directory,
+        output=args.output,
+        parquet_dir=args.parquet_dir,
+        checkpoint_path=args.checkpoint,
+        processes=args.processes,
+        threads=args.threads,
+        language=args.language,
+        model=args.model,
+        conversational=args.conversation,
+        form_name=args.clinical_sheet,
+        refine_mode=args.refine_mode,
+        doctor_name=args.doctor,
+        asr_rate=args.asr_rate,
+        llm_rate=args.llm_rate,
+        max_attempts=args.max_attempts,
+        part_size=args.part_size,
+        extensions=args.extensions.split(",") if args.extensions else None,
+    )
+    print(runner.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from pydantic import ConfigDict, Field, ValidationError, create_model
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledForm:
+    """A clinical form's extraction schema, prompt fragment and validator.
+
+    Forms in the forms parquet file describe their fields with an example
+    object (``json_format``). Compiling one infers each field's type from its
+    example value and builds, once per form:
+
+    - ``json_schema``: sent as the structured output schema of the LLM call
+    - ``prompt_fragment``: the field list included in the extraction prompt
+    - a pydantic model used by ``validate`` to coerce the LLM's answer to
+      the form's types
+    """
+
+    DATE_PATTERN = re.compile(r"^\d{1,2}/\d{1,2}/\d{4}$")
+    TYPE_HINTS = {
+        bool: "true/false",
+        int: "integer",
+        float: "number",
+        list: "list of text",
+        dict: "object",
+    }
+
+    def __init__(self, name: str, json_format: str):
+        self.name = name
+        example = json.loads(json_format)
+        if not isinstance(example, dict):
+            raise ValueError(f"Form '{name}' json_format is not a JSON object")
+        self.fields: List[str] = list(example)
+        self.types: Dict[str, type] = {
+            field: self._infer_type(value) for field, value in example.items()
+        }
+        self.model = self._build_model(name, self.types)
+        self.json_schema = self.model.model_json_schema(by_alias=True)
+        self.prompt_fragment = self._describe_fields(example)
+
+    @staticmethod
+    def _infer_type(value) -> type:
+        if isinstance(value, bool):
+            return bool
+        if isinstance(value, (int, float)):
+            return type(value)
+        if isinstance(value, list):
+            return list
+        if isinstance(value, dict):
+            return dict
+        return str
+
+    @staticmethod
+    def _build_model(name: str, types: Dict[str, type]):
+        annotations = {
+            bool: bool,
+            int: int,
+            float: float,
+            str: str,
+            list: List[Any],
+            dict: Dict[str, Any],
+        }
+        definitions = {}
+        for index, (field, field_type) in enumerate(types.items()):
+            # Field names come from the form and need not be Python identifiers
+            definitions[f"field_{index}"] = (
+                Optional[annotations[field_type]],
+                Field(default=None, alias=field),
+            )
+        model_name = re.sub(r"\W", "_", name) or "Form"
+        return create_model(
+            model_name,
+            __config__=ConfigDict(coerce_numbers_to_str=True, extra="ignore"),
+            **definitions
+        )
+
+    @classmethod
+    def _describe_fields(cls, example: dict) -> str:
+        """List the fields grouped by kind, far shorter than the example object."""
+        groups: Dict[str, List[str]] = {}
+        for field, value in example.items():
+            hint = cls.TYPE_HINTS.get(cls._infer_type(value), "text")
+            if isinstance(value, str) and cls.DATE_PATTERN.match(value):
+                hint = "date, M/D/YYYY"
+            groups.setdefault(hint, []).append(f'"{field}"')
+        return "\n".join(
+            f"- {hint}: {', '.join(fields)}" for hint, fields in groups.items()
+        )
+
+    def validate(self, data) -> Dict[str, Any]:
+        """Coerce an extracted object to the form's fields and types.
+
+        Fields the LLM left out are None, unknown keys are dropped, and a value
+        that cannot be coerced to its field's type is set to None instead of
+        failing the whole extraction.
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"Expected a JSON object for form '{self.name}'")
+        data = {field: data.get(field) for field in self.fields}
+        try:
+            validated = self.model.model_validate(data)
+        except ValidationError as e:
+            invalid = {error["loc"][0] for error in e.errors() if error["loc"]}
+            logger.warning(
+                f"Form '{self.name}': discarding invalid values for {sorted(invalid)}"
+            )
+            data = {
+                field: (None if field in invalid else value)
+                for field, value in data.items()
+            }
+            validated = self.model.model_validate(data)
+        return validated.model_dump(by_alias=True)
@@ -0,0 +1,126 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from ..core.config import Config
+from .form_schema import CompiledForm
+
+logger = logging.getLogger(__name__)
+
+
+class FormsCatalogService:
+    """In-memory catalog of the clinical forms stored in the forms parquet file.
+
+    Form names are loaded lazily with column projection (only the ``name``
+    column is read). Form schemas are loaded on the first schema lookup and
+    indexed by name. Compiled forms (extraction schema, prompt fragment and
+    validator) are built on first use per form. All of them are invalidated
+    whenever the parquet file's mtime changes.
+    """
+
+    _lock = threading.Lock()
+    _mtime: Optional[float] = None
+    _names: Optional[List[str]] = None
+    _etag: Optional[str] = None
+    _schemas: Optional[Dict[str, str]] = None
+    _compiled: Dict[str, CompiledForm] = {}
+
+    @classmethod
+    def _current_mtime(cls) -> Optional[float]:
+        """Return the forms file mtime, or None if the file is missing."""
+        try:
+            return os.path.getmtime(Config.FORMS_PATH)
+        except OSError:
+            return None
+
+    @classmethod
+    def _ensure_fresh(cls) -> None:
+        """Drop cached data if the forms file changed since it was loaded."""
+        mtime = cls._current_mtime()
+        if mtime != cls._mtime:
+            logger.info(f"Forms file changed (mtime={mtime}), invalidating catalog")
+            cls._mtime = mtime
+            cls._names = None
+            cls._etag = None
+            cls._schemas = None
+            cls._compiled = {}
+
+    @classmethod
+    def _read_columns(cls, columns: List[str]):
+        """Read only the given columns from the forms parquet file."""
+        # pandas is imported on first load, not when the API server starts
+        import pandas as pd
+        
+        try:
+            logger.info(f"Loading columns {columns} from {Config.FORMS_PATH}")
+            return pd.read_parquet(Config.FORMS_PATH, columns=columns, engine="pyarrow")
+        except Exception as e:
+            logger.error(f"Error loading forms dataframe: {str(e)}")
+            return pd.DataFrame(columns=columns)
+
+    @classmethod
+    def get_form_listing(cls) -> Tuple[List[str], str]:
+        """Return the unique form names and their ETag, loading them on first use."""
+        with cls._lock:
+            cls._ensure_fresh()
+            if cls._names is None:
+                df = cls._read_columns(["name"])
+                cls._names = df["name"].dropna().unique().tolist()
+                digest = hashlib.sha1(
+                    json.dumps(cls._names).encode("utf-8")
+                ).hexdigest()
+                cls._etag = f'"{digest}"'
+                logger.info(f"Loaded {len(cls._names)} form names")
+            return cls._names, cls._etag
+
+    @classmethod
+    def get_form_names(cls) -> List[str]:
+        """Return the unique form names."""
+        return cls.get_form_listing()[0]
+
+    @classmethod
+    def _schema_locked(cls, name: str) -> Optional[str]:
+        """Return the raw schema of a form; the caller holds ``_lock``."""
+        cls._ensure_fresh()
+        if cls._schemas is None:
+            df = cls._read_columns(["name", "json_format"]).dropna(subset=["name"])
+            # First occurrence wins, matching the order /get_forms reports
+            df = df.drop_duplicates(subset="name", keep="first")
+            cls._schemas = dict(zip(df["name"], df["json_format"]))
+            logger.info(f"Indexed schemas for {len(cls._schemas)} forms")
+        return cls._schemas.get(name)
+
+    @classmethod
+    def get_form_schema(cls, name: str) -> Optional[str]:
+        """Return the raw ``json_format`` schema of a form, or None if unknown."""
+        with cls._lock:
+            return cls._schema_locked(name)
+
+    @classmethod
+    def get_compiled_form(cls, name: str) -> Optional[CompiledForm]:
+        """Return the compiled extraction schema of a form, or None if unknown."""
+        # Schema and compiled form come from the same catalog generation, so a
+        # reload in between cannot cache a form compiled from the old file
+        with cls._lock:
+            json_format = cls._schema_locked(name)
+            if json_format is None:
+                return None
+            compiled = cls._compiled.get(name)
+            if compiled is None:
+                compiled = cls._compiled[name] = CompiledForm(name, json_format)
+                logger.info(
+                    f"Compiled form '{name}' with {len(compiled.fields)} fields"
+                )
+            return compiled
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Force the next lookup to reload from disk."""
+        with cls._lock:
+            cls._mtime = None
+            cls._names = None
+            cls._etag = None
+            cls._schemas = None
+            cls._compiled = {}
@@ -0,0 +1,278 @@
+import os
+import re
+import bisect
+import difflib
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+from ..core.config import Config
+from ..core.clinical_index import ClinicalIndexService
+
+logger = logging.getLogger(__name__)
+
+
+class ICD10Index:
+    """In-memory ICD-10-CM index over sorted, dotless code keys.
+
+    Codes live in one sorted list, so exact lookups and prefix completion are
+    binary searches (microseconds even for the ~74k codes of the full CMS
+    release). Descriptions are tokenized into an inverted index for fuzzy
+    search: each query word matches index words exactly, by prefix, or by
+    close spelling, and codes are ranked by how many (rare) words matched.
+
+    ``full_code_set`` says whether the index holds the whole code set. A code
+    missing from a partial index (the bundled subset) is reported as
+    unknown, never as invalid.
+    """
+
+    WORD_PATTERN = re.compile(r"[a-z0-9]+")
+    STOP_WORDS = {
+        "of",
+        "and",
+        "the",
+        "to",
+        "in",
+        "for",
+        "or",
+        "by",
+        "as",
+        "at",
+        "on",
+        "due",
+        "other",
+    }
+
+    def __init__(self, entries: Dict[str, str], full_code_set: bool = True):
+        self.full_code_set = full_code_set
+        self.keys: List[str] = sorted(entries)
+        self.descriptions: List[str] = [entries[key] for key in self.keys]
+
+        postings = defaultdict(set)
+        for position, description in enumerate(self.descriptions):
+            for word in self._words(description):
+                postings[word].add(position)
+        self.postings = {
+            word: frozenset(positions) for word, positions in postings.items()
+        }
+        self.vocabulary = sorted(self.postings)
+
+    @classmethod
+    def from_file(cls, path: str, full_code_set: bool = True) -> "ICD10Index":
+        """Load a CMS ICD-10-CM code file.
+
+        Both CMS release formats are accepted: the code file
+        (``icd10cm_codes_YYYY.txt``: code, whitespace, description) and the
+        order file (``icd10cm_order_YYYY.txt``: order number, code, billable
+        flag, short and long description, in fixed columns), from which only
+        billable codes are kept.
+        """
+        entries = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line.strip():
+                    continue
+                if line[:5].isdigit() and len(line) > 77:
+                    # Order file: header rows (flag 0) are categories, not valid codes
+                    if line[14] != "1":
+                        continue
+                    key, description = line[6:13].strip(), line[77:].strip()
+                else:
+                    key, _, description = line.partition(" ")
+                    description = description.strip()
+                entries[key.replace(".", "").upper()] = description
+        logger.info(f"Loaded {len(entries)} ICD-10 codes from {path}")
+        return cls(entries, full_code_set=full_code_set)
+
+    @staticmethod
+    def format_code(key: str) -> str:
+        """``J45909`` -> ``J45.909``."""
+        return f"{key[:3]}.{key[3:]}" if len(key) > 3 else key
+
+    @classmethod
+    def _words(cls, text: str) -> List[str]:
+        return [
+            word
+            for word in cls.WORD_PATTERN.findall(text.lower())
+            if word not in cls.STOP_WORDS
+        ]
+
+    def _entry(self, position: int) -> dict:
+        key = self.keys[position]
+        return {
+            "code": self.format_code(key),
+            "description": self.descriptions[position],
+        }
+
+    def lookup(self, code: str) -> Optional[dict]:
+        """Return the canonical code and description, or None for an invalid code."""
+        normalized = ClinicalIndexService.normalize_code(code)
+        if not normalized:
+            return None
+        position = bisect.bisect_left(self.keys, normalized[1])
+        if position < len(self.keys) and self.keys[position] == normalized[1]:
+            return self._entry(position)
+        return None
+
+    def complete(self, prefix: str, limit: int = 10) -> List[dict]:
+        """Return valid codes starting with ``prefix`` (``J45``, ``j45.9``) in order."""
+        key = re.sub(r"[^0-9A-Z]", "", str(prefix).upper())
+        if not key:
+            return []
+        start = bisect.bisect_left(self.keys, key)
+        end = bisect.bisect_left(self.keys, key + "~", lo=start)
+        return [
+            self._entry(position) for position in range(start, min(end, start + limit))
+        ]
+
+    def _matching_words(self, word: str) -> Dict[str, float]:
+        """Index words matching a query word, with a match weight."""
+        matches = {}
+        if word in self.postings:
+            matches[word] = 1.0
+        start = bisect.bisect_left(self.vocabulary, word)
+        for candidate in self.vocabulary[start:start + 50]:
+            if not candidate.startswith(word):
+                break
+            matches.setdefault(candidate, 0.8)
+        if not matches and len(word) > 3:
+            for candidate in difflib.get_close_matches(
+                word, self.vocabulary, n=3, cutoff=0.8
+            ):
+                matches[candidate] = 0.6
+        return matches
+
+    def search(self, text: str, limit: int = 10) -> List[dict]:
+        """Return the codes whose descriptions best match free text, best first."""
+        scores = defaultdict(float)
+        total = len(self.keys)
+        for word in self._words(text):
+            best = {}
+            for candidate, weight in self._matching_words(word).items():
+                positions = self.postings[candidate]
+                # Rare words say more about the code than common ones
+                score = weight * (1.0 + (total / len(positions)) ** 0.5 / 10)
+                for position in positions:
+                    best[position] = max(best.get(position, 0.0), score)
+            for position, score in best.items():
+                scores[position] += score
+
+        # Ties go to shorter, more general descriptions
+        ranked = sorted(
+            scores, key=lambda p: (-scores[p], len(self.descriptions[p]), self.keys[p])
+        )
+        return [
+            dict(self._entry(position), score=round(scores[position], 3))
+            for position in ranked[:limit]
+        ]
+
+    def validate(self, entry: str, limit: int = 3) -> dict:
+        """Check one extracted code string such as ``"J45.909 - Asthma"``.
+
+        ``status`` is one of:
+
+        - ``"valid"``: the canonical code and description are returned.
+        - ``"unknown"``: the code is well formed but missing from a partial
+          index, so it may well be valid. ``valid`` is None and no
+          suggestions are made.
+        - ``"invalid"``: ``valid`` is False and ``suggestions`` lists the
+          closest valid codes, completions of the code's category first,
+          then matches for the description the LLM gave.
+        """
+        entry = str(entry).strip()
+        match = ClinicalIndexService.CODE_PATTERN.search(entry.upper())
+        found = self.lookup(match.group(0)) if match else None
+        if found:
+            return {"input": entry, "valid": True, "status": "valid", **found}
+        if match and not self.full_code_set:
+            return {"input": entry, "valid": None, "status": "unknown", "code": None,
+                    "description": None, "suggestions": []}
+
+        suggestions = []
+        if match:
+            suggestions = self.complete(match.group(1), limit=limit)
+        description = entry[match.end():] if match else entry
+        description = description.strip(" -:–—()")
+        if description:
+            seen = {suggestion["code"] for suggestion in suggestions}
+            for candidate in self.search(description, limit=limit):
+                if candidate["code"] not in seen:
+                    candidate.pop("score")
+                    suggestions.append(candidate)
+        return {"input": entry, "valid": False, "status": "invalid", "code": None,
+                "description": None, "suggestions": suggestions[:limit * 2]}
+
+
+class ICD10Service:
+    """Process-wide ICD-10 index, loaded on first use from ``ICD10_CODES_PATH``.
+
+    A curated set of common codes ships with the project in
+    ``src/model/data``; point ``ICD10_CODES_PATH`` at the CMS ICD-10-CM
+    release file to validate against the full code set. Only the full set can
+    tell an invalid code from one the subset does not list.
+    """
+
+    BUNDLED_PATH = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "data", "icd10cm_codes.txt"
+    )
+
+    _lock = threading.Lock()
+    _index: Optional[ICD10Index] = None
+
+    @classmethod
+    def get_index(cls) -> ICD10Index:
+        with cls._lock:
+            if cls._index is None:
+                if Config.ICD10_CODES_PATH:
+                    cls._index = ICD10Index.from_file(Config.ICD10_CODES_PATH)
+                else:
+                    cls._index = ICD10Index.from_file(
+                        cls.BUNDLED_PATH, full_code_set=False
+                    )
+            return cls._index
+
+    @classmethod
+    def annotate(cls, json_data):
+        """Validate and normalize the ``icd10_codes`` of an extraction result in place.
+
+        Valid codes are rewritten as ``"CODE - Canonical description"``;
+        invalid and unknown ones are kept as extracted. ``icd10_validation``
+        records the outcome for every code, with suggestions for the invalid
+        ones.
+        """
+        if not isinstance(json_data, dict):
+            return json_data
+        entries = json_data.get("icd10_codes")
+        if isinstance(entries, str):
+            entries = [entry for entry in re.split(r"[;\n]", entries) if entry.strip()]
+        if not isinstance(entries, list):
+            return json_data
+
+        index = cls.get_index()
+        validation = []
+        for entry in entries:
+            if isinstance(entry, dict):
+                entry = f"{entry.get('code') or ''} - {entry.get('description') or ''}"
+            if entry not in (None, "", "null"):
+                validation.append(index.validate(entry))
+        json_data["icd10_codes"] = [
+            (
+                f"{result['code']} - {result['description']}"
+                if result["valid"]
+                else result["input"]
+            )
+            for result in validation
+        ]
+        json_data["icd10_validation"] = validation
+        invalid = [
+            result["input"] for result in validation if result["status"] == "invalid"
+        ]
+        if invalid:
+            logger.warning(f"Extracted ICD-10 codes not found in the index: {invalid}")
+        unknown = [
+            result["input"] for result in validation if result["status"] == "unknown"
+        ]
+        if unknown:
+            logger.info(f"Extracted ICD-10 codes not in the bundled subset: {unknown}")
+        return json_data
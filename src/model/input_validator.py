@@ -1,6 +1,7 @@
 from .llm_service import LLMService
 import logging
 from ..core.config import Config
+from ..core.admission import AdmissionRejected
 import re
 
 # Configure logger
@@ -68,5 +69,7 @@ Response format: MEDICAL|95 or NON_MEDICAL|87
                 "raw_response": result
             }
             
+        except AdmissionRejected:
+            raise
         except Exception as e:
             logger.error(f"LLM validation failed: {str(e)}")
@@ -0,0 +1,344 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from ..core.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class MedicalLexicon:
+    """Fast fuzzy correction of misheard medical terms in a transcript.
+
+    Lookups use SymSpell's symmetric-delete index: every vocabulary term is
+    indexed under all strings obtained by deleting up to ``MAX_DISTANCE``
+    characters from its prefix, so the candidates for a word are found by
+    generating the word's own deletes and a few dictionary hits, instead of
+    comparing against the whole vocabulary. Candidates are then checked with
+    the restricted Damerau-Levenshtein distance.
+
+    Speech recognition errors are mostly about sound rather than spelling
+    ("met for min", "amlodypine"), so terms are also indexed by a phonetic
+    key, which catches misspellings a little further apart by edit distance.
+
+    Only words that are neither in the vocabulary nor in the English
+    dictionary are changed. A candidate that is the word with a prefix or an
+    inflection added or removed ("hydration" and "dehydration", "headaches"
+    and "headache") is never used, since that changes the meaning, and a word
+    is left alone unless its best candidate is closer than every other one.
+    """
+
+    MAX_DISTANCE = 2
+    PREFIX_LENGTH = 7
+    MIN_WORD_LENGTH = 5
+    # Edits by which the best candidate must beat the next one
+    CONFIDENCE_MARGIN = 1
+    # Words at least this long may be one edit further from a same-sounding term
+    PHONETIC_MIN_LENGTH = 10
+    TOKEN_PATTERN = re.compile(r"[A-Za-z]+")
+    # Prefixes that negate or reverse a term, and inflectional endings
+    PREFIXES = (
+        "a", "an", "anti", "de", "dis", "dys", "hyper", "hypo", "in", "non", "un",
+    )
+    SUFFIXES = ("s", "es", "d", "ed", "ing")
+
+    def __init__(
+        self,
+        terms: Dict[str, int],
+        common_words: Iterable[str] = (),
+        english_words: Iterable[str] = (),
+    ):
+        self.terms = terms
+        self.known = (
+            set(terms)
+            | {word.lower() for word in common_words}
+            | {word.lower() for word in english_words}
+        )
+
+        deletes = defaultdict(list)
+        phonetic = defaultdict(list)
+        for term in terms:
+            for key in self._deletes(term[:self.PREFIX_LENGTH], self.MAX_DISTANCE):
+                deletes[key].append(term)
+            phonetic[self.phonetic_key(term)].append(term)
+        self.deletes = dict(deletes)
+        self.phonetic = dict(phonetic)
+
+    @classmethod
+    def from_files(
+        cls,
+        lexicon_path: str,
+        common_words_path: Optional[str] = None,
+        english_words: Iterable[str] = (),
+    ) -> "MedicalLexicon":
+        """Load a ``term count`` vocabulary file (SymSpell frequency dictionary format).
+
+        The count only orders candidates that are equally close; a term
+        without one gets a count of 1.
+        """
+        terms = {}
+        with open(lexicon_path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if not parts or parts[0].startswith("#"):
+                    continue
+                term = parts[0].lower()
+                count = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+                terms[term] = max(count, terms.get(term, 0))
+        common_words = []
+        if common_words_path and os.path.exists(common_words_path):
+            with open(common_words_path, encoding="utf-8") as f:
+                common_words = [line.strip() for line in f if line.strip()]
+        logger.info(
+            f"Loaded {len(terms)} lexicon terms and {len(common_words)} common words"
+        )
+        return cls(terms, common_words, english_words)
+
+    @staticmethod
+    def _deletes(word: str, distance: int) -> set:
+        results = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {
+                candidate[:i] + candidate[i + 1:]
+                for candidate in frontier
+                for i in range(len(candidate))
+            }
+            results |= frontier
+        return results
+
+    @staticmethod
+    def distance(a: str, b: str, max_distance: int) -> int:
+        """Restricted Damerau-Levenshtein distance, capped at ``max_distance + 1``."""
+        if abs(len(a) - len(b)) > max_distance:
+            return max_distance + 1
+        previous_previous = None
+        previous = list(range(len(b) + 1))
+        for i in range(1, len(a) + 1):
+            current = [i] + [0] * len(b)
+            row_min = current[0]
+            for j in range(1, len(b) + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+                if (previous_previous is not None and j > 1
+                        and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                    value = min(value, previous_previous[j - 2] + 1)
+                current[j] = value
+                row_min = min(row_min, value)
+            if row_min > max_distance:
+                return max_distance + 1
+            previous_previous, previous = previous, current
+        return previous[-1]
+
+    # Simplified Metaphone: spellings that sound alike map to the same key
+    PHONETIC_RULES = [
+        (re.compile(r"ph"), "f"),
+        (re.compile(r"gh"), "g"),
+        (re.compile(r"ck"), "k"),
+        (re.compile(r"sch"), "sk"),
+        (re.compile(r"ch"), "k"),
+        (re.compile(r"qu"), "kw"),
+        (re.compile(r"c(?=[eiy])"), "s"),
+        (re.compile(r"c"), "k"),
+        (re.compile(r"q"), "k"),
+        (re.compile(r"x"), "ks"),
+        (re.compile(r"z"), "s"),
+        (re.compile(r"dg"), "j"),
+        (re.compile(r"th"), "t"),
+        (re.compile(r"(?<=.)h"), ""),
+        (re.compile(r"y"), "i"),
+    ]
+
+    @classmethod
+    def phonetic_key(cls, word: str) -> str:
+        key = word.lower()
+        for pattern, replacement in cls.PHONETIC_RULES:
+            key = pattern.sub(replacement, key)
+        # Keep the first letter, drop the other vowels and collapse repeats
+        key = key[:1] + re.sub(r"[aeiouw]", "", key[1:])
+        return re.sub(r"(.)\1+", r"\1", key)
+
+    def _max_distance(self, word: str) -> int:
+        return 1 if len(word) < 8 else self.MAX_DISTANCE
+
+    @classmethod
+    def _inflection_of(cls, a: str, b: str) -> bool:
+        """Whether one word is the other with an inflectional ending."""
+        shorter, longer = sorted((a, b), key=len)
+        return any(longer == shorter + suffix for suffix in cls.SUFFIXES) or (
+            shorter.endswith("y") and longer == shorter[:-1] + "ies"
+        )
+
+    @classmethod
+    def _variant_of(cls, a: str, b: str) -> bool:
+        """Whether one word is the other with a prefix or an inflection added."""
+        shorter, longer = sorted((a, b), key=len)
+        return cls._inflection_of(a, b) or any(
+            longer == prefix + shorter for prefix in cls.PREFIXES
+        )
+
+    def lookup(self, word: str) -> Optional[Tuple[str, int]]:
+        """Return the best vocabulary term for ``word`` and its distance, or None.
+
+        Candidates come from the delete index (within one edit for short
+        words, two for longer ones) and from terms with the same phonetic
+        key (one more edit for words of ``PHONETIC_MIN_LENGTH`` or more).
+        Prefix and inflection variants of the word are not candidates. The
+        closest one wins, ranked by distance, then a matching phonetic key,
+        then the more frequent term. None is returned when another candidate,
+        other than an inflection of the best one, is within
+        ``CONFIDENCE_MARGIN`` edits of it.
+        """
+        word = word.lower()
+        if word in self.terms:
+            return word, 0
+
+        max_distance = self._max_distance(word)
+        phonetic_distance = max_distance + (len(word) >= self.PHONETIC_MIN_LENGTH)
+        candidates = set()
+        for key in self._deletes(word[:self.PREFIX_LENGTH], max_distance):
+            candidates.update(self.deletes.get(key, ()))
+        key = self.phonetic_key(word)
+        sounds_alike = set(self.phonetic.get(key, ()))
+
+        ranked = []
+        for term in candidates | sounds_alike:
+            if self._variant_of(word, term):
+                continue
+            limit = phonetic_distance if term in sounds_alike else max_distance
+            distance = self.distance(word, term, limit)
+            if distance > limit:
+                continue
+            rank = (distance, term not in sounds_alike, -self.terms[term])
+            ranked.append((rank, term))
+        if not ranked:
+            return None
+        ranked.sort()
+        best_rank, best = ranked[0]
+        for rank, term in ranked[1:]:
+            if rank[0] - best_rank[0] >= self.CONFIDENCE_MARGIN:
+                break
+            if not self._inflection_of(best, term):
+                return None
+        return best, best_rank[0]
+
+    @staticmethod
+    def _match_case(original: str, term: str) -> str:
+        if original.isupper() and len(original) > 1:
+            return term.upper()
+        if original[:1].isupper():
+            return term[:1].upper() + term[1:]
+        return term
+
+    def correct(self, text: str) -> Tuple[str, List[dict]]:
+        """Correct misheard vocabulary terms in ``text``.
+
+        Two adjacent words are also tried joined together, since speech
+        recognition often splits an unfamiliar drug name ("met formin").
+
+        Returns:
+            tuple: (corrected text, list of {"from", "to", "distance"} corrections)
+        """
+        tokens = list(self.TOKEN_PATTERN.finditer(text))
+        pieces, corrections = [], []
+        position, index = 0, 0
+        while index < len(tokens):
+            match = tokens[index]
+            word = match.group(0)
+            replacement, end = None, match.end()
+
+            following = tokens[index + 1] if index + 1 < len(tokens) else None
+            if following is not None and text[match.end():following.start()] == " ":
+                joined = word + following.group(0)
+                if (
+                    len(word) >= 3
+                    and len(following.group(0)) >= 3
+                    and not (
+                        word.lower() in self.known
+                        and following.group(0).lower() in self.known
+                    )
+                ):
+                    found = self.lookup(joined)
+                    if found and found[1] <= 1:
+                        replacement, end = found[0], following.end()
+                        index += 1
+
+            if (
+                replacement is None
+                and len(word) >= self.MIN_WORD_LENGTH
+                and word.lower() not in self.known
+            ):
+                found = self.lookup(word)
+                if found:
+                    replacement = found[0]
+
+            if replacement is not None:
+                original = text[match.start():end]
+                replacement = self._match_case(word, replacement)
+                pieces.append(text[position:match.start()])
+                pieces.append(replacement)
+                position = end
+                if replacement.lower() != original.lower():
+                    corrections.append(
+                        {
+                            "from": original,
+                            "to": replacement,
+                            "distance": self.distance(
+                                original.lower().replace(" ", ""),
+                                replacement.lower(),
+                                10,
+                            ),
+                        }
+                    )
+            index += 1
+        pieces.append(text[position:])
+        return "".join(pieces), corrections
+
+
+class LexiconService:
+    """Process-wide medical lexicon, loaded on first use.
+
+    The bundled vocabulary in ``src/model/data`` covers common drugs,
+    conditions, anatomy and investigations; ``LEXICON_PATH`` replaces it with
+    a site-specific file in the same ``term count`` format.
+    """
+
+    DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    BUNDLED_PATH = os.path.join(DATA_DIR, "medical_lexicon.txt")
+    COMMON_WORDS_PATH = os.path.join(DATA_DIR, "common_words.txt")
+
+    _lock = threading.Lock()
+    _lexicon: Optional[MedicalLexicon] = None
+
+    @staticmethod
+    def english_words() -> List[str]:
+        """The English dictionary: ``ENGLISH_WORDS_PATH``, else pyspellchecker's."""
+        if Config.ENGLISH_WORDS_PATH:
+            with open(Config.ENGLISH_WORDS_PATH, encoding="utf-8") as f:
+                return [line.strip() for line in f if line.strip()]
+        from spellchecker import SpellChecker
+
+        return list(SpellChecker(language="en", distance=1).word_frequency.keys())
+
+    @classmethod
+    def get_lexicon(cls) -> MedicalLexicon:
+        with cls._lock:
+            if cls._lexicon is None:
+                cls._lexicon = MedicalLexicon.from_files(
+                    Config.LEXICON_PATH or cls.BUNDLED_PATH,
+                    cls.COMMON_WORDS_PATH,
+                    cls.english_words(),
+                )
+            return cls._lexicon
+
+    @classmethod
+    def refine_transcription(cls, raw_text: str) -> str:
+        """Local replacement for the LLM refine step of English notes."""
+        start = time.perf_counter()
+        corrected, corrections = cls.get_lexicon().correct(raw_text)
+        logger.info(f"Lexicon made {len(corrections)} corrections in "
+                    f"{(time.perf_counter() - start) * 1000:.1f}ms: {corrections}")
+        return corrected
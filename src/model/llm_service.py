@@ -1,33 +1,28 @@
-import fireworks.client
 import logging
 from .utils.prompt import (get_refine_arabic_prompt_llama,
-                            get_refine_english_prompt_deepseek_conv,
-                            get_refine_english_prompt_deepseek,
-                            get_refine_arabic_prompt_deepseek_conv,
-                            get_refine_arabic_prompt_deepseek,
-                            get_translation_prompt_deepseek_conv,
-                            get_translation_prompt_deepseek,
-                            get_extraction_prompt_llama,
-                            get_refine_english_prompt_llama_conv,
-                            get_refine_english_prompt_llama,
-                            get_refine_arabic_prompt_llama_conv,
-                            get_translation_prompt_llama_conv,
-                            get_translation_prompt_llama)
+                           get_refine_english_prompt_deepseek_conv,
+                           get_refine_english_prompt_deepseek,
+                           get_refine_arabic_prompt_deepseek_conv,
+                           get_refine_arabic_prompt_deepseek,
+                           get_translation_prompt_deepseek_conv,
+                           get_translation_prompt_deepseek,
+                           get_extraction_prompt_llama,
+                           get_form_extraction_prompt,
+                           get_speaker_roles_prompt,
+                           get_refine_english_prompt_llama_conv,
+                           get_refine_english_prompt_llama,
+                           get_refine_arabic_prompt_llama_conv,
+                           get_translation_prompt_llama_conv,
+                           get_translation_prompt_llama)
 
+from ..core.admission import AdmissionController
+from ..core.rate_limit import RateLimiter
 from pydantic import ValidationError
 import json
-from pydantic import BaseModel, Field
-from typing import List, Optional
 # Configure logger
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class ExtractedFeatures(BaseModel):
-    entities: List[str] = Field(description="List of extracted entities")
-    sentiment: str = Field(description="Sentiment of the text (positive, negative, neutral)")
-    keywords: List[str] = Field(description="Key keywords extracted from the text")
-    summary: Optional[str] = Field(default=None, description="Optional summary of the text")
-    
 class LLMService:
     """Service for LLM processing."""
     
@@ -35,21 +30,17 @@ class LLMService:
         """Process English voice transcription with LLM."""
         return LLMService.process_text(raw_text, api_key, model, "refine_english", conversational_mode)
     
-
     def refine_ar_transcription(raw_text, api_key, model, conversational_mode=False):
         """Process Arabic voice transcription with LLM."""
         return LLMService.process_text(raw_text, api_key, model, "refine_arabic", conversational_mode)
-    
 
     def translate_to_eng(refined_text, api_key, model, conversational_mode=False):
         """Translate refined text to English with LLM."""
         return LLMService.process_text(refined_text, api_key, model, "translate", conversational_mode)
     
-
     def extract_features(translated_text, api_key, model, conversational_mode=False):
         """Extract features from translated text with LLM."""
         return LLMService.process_text(translated_text, api_key, model, "extract", conversational_mode)
-    
 
     def _get_model_account(model):
         """Get the appropriate model account based on model name."""
@@ -57,7 +48,6 @@ class LLMService:
             return "accounts/fireworks/models/deepseek-v3"
         else:
             return "accounts/fireworks/models/llama4-maverick-instruct-basic"
-    
 
     def _get_prompt(prompt_type, model, text, conversational_mode=False):
         """Get the appropriate prompt based on type, model and mode."""
@@ -85,8 +75,36 @@ class LLMService:
         else:
             raise ValueError(f"Unknown prompt type: {prompt_type}")
     
-    def _call_llm_api(api_key, model_account, prompt, pydantic_model=None, temperature=0.3):
-        """Make API call to the LLM service."""
+    def _call_llm_api(
+        api_key,
+        model_account,
+        prompt,
+        pydantic_model=None,
+        temperature=0.3,
+        json_schema=None,
+    ):
+        """Make API call to the LLM service, holding an "llm" admission slot."""
+        with AdmissionController.stage("llm"):
+            RateLimiter.acquire("llm")
+            return LLMService._call_llm_api_unlimited(
+                api_key, model_account, prompt, pydantic_model, temperature, json_schema
+            )
+
+    def _call_llm_api_unlimited(
+        api_key,
+        model_account,
+        prompt,
+        pydantic_model=None,
+        temperature=0.3,
+        json_schema=None,
+    ):
+        """Make API call to the LLM service.
+        
+        With ``json_schema`` (and no pydantic model) the output is constrained
+        to that schema and returned as raw JSON text for the caller to validate.
+        """
+        # Imported here: the fireworks client is slow to import and only needed per call
+        import fireworks.client
         fireworks.client.api_key = api_key
         
         try:
@@ -119,12 +137,18 @@ class LLMService:
                     logger.warning("LLM returned empty response")
                     return None
             else:
-                # Fallback to non-structured output
+                # Plain text output, constrained to json_schema when one is given
+                extra = (
+                    {"response_format": {"type": "json_object", "schema": json_schema}}
+                    if json_schema
+                    else {}
+                )
                 response = fireworks.client.Completion.create(
                     model=model_account,
                     prompt=prompt,
                     max_tokens=100000,
                     temperature=temperature,
+                    **extra
                 )
                 if response.choices and response.choices[0].text.strip():
                     return response.choices[0].text.strip()
@@ -135,7 +159,6 @@ class LLMService:
             logger.error(f"LLM API call failed: {str(e)}")
             raise Exception(f"LLM processing failed: {str(e)}")
     
-    
     def process_text(text, api_key, model, prompt_type, conversational_mode=False, pydantic_model=None):
         """Generic method to process text with LLM."""
         model_account = LLMService._get_model_account(model)
@@ -146,15 +169,75 @@ class LLMService:
         prompt = LLMService._get_prompt(prompt_type, model, text, conversational_mode)
         result = LLMService._call_llm_api(api_key, model_account, prompt, pydantic_model=pydantic_model)
         return result if result else text
+
+    def extract_form(translated_text, api_key, model, form):
+        """Extract directly into a clinical form's fields.
         
-    def refine_ar_transcription(raw_text, api_key, model, conversational_mode=False):
-        """Process Arabic voice transcription with LLM."""
-        return LLMService.process_text(raw_text, api_key, model, "refine_arabic", conversational_mode)
-    
-    def translate_to_eng(refined_text, api_key, model, conversational_mode=False):
-        """Translate refined text to English with LLM."""
-        return LLMService.process_text(refined_text, api_key, model, "translate", conversational_mode)
-    
-    def extract_features(translated_text, api_key, model, conversational_mode=False):
-        """Extract features from translated text with LLM."""
-        return LLMService.process_text(translated_text, api_key, model, "extract", conversational_mode, pydantic_model=ExtractedFeatures)
\ No newline at end of file
+        Args:
+            form: CompiledForm from FormsCatalogService.get_compiled_form
+            
+        Returns:
+            dict: The form's fields, coerced to their types (None when not mentioned)
+        """
+        model_account = LLMService._get_model_account(model)
+        prompt = get_form_extraction_prompt(
+            translated_text, form.name, form.prompt_fragment
+        )
+        result = LLMService._call_llm_api(
+            api_key, model_account, prompt, json_schema=form.json_schema
+        )
+        if not result:
+            return form.validate({})
+        try:
+            data = json.loads(result)
+        except json.JSONDecodeError as e:
+            raise Exception(f"Invalid form extraction output: {str(e)}")
+        return form.validate(data)
+
+    def confirm_speaker_roles(turns, api_key, model, max_chars=1500):
+        """Ask the LLM which speaker is the doctor, from the first turns only.
+        
+        Args:
+            turns: Transcribed turns from SpeakerTurnService, with "speaker" and
+                "text"
+            max_chars: Transcript characters sent; the roles are clear long
+                before the end
+            
+        Returns:
+            dict: Speaker label to "DOCTOR" or "PATIENT"
+        """
+        from .speaker_turns import SpeakerTurnService
+        
+        speakers = list(dict.fromkeys(turn["speaker"] for turn in turns))
+        excerpt = SpeakerTurnService.format_transcript(turns)[:max_chars]
+        schema = {
+            "type": "object",
+            "properties": {
+                speaker: {"type": "string", "enum": ["DOCTOR", "PATIENT"]}
+                for speaker in speakers
+            },
+            "required": speakers,
+        }
+        result = LLMService._call_llm_api(
+            api_key,
+            LLMService._get_model_account(model),
+            get_speaker_roles_prompt(excerpt, speakers),
+            json_schema=schema,
+        )
+        try:
+            roles = json.loads(result) if result else {}
+        except json.JSONDecodeError:
+            roles = {}
+        if not isinstance(roles, dict) or any(
+            roles.get(speaker) not in ("DOCTOR", "PATIENT") for speaker in speakers
+        ):
+            # Consultations almost always open with the doctor
+            logger.warning(
+                f"Could not read speaker roles from {result!r}; "
+                "assuming the first speaker is the doctor"
+            )
+            roles = {
+                speaker: "DOCTOR" if index == 0 else "PATIENT"
+                for index, speaker in enumerate(speakers)
+            }
+        return roles
@@ -6,21 +6,35 @@ import logging
 import time
 import os
 import concurrent.futures
-from pydub import AudioSegment
 from typing import Optional, List
 from ..core.config import Config
-import asyncio
-import numpy as np
+from ..core.admission import AdmissionController
+from ..core.metrics import MetricsRegistry
 from .input_validator import MedicalValidator
+from .forms_catalog import FormsCatalogService
+from .icd10 import ICD10Service
+from .lexicon import LexiconService
+from .speaker_turns import SpeakerTurnService
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 class DataPipeline:
     """Service handling audio processing workflows."""
+
+    # "lexicon" replaces the LLM refine of English
+    # notes with local vocabulary correction
+    REFINE_MODES = ("llm", "lexicon")
     
     @staticmethod
-    def process_batch(audio_file: str, language: str, model: str, conversational_mode: bool):
+    def process_batch(
+        audio_file: str,
+        language: str,
+        model: str,
+        conversational_mode: bool,
+        form_name: Optional[str] = None,
+        refine_mode: Optional[str] = None,
+    ):
         """Process audio in batch mode (non-streaming).
         
         Args:
@@ -28,6 +42,10 @@ class DataPipeline:
             language: Language code for transcription ("en", "ar", etc.)
             model: Model name to use for processing
             conversational_mode: Whether to use conversational mode
+            form_name: Clinical form to extract into; the generic extraction is
+                used when None
+            refine_mode: "llm" or "lexicon" (English notes only); defaults to
+                Config.REFINE_MODE
             config: Application configuration containing API keys and folders
             
         Returns:
@@ -36,83 +54,159 @@ class DataPipeline:
         process_start = time.time()
         file_path = None
         processed_file_path = None
+        stage_timings = {}
         
         try:
             # File is already saved by this point in FastAPI approach
             file_path = audio_file
             
             # Step 1: Preprocess audio
-            preprocess_start = time.time()
-            processed_file_path = AudioPreprocessingService.preprocess_audio(file_path)
-            preprocess_time = time.time() - preprocess_start
+            with (
+                AdmissionController.stage("preprocess"),
+                MetricsRegistry.track("preprocess") as timer,
+            ):
+                # Keep intermediate files next to the
+                # upload, inside its request workspace
+                processed_file_path = AudioPreprocessingService.preprocess_audio(
+                    file_path,
+                    os.path.splitext(file_path)[0] + "_processed.wav"
+                )
+            preprocess_time = stage_timings["preprocess"] = timer.elapsed
             logger.info(f"preprocessing total time: {preprocess_time}")
 
-            # Step 2: Transcribe audio
-            voice_start = time.time()
-            raw_text = DataPipeline._process_audio_parallel(
-                processed_file_path, 
-                Config.FIREWORKS_API_KEY,
-                language
-            )
-            voice_time = time.time() - voice_start
+            # Step 1.5: Split conversations into speaker turns locally
+            turns = None
+            if conversational_mode and Config.SPEAKER_TURNS:
+                with (
+                    AdmissionController.stage("preprocess"),
+                    MetricsRegistry.track("diarize") as timer,
+                ):
+                    turns = SpeakerTurnService.segment(processed_file_path)
+                stage_timings["diarize"] = timer.elapsed
+                logger.info(f"speaker turn segmentation total time: {timer.elapsed}")
+                if len({turn["speaker"] for turn in turns}) < 2:
+                    # One voice: leave speaker labelling to the LLM refine prompt
+                    turns = None
+
+            # Step 2: Transcribe audio, turn by turn when the turns are known
+            with (
+                AdmissionController.stage("asr"),
+                MetricsRegistry.track("asr") as timer,
+            ):
+                if turns:
+                    turns = DataPipeline._transcribe_turns(
+                        processed_file_path,
+                        turns,
+                        Config.FIREWORKS_API_KEY,
+                        language
+                    )
+                    raw_text = SpeakerTurnService.format_transcript(turns)
+                else:
+                    raw_text = DataPipeline._process_audio_parallel(
+                        processed_file_path,
+                        Config.FIREWORKS_API_KEY,
+                        language
+                    )
+            voice_time = stage_timings["asr"] = timer.elapsed
             logger.info(f"transcription total time: {voice_time}")
             print(raw_text)
 
-            #step 2.5: validation
-            validation_result = MedicalValidator.validate_medical_content(text = raw_text)
+            # step 2.5: validation
+            with MetricsRegistry.track("validate") as timer:
+                validation_result = MedicalValidator.validate_medical_content(
+                    text=raw_text
+                )
+            stage_timings["validate"] = timer.elapsed
+            logger.info(f"validation total time: {timer.elapsed}")
 
             if not validation_result["is_medical"] or validation_result["confidence"] < 70:
                 return {
-                "raw_text": raw_text + " (NON-MEDICAL)",
-                "arabic_text": "error", 
-                "translation_text": "error",
-                "json_data": {  'chief_complaint': 'error', 
-                                'icd10_codes': ['error'],
-                                'history_of_illness': 'error',
-                                'current_medication': 'error',
-                                'imaging_results': 'error',
-                                'plan': 'error',
-                                'assessment': 'error',
-                                'follow_up': 'error'},
-                "reasoning": "error",
-                "preprocessing_time": "error",
-                "voice_processing_time": "error",
-                "total_time": "error"
+                    "raw_text": raw_text + " (NON-MEDICAL)",
+                    "arabic_text": "error",
+                    "translation_text": "error",
+                    "json_data": {'chief_complaint': 'error',
+                                  'icd10_codes': ['error'],
+                                  'history_of_illness': 'error',
+                                  'current_medication': 'error',
+                                  'imaging_results': 'error',
+                                  'plan': 'error',
+                                  'assessment': 'error',
+                                  'follow_up': 'error'},
+                    "reasoning": "error",
+                    "preprocessing_time": "error",
+                    "voice_processing_time": "error",
+                    "llm_processing_time": stage_timings["validate"],
+                    "stage_timings": stage_timings,
+                    "total_time": "error"
                 }
-            if language == "ar":
+            if turns:
+                # Step 3: The turns are already split; the LLM only names the speakers
+                with MetricsRegistry.track("refine") as timer:
+                    roles = LLMService.confirm_speaker_roles(
+                        turns, Config.FIREWORKS_API_KEY, model
+                    )
+                    refined_text = SpeakerTurnService.format_transcript(turns, roles)
+                refine_time = stage_timings["refine"] = timer.elapsed
+                logger.info(f"speaker role confirmation total time: {refine_time}")
+
+            if language == "ar" and turns:
+                # Step 4: Translate to English, keeping the speaker labels
+                with MetricsRegistry.track("translate") as timer:
+                    translated_text = LLMService.translate_to_eng(
+                        refined_text,
+                        Config.FIREWORKS_API_KEY,
+                        model,
+                        conversational_mode
+                    )
+                stage_timings["translate"] = timer.elapsed
+                logger.info(f"translation total time: {timer.elapsed}")
+                end_text = translated_text
+            elif turns:
+                end_text = refined_text
+                translated_text = "there is no translation"
+            elif language == "ar":
                 # Step 3: Refine transcription
-                refine_start = time.time()
-                refined_text = LLMService.refine_ar_transcription(
-                    raw_text,
-                    Config.FIREWORKS_API_KEY,
-                    model,
-                    conversational_mode
-                )
-                refine_time = time.time() - refine_start
+                with MetricsRegistry.track("refine") as timer:
+                    refined_text = LLMService.refine_ar_transcription(
+                        raw_text,
+                        Config.FIREWORKS_API_KEY,
+                        model,
+                        conversational_mode
+                    )
+                refine_time = stage_timings["refine"] = timer.elapsed
                 logger.info(f"refining total time: {refine_time}")
                 print(refined_text)
 
                 # Step 4: Translate to English
-                translated_text = LLMService.translate_to_eng(
-                    refined_text,
-                    Config.FIREWORKS_API_KEY,
-                    model,
-                    conversational_mode
-                )
+                with MetricsRegistry.track("translate") as timer:
+                    translated_text = LLMService.translate_to_eng(
+                        refined_text,
+                        Config.FIREWORKS_API_KEY,
+                        model,
+                        conversational_mode
+                    )
+                stage_timings["translate"] = timer.elapsed
+                logger.info(f"translation total time: {timer.elapsed}")
                 end_text = translated_text
                 print(translated_text)
             else:
-                # Step 3: Refine transcription
-                refine_start = time.time()
-                refined_text = LLMService.refine_en_transcription(
-                    raw_text,
-                    Config.FIREWORKS_API_KEY,
-                    model,
-                    conversational_mode
-                )
+                # Step 3: Refine transcription; conversations always go to the LLM,
+                # which also labels the speakers
+                with MetricsRegistry.track("refine") as timer:
+                    if (
+                        refine_mode or Config.REFINE_MODE
+                    ) == "lexicon" and not conversational_mode:
+                        refined_text = LexiconService.refine_transcription(raw_text)
+                    else:
+                        refined_text = LLMService.refine_en_transcription(
+                            raw_text,
+                            Config.FIREWORKS_API_KEY,
+                            model,
+                            conversational_mode
+                        )
                 end_text = refined_text
 
-                refine_time = time.time() - refine_start
+                refine_time = stage_timings["refine"] = timer.elapsed
                 logger.info(f"refining total time: {refine_time}")
                 print(refined_text)
 
@@ -120,31 +214,51 @@ class DataPipeline:
                 translated_text = "there is no translation"
 
             # Step 5: Extract features 
-            extraction_start = time.time()
-            features_with_reasoning = LLMService.extract_features(
-                end_text,
-                Config.FIREWORKS_API_KEY,
-                "llama",
-                conversational_mode
-            )
-            extraction_time = time.time() - extraction_start
+            with MetricsRegistry.track("extract") as timer:
+                if form_name:
+                    form = FormsCatalogService.get_compiled_form(form_name)
+                    if form is None:
+                        raise ValueError(f"Unknown form: {form_name}")
+                    json_data = LLMService.extract_form(
+                        end_text, Config.FIREWORKS_API_KEY, "llama", form
+                    )
+                    reasoning = ""
+                else:
+                    features_with_reasoning = LLMService.extract_features(
+                        end_text,
+                        Config.FIREWORKS_API_KEY,
+                        "llama",
+                        conversational_mode
+                    )
+                    # Parse features
+                    json_data, reasoning = parse_refined_text_voice2(
+                        features_with_reasoning
+                    )
+                    # Check the extracted codes against the local ICD-10 index
+                    json_data = ICD10Service.annotate(json_data)
+            extraction_time = stage_timings["extract"] = timer.elapsed
             logger.info(f"extraction total time: {extraction_time}")
-            # Parse features
-            json_data, reasoning = parse_refined_text_voice2(features_with_reasoning)
 
             print(reasoning)
             print(json_data)
             
+            llm_stages = ("validate", "refine", "translate", "extract")
+            
             # Return results as a dictionary (FastAPI will convert to JSON)
             response_data = {
                 "raw_text": raw_text,
                 "arabic_text": refined_text, 
                 "translation_text": translated_text,
                 "json_data": json_data,
+                "form_name": form_name,
                 "reasoning": reasoning,
                 "preprocessing_time": preprocess_time,
                 "voice_processing_time": voice_time,
-                "total_time": time.time() - process_start
+                "llm_processing_time": sum(
+                    stage_timings.get(stage, 0.0) for stage in llm_stages
+                ),
+                "stage_timings": stage_timings,
+                "total_time": time.time() - process_start,
             }
             
             # Using JSONResponse to explicitly create a JSON response
@@ -195,6 +309,26 @@ class DataPipeline:
         
         return " ".join(filter(None, results))
 
+    @staticmethod
+    def _transcribe_turns(
+        file_path: str,
+        turns: List[dict],
+        api_key: str,
+        language: str,
+        max_workers: int = 4,
+    ) -> List[dict]:
+        """Transcribe every speaker turn separately, in parallel, and add its "text"."""
+        turn_paths = SpeakerTurnService.export_turns(file_path, turns)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # _process_chunk removes each turn file once it is transcribed
+            texts = list(
+                executor.map(
+                    lambda path: DataPipeline._process_chunk(path, api_key, language),
+                    turn_paths,
+                )
+            )
+        return [dict(turn, text=text) for turn, text in zip(turns, texts)]
+
     @staticmethod
     def _split_audio(file_path: str, chunk_percentage: int = 100) -> List[str]:
         """
@@ -207,6 +341,8 @@ class DataPipeline:
         Returns:
             List of paths to the created chunk files
         """
+        from pydub import AudioSegment
+        
         try:
             audio = AudioSegment.from_file(file_path)
             total_duration = len(audio)
@@ -259,4 +395,4 @@ class DataPipeline:
             os.remove(file_path)
             
         if processed_file_path and processed_file_path != file_path and os.path.exists(processed_file_path):
-            os.remove(processed_file_path)
\ No newline at end of file
+            os.remove(processed_file_path)
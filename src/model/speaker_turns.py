@@ -0,0 +1,277 @@
+import os
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# numpy and librosa are imported where they are used, like in audio_preprocessing
+
+
+class SpeakerTurnService:
+    """CPU-only speaker-turn segmentation of a two-party conversation.
+
+    The steps are:
+
+    1. Energy voice activity detection on 25 ms frames, with a threshold
+       relative to the recording's own noise floor, gives the speech regions.
+    2. Each speech region is cut into 1.5 s windows (0.5 s hop), described by
+       the mean and standard deviation of their MFCCs after cepstral mean
+       normalization over the recording.
+    3. The windows are split into two clusters with k-means. The split is
+       kept only if the Bayesian information criterion prefers two Gaussians
+       over one (the usual speaker change test); otherwise the recording is
+       treated as one speaker.
+    4. Frames take the label of the windows covering them. Labels are
+       smoothed, and turns shorter than ``MIN_TURN`` are merged into their
+       neighbours.
+
+    This is much cruder than a neural diarization model, but it is enough to
+    cut a doctor/patient exchange into turns. The LLM then only has to say
+    which speaker is the doctor.
+    """
+
+    SAMPLE_RATE = 16000
+    FRAME = 0.025
+    HOP = 0.010
+    WINDOW = 1.5
+    WINDOW_HOP = 0.5
+    N_MFCC = 20
+    # Speech must be this many dB above the noise
+    # floor (10th percentile of frame energy)
+    VAD_MARGIN_DB = 12.0
+    MIN_SPEECH = 0.3
+    MAX_PAUSE = 0.4
+    MIN_TURN = 1.0
+    # Weight of the model-size penalty in the two-speaker BIC test; higher means
+    # fewer splits
+    BIC_PENALTY = 1.0
+
+    @classmethod
+    def _speech_mask(cls, y, sr):
+        """Frame-level voice activity from short-term energy."""
+        import numpy as np
+        import librosa
+
+        frame, hop = int(cls.FRAME * sr), int(cls.HOP * sr)
+        rms = librosa.feature.rms(y=y, frame_length=frame, hop_length=hop, center=True)[
+            0
+        ]
+        db = 20 * np.log10(rms + 1e-10)
+        speech = db > np.percentile(db, 10) + cls.VAD_MARGIN_DB
+        return cls._close_gaps(
+            speech, int(cls.MAX_PAUSE / cls.HOP), int(cls.MIN_SPEECH / cls.HOP)
+        )
+
+    @staticmethod
+    def _runs(values) -> List[tuple]:
+        """Return ``(value, start, end)`` for each run of equal values."""
+        import numpy as np
+
+        values = np.asarray(values)
+        if not len(values):
+            return []
+        changes = np.flatnonzero(values[1:] != values[:-1]) + 1
+        starts = np.concatenate(([0], changes))
+        ends = np.concatenate((changes, [len(values)]))
+        return [
+            (values[start], int(start), int(end)) for start, end in zip(starts, ends)
+        ]
+
+    @classmethod
+    def _close_gaps(cls, speech, max_gap: int, min_length: int):
+        speech = speech.copy()
+        runs = cls._runs(speech)
+        for index, (value, start, end) in enumerate(runs):
+            # Bridge short pauses inside speech
+            if not value and 0 < index < len(runs) - 1 and end - start <= max_gap:
+                speech[start:end] = True
+        for value, start, end in cls._runs(speech):
+            if value and end - start < min_length:
+                speech[start:end] = False
+        return speech
+
+    @classmethod
+    def _window_embeddings(cls, y, sr, speech):
+        """MFCC mean/std per analysis window; returns (embeddings, frame ranges)."""
+        import numpy as np
+        import librosa
+
+        hop = int(cls.HOP * sr)
+        mfcc = librosa.feature.mfcc(
+            y=y, sr=sr, n_mfcc=cls.N_MFCC, n_fft=int(cls.FRAME * sr), hop_length=hop
+        )[:, : len(speech)]
+        speech = speech[:mfcc.shape[1]]
+        # Cepstral mean and variance normalization
+        # over the speech frames removes the channel
+        voiced = mfcc[:, speech]
+        mfcc = (mfcc - voiced.mean(axis=1, keepdims=True)) / (
+            voiced.std(axis=1, keepdims=True) + 1e-8
+        )
+
+        size, step = int(cls.WINDOW / cls.HOP), int(cls.WINDOW_HOP / cls.HOP)
+        embeddings, windows = [], []
+        for value, start, end in cls._runs(speech):
+            if not value:
+                continue
+            # Short regions get a single window
+            for window_start in range(start, max(start + 1, end - size + 1), step):
+                window_end = min(window_start + size, end)
+                frames = mfcc[:, window_start:window_end]
+                embeddings.append(
+                    np.concatenate((frames.mean(axis=1), frames.std(axis=1)))
+                )
+                windows.append((window_start, window_end))
+        return np.array(embeddings), windows
+
+    @classmethod
+    def _delta_bic(cls, x, labels) -> float:
+        """BIC gain of modelling ``x`` as two diagonal Gaussians instead of one."""
+        import numpy as np
+
+        def log_det(values):
+            return np.sum(np.log(values.var(axis=0) + 1e-6))
+
+        n, d = x.shape
+        gain = n * log_det(x) - sum(
+            np.sum(labels == k) * log_det(x[labels == k]) for k in (0, 1)
+        )
+        return 0.5 * gain - cls.BIC_PENALTY * 0.5 * 2 * d * np.log(n)
+
+    @staticmethod
+    def _two_means(x, iterations: int = 50):
+        """k-means with k=2 from the two most distant points (deterministic)."""
+        import numpy as np
+
+        first = np.argmax(np.linalg.norm(x - x.mean(axis=0), axis=1))
+        second = np.argmax(np.linalg.norm(x - x[first], axis=1))
+        centers = x[[first, second]].astype(float)
+        labels = None
+        for _ in range(iterations):
+            distances = np.linalg.norm(x[:, None, :] - centers[None, :, :], axis=2)
+            new_labels = distances.argmin(axis=1)
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            for k in (0, 1):
+                if np.any(labels == k):
+                    centers[k] = x[labels == k].mean(axis=0)
+        return labels
+
+    @classmethod
+    def segment(cls, audio_path: str) -> List[Dict]:
+        """Split a recording into speaker turns.
+
+        Returns:
+            list: ``{"start", "end", "speaker"}`` dicts in time order; times in
+            seconds, speakers "A" (whoever speaks first) and "B". Every turn
+            is speaker "A" when only one voice is found.
+        """
+        import numpy as np
+        import librosa
+
+        y, sr = librosa.load(audio_path, sr=cls.SAMPLE_RATE, mono=True)
+        speech = cls._speech_mask(y, sr)
+        if not speech.any():
+            return []
+        embeddings, windows = cls._window_embeddings(y, sr, speech)
+        speech = speech[:max(end for _, end in windows)] if windows else speech
+
+        labels = np.zeros(len(windows), dtype=int)
+        delta_bic = 0.0
+        if len(windows) >= 4:
+            labels = cls._two_means(embeddings)
+            if min(np.bincount(labels, minlength=2)) < 2:
+                labels[:] = 0
+            else:
+                delta_bic = cls._delta_bic(embeddings, labels)
+                if delta_bic <= 0:
+                    labels[:] = 0
+
+        # Vote per frame over the windows that cover it
+        votes = np.zeros((2, len(speech)))
+        for (start, end), label in zip(windows, labels):
+            votes[label, start:end] += 1
+        frame_labels = np.where(speech, votes.argmax(axis=0), -1)
+        turns = cls._merge_turns(frame_labels)
+        logger.info(
+            f"Found {len(turns)} turns "
+            f"from {len(set(t['speaker'] for t in turns))} speakers "
+            f"(delta BIC {delta_bic:.1f}) in {len(y) / sr:.1f}s of audio"
+        )
+        return turns
+
+    @classmethod
+    def _merge_turns(cls, frame_labels) -> List[Dict]:
+        segments = [
+            [int(label), start, end]
+            for label, start, end in cls._runs(frame_labels)
+            if label >= 0
+        ]
+        # Fold turns that are too short to be a real
+        # answer into the previous (or next) turn
+        min_frames = int(cls.MIN_TURN / cls.HOP)
+        merged = []
+        for segment in segments:
+            if merged and (
+                segment[0] == merged[-1][0] or segment[2] - segment[1] < min_frames
+            ):
+                merged[-1][2] = segment[2]
+            elif merged and merged[-1][2] - merged[-1][1] < min_frames:
+                merged[-1][0], merged[-1][2] = segment[0], segment[2]
+            else:
+                merged.append(segment)
+
+        names: Dict[int, str] = {}
+        turns = []
+        for label, start, end in merged:
+            if label not in names:
+                names[label] = "AB"[len(names)]
+            speaker = names[label]
+            if turns and turns[-1]["speaker"] == speaker:
+                turns[-1]["end"] = round(end * cls.HOP, 2)
+            else:
+                turns.append(
+                    {
+                        "start": round(start * cls.HOP, 2),
+                        "end": round(end * cls.HOP, 2),
+                        "speaker": speaker,
+                    }
+                )
+        return turns
+
+    @classmethod
+    def export_turns(
+        cls, audio_path: str, turns: List[Dict], padding: float = 0.15
+    ) -> List[str]:
+        """Write each turn to a WAV file next to ``audio_path``; return the paths."""
+        import soundfile as sf
+
+        info = sf.info(audio_path)
+        base = os.path.splitext(audio_path)[0]
+        paths = []
+        for index, turn in enumerate(turns):
+            start = max(0, int((turn["start"] - padding) * info.samplerate))
+            stop = min(info.frames, int((turn["end"] + padding) * info.samplerate))
+            y, sr = sf.read(audio_path, start=start, stop=stop)
+            path = f"{base}_turn_{index}.wav"
+            sf.write(path, y, sr)
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def format_transcript(
+        turns: List[Dict], roles: Optional[Dict[str, str]] = None
+    ) -> str:
+        """Render transcribed turns one per line, labelled with speaker or role."""
+        lines = []
+        for turn in turns:
+            text = (turn.get("text") or "").strip()
+            if not text:
+                continue
+            if roles:
+                lines.append(
+                    f"**{roles.get(turn['speaker'], turn['speaker'])}:** {text}"
+                )
+            else:
+                lines.append(f"SPEAKER {turn['speaker']}: {text}")
+        return "\n".join(lines)
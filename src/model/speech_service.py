@@ -1,7 +1,6 @@
 import os
 import logging
-from fireworks.client.audio import AudioInference
-import requests
+from ..core.rate_limit import RateLimiter
 
 # Configure logger
 logging.basicConfig(level=logging.INFO)
@@ -54,9 +53,12 @@ class SpeechService:
                 os.remove(processed_file_path)
             raise Exception(f"Audio transcription failed: {str(e)}")
         
+        import requests
+        
         try:
             processed_file_path = audio_file_path
             audio_file = open(processed_file_path, "rb")
+            RateLimiter.acquire("asr")
             response = requests.post(
             "https://api.fireworks.ai/inference/v1/audio/transcriptions",
             headers={"Authorization": f"Bearer {api_key}"},
@@ -80,6 +80,37 @@ def get_extraction_prompt_deepseek(translated_text):
     """
 
 
+def get_form_extraction_prompt(translated_text, form_name, form_fields):
+    form_fields = "\n".join("    " + line for line in form_fields.splitlines())
+    return f"""
+    Fill the "{form_name}" form from this medical text.
+    Return only a JSON object with exactly these fields:
+{form_fields}
+
+    Rules:
+    - Use null for anything the text does not mention; do not guess
+    - Set true/false fields to true only when the text clearly states it
+    - Write values in English, concisely
+
+    TEXT:
+    \"\"\"{translated_text}\"\"\"
+    """
+
+
+def get_speaker_roles_prompt(transcript, speakers):
+    names = ", ".join(speakers)
+    return f"""
+    This is the start of a medical consultation, split into turns by speaker ({names}).
+    Decide which speaker is the DOCTOR and which is the PATIENT:
+    - DOCTOR: asks questions, examines, diagnoses and recommends treatment
+    - PATIENT: describes symptoms, answers questions and shares their history
+    Return only a JSON object mapping each speaker to "DOCTOR" or "PATIENT".
+
+    TRANSCRIPT:
+    \"\"\"{transcript}\"\"\"
+    """
+
+
 def get_extraction_prompt_llama(translated_text):
     return f"""
     Extract patient information into JSON format and provide brief analysis.
@@ -194,4 +225,4 @@ USER: Refine this conversation:
 \"\"\"{translated_text}\"\"\"
 
 ASSISTANT:
-"""
\ No newline at end of file
+"""
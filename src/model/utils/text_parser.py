@@ -1,97 +1,172 @@
 import json
 import re
 
+# LLM completions come in three layouts, all handled by one scanner:
+#   extraction:     "# SECTION 1: PATIENT DATA (JSON FORMAT)" ...
+#                   "# SECTION 2: ANALYSIS NOTES" ...
+#   combined voice: "# SECTION 1: REFINED ARABIC TEXT" ...
+#                   up to "# SECTION 4: ANALYSIS NOTES"
+#   legacy features: "1. Fill Patient Features:" ... "2. Reasoning:" ...
+SECTION_HEADING = re.compile(
+    r"^[ \t>*]*(?:#+[ \t]*SECTION[ \t]*(\d+)[ \t]*:[^\n]*"
+    r"|(\d+)\.[ \t]*(?:Fill Patient Features|Reasoning)[ \t]*:)[ \t*]*",
+    re.MULTILINE | re.IGNORECASE,
+)
+CODE_FENCE = re.compile(r"^[ \t]*```[a-zA-Z]*[ \t]*$", re.MULTILINE)
+BARE_WORDS = {
+    "NULL": "null",
+    "Null": "null",
+    "None": "null",
+    "True": "true",
+    "False": "false",
+}
+INVALID_JSON = {"error": "Invalid JSON format"}
+DECODER = json.JSONDecoder()
+# A whole JSON string (possibly unterminated) or
+# a brace, so braces inside strings are skipped
+BRACE_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"?|[{}]')
+# Strings, brackets, bare words, trailing commas and everything else, in one
+# tokenization
+REPAIR_TOKEN = re.compile(
+    r'"(?:[^"\\]|\\.)*(?:(?P<closed>")|\\?)'
+    r"|[{}\[\]]"
+    r"|(?P<trailing>,(?=\s*(?:[}\]]|$)))"
+    r"|[A-Za-z_]\w*"
+    r'|[^"{}\[\]A-Za-z_,]+'
+    r"|,"
+)
+
+
+def parse_sections(text):
+    """Split a completion into its numbered sections in one pass.
+
+    Returns:
+        dict: Section number to its stripped body. Text before the first
+        heading is kept under 0, so a completion without headings is
+        section 0.
+    """
+    sections = {}
+    number, start = 0, 0
+    for match in SECTION_HEADING.finditer(text):
+        sections.setdefault(number, text[start:match.start()].strip())
+        number, start = int(match.group(1) or match.group(2)), match.end()
+    sections.setdefault(number, text[start:].strip())
+    return sections
+
+
+def extract_json_object(text):
+    """Return the first balanced ``{...}`` in ``text``, or None.
+
+    Braces inside JSON strings are skipped, so a description containing
+    ``}`` does not end the object early. An object cut off before its closing
+    brace is returned up to the end of the text, for ``repair_json`` to close.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth = 0
+    for match in BRACE_TOKEN.finditer(text, start):
+        token = match.group(0)
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:match.end()]
+    return text[start:]
+
+
+def repair_json(text):
+    """Fix the mistakes LLMs commonly make in JSON output.
+
+    Outside of strings: ``NULL``/``None``/``True``/``False`` become JSON
+    literals and trailing commas are dropped. Code fences are removed, and
+    strings and brackets left open at the end are closed.
+    """
+    text = CODE_FENCE.sub("", text).strip()
+    out, closers = [], []
+    for match in REPAIR_TOKEN.finditer(text):
+        token = match.group(0)
+        if token[0] == '"':
+            if not match.group("closed"):
+                # The text ended inside a string
+                token = token.rstrip("\\") + '"'
+        elif token in ("{", "["):
+            closers.append("}" if token == "{" else "]")
+        elif token in ("}", "]"):
+            if closers:
+                closers.pop()
+        elif match.group("trailing"):
+            # A comma followed only by whitespace and a
+            # closing bracket (or the end) is dropped
+            continue
+        else:
+            token = BARE_WORDS.get(token, token)
+        out.append(token)
+    repaired = "".join(out).rstrip()
+    return repaired + "".join(reversed(closers))
+
+
+def load_json_object(text):
+    """Parse the first JSON object in ``text``, repairing it if needed.
+
+    Well-formed JSON is decoded straight from the text; the scanner and
+    ``repair_json`` only run when that fails.
+
+    Returns:
+        dict: The object, ``{}`` when there is none, or
+        ``{"error": "Invalid JSON format"}`` when it cannot be repaired
+    """
+    text = text or ""
+    start = text.find("{")
+    if start < 0:
+        return {}
+    try:
+        return DECODER.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(repair_json(extract_json_object(text)))
+    except json.JSONDecodeError:
+        return dict(INVALID_JSON)
+
+
 def parse_refined_text_voice(refined_text):
     """Parse the refined text into structured data."""
     try:
-        # Extract sections using regex
-        refined_section = re.search(r"# SECTION 1: REFINED ARABIC TEXT(.*?)# SECTION 2:", refined_text, re.DOTALL)
-        translation_section = re.search(r"# SECTION 2: ENGLISH TRANSLATION(.*?)# SECTION 3:", refined_text, re.DOTALL)
-        json_section = re.search(r"# SECTION 3: PATIENT DATA \(JSON FORMAT\)(.*?)# SECTION 4:", refined_text, re.DOTALL)
-        reasoning_section = re.search(r"# SECTION 4: ANALYSIS NOTES(.*)", refined_text, re.DOTALL)
-
-        parsed_text = refined_section.group(1).strip() if refined_section else ""
-        translate = translation_section.group(1).strip() if translation_section else ""
-        # Parse JSON data
-        json_data = {}
-        if json_section:
-            json_text = json_section.group(1).strip()
-            # Find JSON object in text
-            json_match = re.search(r'\{.*\}', json_text, re.DOTALL)
-            if json_match:
-                try:
-                    json_data = json.loads(json_match.group(0))
-                except json.JSONDecodeError:
-                    json_data = {"error": "Invalid JSON format"}
-        
-        reasoning = reasoning_section.group(1).strip() if reasoning_section else ""
-        
-        return parsed_text, translate, json_data, reasoning
+        sections = parse_sections(refined_text)
+        json_data = load_json_object(sections.get(3, ""))
+        return sections.get(1, ""), sections.get(2, ""), json_data, sections.get(4, "")
     except Exception as e:
         raise Exception(f"Failed to parse refined text: {str(e)}")
-    
+
 
 def parse_refined_text(refined_text):
     """
     Parse the refined text into structured data, handling JSON within backticks.
-    
+
     Args:
         refined_text (str): The input text containing patient features and reasoning
-    
+
     Returns:
         tuple: A tuple containing parsed JSON data and reasoning text
     """
     try:
-        # Extract JSON section, including handling of backticks and code block
-        json_section = re.search(r"1\.\s*Fill Patient Features:\s*(?:```json)?\s*({[^}]+})\s*(?:```)?", refined_text, re.DOTALL)
-        reasoning_section = re.search(r"2\.\s*Reasoning:\s*(.*)", refined_text, re.DOTALL)
-        
-        # Parse JSON data
-        json_data = {}
-        if json_section:
-            json_text = json_section.group(1).strip()
-            try:
-                # Replace NULL with null for JSON compatibility
-                json_text = json_text.replace('NULL', 'null')
-                print(json_text)
-                json_data = json.loads(json_text)
-            except json.JSONDecodeError:
-                json_data = {"error": "Invalid JSON format"}
-        
-        # Extract reasoning
-        reasoning = ""
-        if reasoning_section:
-            reasoning = reasoning_section.group(1).strip()
-        
-        return json_data, reasoning
-    
+        sections = parse_sections(refined_text)
+        return load_json_object(sections.get(1, "")), sections.get(2, "")
     except Exception as e:
         raise Exception(f"Failed to parse refined text: {str(e)}")
-    
 
 
 def parse_refined_text_voice2(refined_text):
-    """Parse the refined text into structured data."""
+    """Parse the refined text into structured data.
+
+    Without section headings the first JSON object in the completion is
+    used and there is no reasoning.
+    """
     try:
-        # Extract sections using regex
-        json_section = re.search(r"# SECTION 1: PATIENT DATA \(JSON FORMAT\)(.*?)# SECTION 2:", refined_text, re.DOTALL)
-        reasoning_section = re.search(r"# SECTION 2: ANALYSIS NOTES(.*)", refined_text, re.DOTALL)
-
-        # Parse JSON data
-        json_data = {}
-        if json_section:
-            json_text = json_section.group(1).strip()
-            # Find JSON object in text
-            json_match = re.search(r'\{.*\}', json_text, re.DOTALL)
-            if json_match:
-                try:
-                    json_data = json.loads(json_match.group(0))
-                except json.JSONDecodeError:
-                    json_data = {"error": "Invalid JSON format"}
-        
-        reasoning = reasoning_section.group(1).strip() if reasoning_section else ""
-        
-        return json_data, reasoning
+        sections = parse_sections(refined_text)
+        json_text = sections.get(1) if 1 in sections else sections.get(0, "")
+        return load_json_object(json_text), sections.get(2, "")
     except Exception as e:
         raise Exception(f"Failed to parse refined text: {str(e)}")
-    
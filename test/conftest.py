@@ -0,0 +1,13 @@
+import pytest
+
+from src.core.database import DatabaseService
+from src.core.db_connection import ConnectionManager
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(DatabaseService, "DB_PATH", str(tmp_path / "app.db"))
+    assert DatabaseService.initialize_db()
+    yield DatabaseService
+    DatabaseService.shutdown()
+    ConnectionManager.close_all()
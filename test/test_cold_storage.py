@@ -0,0 +1,88 @@
+import random
+
+import pytest
+
+from src.core.cold_storage import ColdStorageService
+from src.core.db_connection import ConnectionManager
+
+WORDS = (
+    "patient reports chest pain shortness of breath for three days worse on "
+    "exertion no fever cough productive sputum history of hypertension and "
+    "type two diabetes on metformin amlodipine plan ecg troponin follow up"
+).split()
+
+
+@pytest.fixture
+def cold_storage(database, monkeypatch):
+    # Small dictionaries so a few hundred short rows are enough to train zstd
+    monkeypatch.setattr(ColdStorageService, "ZSTD_DICTIONARY_SIZE", 2048)
+    monkeypatch.setattr(ColdStorageService, "ZSTD_MIN_SAMPLE_BYTES", 4 * 2048)
+    for cache in ("_dictionaries", "_zlib_compressors", "_zlib_decompressors"):
+        monkeypatch.setattr(ColdStorageService, cache, {})
+    return ColdStorageService
+
+
+def without_zstd(monkeypatch):
+    monkeypatch.setattr(ColdStorageService, "_zstd", staticmethod(lambda: None))
+
+
+def insert_old_results(database, count, seed):
+    rng = random.Random(seed)
+    conn = ConnectionManager.get_connection(database.DB_PATH)
+    texts = {}
+    for _ in range(count):
+        text = " ".join(rng.choice(WORDS) for _ in range(60))
+        cursor = conn.execute(
+            "INSERT INTO audio_results (filename, language, model, is_conversation, "
+            "raw_text, reasoning, insertion_date) "
+            "VALUES ('old.wav', 'en', 'm', 0, ?, 'notes', '2020-01-01 00:00:00')",
+            (text,),
+        )
+        texts[cursor.lastrowid] = text
+    conn.commit()
+    return texts
+
+
+def codecs(database):
+    conn = ConnectionManager.get_connection(database.DB_PATH)
+    return [row[0] for row in conn.execute(
+        f"SELECT codec FROM {ColdStorageService.DICTIONARY_TABLE} ORDER BY id"
+    )]
+
+
+def assert_hydrated(database, texts):
+    conn = ConnectionManager.get_connection(database.DB_PATH)
+    rows = [
+        dict(row)
+        for row in conn.execute("SELECT id, raw_text, reasoning FROM audio_results")
+    ]
+    assert all(row["raw_text"] is None for row in rows)
+    ColdStorageService.hydrate(conn, rows)
+    assert {row["id"]: row["raw_text"] for row in rows} == texts
+    assert {row["reasoning"] for row in rows} == {"notes"}
+
+
+@pytest.mark.parametrize("codec", ["zstd", "zlib"])
+def test_compacted_rows_read_back(database, cold_storage, monkeypatch, codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    else:
+        without_zstd(monkeypatch)
+    texts = insert_old_results(database, 200, seed=1)
+
+    assert cold_storage.compact(database.DB_PATH, age_days=1) == 200
+    assert codecs(database) == [codec]
+    assert_hydrated(database, texts)
+
+
+def test_zlib_fallback_is_replaced_by_zstd(database, cold_storage, monkeypatch):
+    pytest.importorskip("zstandard")
+    with monkeypatch.context() as patch:
+        without_zstd(patch)
+        texts = insert_old_results(database, 150, seed=1)
+        assert cold_storage.compact(database.DB_PATH, age_days=1) == 150
+
+    texts.update(insert_old_results(database, 150, seed=2))
+    assert cold_storage.compact(database.DB_PATH, age_days=1) == 150
+    assert codecs(database) == ["zlib", "zstd"]
+    assert_hydrated(database, texts)
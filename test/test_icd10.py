@@ -0,0 +1,57 @@
+import pytest
+
+from src.model.icd10 import ICD10Index, ICD10Service
+
+ENTRIES = {
+    "J4520": "Mild intermittent asthma, uncomplicated",
+    "J45909": "Unspecified asthma, uncomplicated",
+    "E119": "Type 2 diabetes mellitus without complications",
+    "I10": "Essential (primary) hypertension",
+}
+
+
+@pytest.fixture
+def full_index(monkeypatch):
+    index = ICD10Index(ENTRIES)
+    monkeypatch.setattr(ICD10Service, "_index", index)
+    return index
+
+
+def test_valid_codes_are_rewritten_canonically(full_index):
+    data = {"icd10_codes": ["j45.909 asthma", {"code": "I10", "description": "HTN"}]}
+    ICD10Service.annotate(data)
+    assert data["icd10_codes"] == [
+        "J45.909 - Unspecified asthma, uncomplicated",
+        "I10 - Essential (primary) hypertension",
+    ]
+    assert [result["status"] for result in data["icd10_validation"]] == [
+        "valid", "valid",
+    ]
+
+
+def test_invalid_code_is_kept_with_suggestions(full_index):
+    data = {"icd10_codes": "J45.999 - Asthma; E11.9 - Diabetes\nnull"}
+    ICD10Service.annotate(data)
+    assert data["icd10_codes"] == [
+        "J45.999 - Asthma",
+        "E11.9 - Type 2 diabetes mellitus without complications",
+    ]
+    invalid = data["icd10_validation"][0]
+    assert invalid["valid"] is False
+    assert [s["code"] for s in invalid["suggestions"]][:2] == ["J45.20", "J45.909"]
+
+
+def test_code_missing_from_partial_index_is_unknown(monkeypatch):
+    monkeypatch.setattr(ICD10Service, "_index", ICD10Index(ENTRIES, False))
+    data = {"icd10_codes": ["J45.999 - Asthma"]}
+    ICD10Service.annotate(data)
+    assert data["icd10_codes"] == ["J45.999 - Asthma"]
+    (result,) = data["icd10_validation"]
+    assert result["status"] == "unknown" and result["valid"] is None
+    assert result["suggestions"] == []
+
+
+@pytest.mark.parametrize("data", [None, "text", {"plan": "rest"}, {"icd10_codes": 5}])
+def test_results_without_codes_are_left_alone(full_index, data):
+    assert ICD10Service.annotate(data) == data
+    assert not isinstance(data, dict) or "icd10_validation" not in data
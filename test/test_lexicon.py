@@ -0,0 +1,53 @@
+import pytest
+
+from src.model.lexicon import LexiconService, MedicalLexicon
+
+
+@pytest.fixture(scope="module")
+def lexicon():
+    return LexiconService.get_lexicon()
+
+
+@pytest.fixture(scope="module")
+def vocabulary_only():
+    """The bundled vocabulary without the English dictionary, to test the rules."""
+    return MedicalLexicon.from_files(
+        LexiconService.BUNDLED_PATH, LexiconService.COMMON_WORDS_PATH
+    )
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "The patient was advised hydration and rest.",
+        "Follow up in clinic next week.",
+        "She reports headaches in the morning.",
+    ],
+)
+def test_english_words_are_not_changed(lexicon, text):
+    assert lexicon.correct(text) == (text, [])
+
+
+def test_prefix_and_inflection_variants_are_not_candidates(vocabulary_only):
+    assert vocabulary_only.lookup("hydration") is None
+    assert vocabulary_only.lookup("headaches") is None
+
+
+def test_phonetic_match_must_be_close(vocabulary_only):
+    assert vocabulary_only.lookup("clinic") is None
+
+
+def test_ambiguous_word_is_left_alone():
+    lexicon = MedicalLexicon({"diabetes": 10, "diabetic": 5})
+    assert lexicon.lookup("diabetis") is None
+    assert lexicon.lookup("diabetez") == ("diabetes", 1)
+
+
+def test_misheard_terms_are_corrected(lexicon):
+    text, corrections = lexicon.correct(
+        "Started amlodypine and met formin, hypertention controlled."
+    )
+    assert text == "Started amlodipine and metformin, hypertension controlled."
+    assert [c["from"] for c in corrections] == [
+        "amlodypine", "met formin", "hypertention",
+    ]
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from src.core.config import Config
+from src.core.database import DatabaseService
+from src.core.db_connection import ConnectionManager
+from src.core.rollups import RollupService
+
+
+def non_medical_result(**overrides):
+    """Arguments of save_audio_result for a result the validator rejected."""
+    result = dict(
+        filename="visit.wav", language="en", model="m", is_conversation=False,
+        raw_text="hello (NON-MEDICAL)", arabic_text="error", translation_text="error",
+        json_data=json.dumps({"plan": "error"}), reasoning="error",
+        preprocessing_time="error", voice_processing_time="error",
+        llm_processing_time=0.25, doctor_name="Dr. A", validation_time=0.25,
+    )
+    result.update(overrides)
+    return result
+
+
+def stored_ids():
+    conn = ConnectionManager.get_connection(DatabaseService.DB_PATH)
+    return [row[0] for row in conn.execute("SELECT id FROM audio_results ORDER BY id")]
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_non_medical_result_is_stored_and_rolled_up(
+    database, monkeypatch, write_behind
+):
+    monkeypatch.setattr(Config, "WRITE_BEHIND", write_behind)
+
+    result_id = database.save_audio_result(**non_medical_result())
+    assert result_id is not None
+    assert database.flush_writes()
+
+    assert stored_ids() == [result_id]
+    assert database.update_feedback(result_id, "ok")
+    (totals,) = database.get_analytics()
+    assert totals["request_count"] == 1
+    # The "error" timings are skipped, the numeric ones are still summarized
+    assert totals["metrics"]["preprocessing_time"] == {"count": 0}
+    assert totals["metrics"]["llm_processing_time"]["count"] == 1
+
+
+def test_rebuild_covers_history_inserted_before_it(database, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+    conn = ConnectionManager.get_connection(DatabaseService.DB_PATH)
+    # A database whose rows predate the rollups, then one live insert before warm-up
+    conn.execute(
+        "INSERT INTO audio_results (filename, language, model, is_conversation, "
+        "preprocessing_time, llm_processing_time) "
+        "VALUES ('old.wav', 'en', 'm', 0, 'error', 1.5)"
+    )
+    conn.commit()
+    database.save_audio_result(**non_medical_result())
+
+    assert database.rebuild_rollups() == 2
+    assert database.rebuild_rollups() == 0
+    assert sum(entry["request_count"] for entry in database.get_analytics()) == 2
+
+
+def test_failed_update_is_rebuilt_on_the_next_analytics_call(database, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+    database.save_audio_result(**non_medical_result())
+    assert database.rebuild_rollups() == 1
+
+    def broken(conn, records):
+        raise RuntimeError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(RollupService, "_fold", broken)
+        database.save_audio_result(**non_medical_result())
+
+    assert database.rollups_stale()
+    database._rollup_thread.join(timeout=10)
+    assert not database.rollups_stale()
+    (totals,) = database.get_analytics()
+    assert totals["request_count"] == 2
+
+
+def test_live_insert_during_rebuild_is_counted_once(database, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+    ids = [database.reserve_result_id() for _ in range(4)]
+    # The third id is committed last, as happens with per-process id blocks
+    for result_id in ids[:2] + ids[3:]:
+        database.save_audio_result(**non_medical_result(), result_id=result_id)
+    conn = ConnectionManager.get_connection(DatabaseService.DB_PATH)
+    conn.execute(f"DELETE FROM {RollupService.STATE_TABLE}")
+    conn.commit()
+
+    # Interrupt the rebuild after its first batch
+    fold = RollupService._fold
+    calls = []
+
+    def interrupted(conn, records):
+        calls.append(records)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        fold(conn, records)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(RollupService, "_fold", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            RollupService.rebuild(conn, batch_size=1)
+    # One insert the rebuild has yet to reach, one beyond its range
+    database.save_audio_result(**non_medical_result(), result_id=ids[2])
+    database.save_audio_result(**non_medical_result())
+
+    assert RollupService.rebuild(conn, batch_size=1) == 3
+    assert sum(entry["request_count"] for entry in database.get_analytics()) == 5
@@ -0,0 +1,63 @@
+from src.core.config import Config
+from src.core.db_connection import ConnectionManager
+from src.core.search_index import SearchIndexService
+
+
+def save(database, text, **fields):
+    return database.save_audio_result(
+        filename="visit.wav", language="en", model="m", is_conversation=False,
+        raw_text=text, arabic_text=fields.get("arabic_text", text),
+        translation_text="", json_data="{}", reasoning="",
+        preprocessing_time=1.0, voice_processing_time=1.0, llm_processing_time=1.0,
+        doctor_name="Dr. A",
+    )
+
+
+def test_search_returns_ranked_results_with_snippets(database, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+    result_id = save(database, "Bilateral knee pain for five years, worse on stairs")
+    save(database, "Chest pain on exertion")
+
+    page = database.search_results("knee pa")
+
+    assert [r["id"] for r in page["results"]] == [result_id]
+    assert page["results"][0]["snippet"] == (
+        "Bilateral [knee] [pain] for five years, worse on stairs"
+    )
+
+
+def test_arabic_search_ignores_hamza_spelling(database, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+    result_id = save(database, "", arabic_text="يعاني من ألم في الصدر")
+
+    page = database.search_results("الم")
+
+    assert [r["id"] for r in page["results"]] == [result_id]
+    assert "[ألم]" in page["results"][0]["snippet"]
+
+
+def test_index_with_stored_text_is_rebuilt_contentless(database, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND", False)
+    # The layout of an older version: an FTS5 table holding its own text copy
+    conn = ConnectionManager.get_connection(database.DB_PATH)
+    conn.execute(f"DROP TABLE {SearchIndexService.TABLE}")
+    conn.execute(f"DROP TABLE {SearchIndexService.STATE_TABLE}")
+    conn.execute(
+        f"CREATE VIRTUAL TABLE {SearchIndexService.TABLE} USING fts5("
+        "raw_text, arabic_text, translation_text)"
+    )
+    conn.execute(
+        "INSERT INTO audio_results (filename, language, model, is_conversation, "
+        "raw_text) VALUES ('old.wav', 'en', 'm', 0, 'Persistent dry cough')"
+    )
+    conn.commit()
+
+    assert database.initialize_db()
+    assert database.backfill_search_index() == 1
+    # The watermark is past the old rows, so a restart indexes nothing twice
+    assert database.backfill_search_index() == 0
+    sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = ?", (SearchIndexService.TABLE,)
+    ).fetchone()[0]
+    assert "content = ''" in sql
+    assert [r["id"] for r in database.search_results("cough")["results"]] == [1]
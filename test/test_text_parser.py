@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from src.model.utils.text_parser import (
+    load_json_object,
+    parse_refined_text_voice2,
+    parse_sections,
+    repair_json,
+)
+
+
+def test_sections_are_split_by_heading():
+    text = (
+        "preamble\n"
+        "# SECTION 1: PATIENT DATA (JSON FORMAT)\n{\"a\": 1}\n"
+        "## SECTION 2: ANALYSIS NOTES\nnotes\n"
+    )
+    assert parse_sections(text) == {0: "preamble", 1: '{"a": 1}', 2: "notes"}
+
+
+def test_legacy_headings_are_sections():
+    text = "1. Fill Patient Features:\n{}\n2. Reasoning:\nbecause"
+    assert parse_sections(text) == {0: "", 1: "{}", 2: "because"}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}),
+        ('{"a": NULL, "b": None, "c": True, "d": False}',
+         {"a": None, "b": None, "c": True, "d": False}),
+        ('{"note": "NULL, True,}"}', {"note": "NULL, True,}"}),
+        ('```json\n{"a": 1}\n```', {"a": 1}),
+        ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+        ('{"a": "cut off', {"a": "cut off"}),
+    ],
+)
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_braces_inside_strings_do_not_end_the_object():
+    text = 'Here: {"plan": "use {x} } later", "dose": NULL} trailing {"b": 2}'
+    assert load_json_object(text) == {"plan": "use {x} } later", "dose": None}
+
+
+def test_unrepairable_json_is_reported():
+    assert load_json_object('{"a": 1 "b"}') == {"error": "Invalid JSON format"}
+    assert load_json_object("no json here") == {}
+
+
+def test_voice2_uses_sections_when_present():
+    text = (
+        "# SECTION 1: PATIENT DATA (JSON FORMAT)\n```json\n{\"age\": 40,}\n```\n"
+        "# SECTION 2: ANALYSIS NOTES\nLikely asthma."
+    )
+    assert parse_refined_text_voice2(text) == ({"age": 40}, "Likely asthma.")
+
+
+def test_voice2_falls_back_to_the_first_json_block():
+    text = 'Sure, here it is:\n{"age": 40} and also {"age": 41}'
+    assert parse_refined_text_voice2(text) == ({"age": 40}, "")
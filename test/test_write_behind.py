@@ -0,0 +1,103 @@
+import json
+import sqlite3
+
+import pytest
+
+from src.core.db_connection import ConnectionManager
+from src.core.write_behind import WriteBehindQueue
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(WriteBehindQueue, "RETRY_DELAY", 0.01)
+    path = str(tmp_path / "writes.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)")
+    conn.close()
+    yield path
+    ConnectionManager.close_all()
+
+
+def apply_notes(failures):
+    """An apply_batch that raises the queued errors for a note id first."""
+
+    def apply_batch(conn, writes):
+        for op, payload in writes:
+            errors = failures.get(payload["id"])
+            if errors:
+                raise errors.pop(0)
+            if op == "insert":
+                conn.execute(
+                    "INSERT INTO notes (id, body) VALUES (:id, :body)", payload
+                )
+            else:
+                conn.execute("UPDATE notes SET body = :body WHERE id = :id", payload)
+
+    return apply_batch
+
+
+def stored_notes(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT id, body FROM notes ORDER BY id"))
+
+
+def dead_letters(writer):
+    try:
+        with open(writer.dead_letter_path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+    except FileNotFoundError:
+        return []
+
+
+def test_failed_write_is_retried_in_order(db_path):
+    locked = [sqlite3.OperationalError("database is locked") for _ in range(3)]
+    done = []
+    writer = WriteBehindQueue(
+        db_path, apply_notes({1: locked}), flush_interval=0.01,
+        max_attempts=2, on_done=done.extend,
+    )
+    writer.enqueue("insert", {"id": 1, "body": "draft"})
+    writer.enqueue("update", {"id": 1, "body": "final"})
+    writer.enqueue("insert", {"id": 2, "body": "other"})
+    assert writer.flush(timeout=10)
+    writer.stop()
+
+    # Lock timeouts do not use up the attempts, and the update waited for its insert
+    assert stored_notes(db_path) == {1: "final", 2: "other"}
+    assert sorted(payload["id"] for _, payload in done) == [1, 1, 2]
+    assert writer.pending() == 0
+    assert dead_letters(writer) == []
+
+
+def test_write_out_of_attempts_is_dead_lettered(db_path):
+    broken = [ValueError("bad payload") for _ in range(5)]
+    writer = WriteBehindQueue(
+        db_path, apply_notes({1: broken}), flush_interval=0.01, max_attempts=2
+    )
+    writer.enqueue("insert", {"id": 1, "body": "draft"})
+    writer.enqueue("update", {"id": 1, "body": "final"})
+    writer.enqueue("insert", {"id": 2, "body": "other"})
+    assert writer.flush(timeout=10)
+    writer.stop()
+
+    assert stored_notes(db_path) == {2: "other"}
+    letters = dead_letters(writer)
+    assert [(entry["op"], entry["payload"]["id"]) for entry in letters] == [
+        ("insert", 1), ("update", 1),
+    ]
+    assert letters[0]["error"] == "bad payload"
+    assert "earlier write" in letters[1]["error"]
+
+
+def test_stop_gives_pending_retries_a_last_attempt(db_path, monkeypatch):
+    monkeypatch.setattr(WriteBehindQueue, "RETRY_DELAY", 60)
+    locked = [sqlite3.OperationalError("database is locked") for _ in range(5)]
+    writer = WriteBehindQueue(db_path, apply_notes({1: locked}), flush_interval=0.01)
+    writer.enqueue("insert", {"id": 1, "body": "draft"})
+    assert not writer.flush(timeout=0.5)
+    writer.stop()
+
+    assert stored_notes(db_path) == {}
+    assert [entry["payload"]["id"] for entry in dead_letters(writer)] == [1]
+    with pytest.raises(RuntimeError):
+        writer.enqueue("insert", {"id": 2, "body": "late"})